@@ -0,0 +1,288 @@
+import numpy as np
+from typing import Dict, List, Tuple
+
+from video_processor import SAMPLE_RATE
+
+# 25 ms frames with a 10 ms hop, the usual framing for speech analysis at 16 kHz
+FRAME_LENGTH = 400
+HOP_LENGTH = 160
+# Speech/music discrimination: spectra are compared 50 ms apart, and the context
+# around a frame is judged every 100 ms
+STABILITY_LAG = 5
+CONTEXT_HOP = 10
+
+
+def frame_signal(samples: np.ndarray, frame_length: int = FRAME_LENGTH, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """
+    Split a signal into overlapping frames without copying.
+
+    Args:
+        samples: Mono float32 samples
+        frame_length: Samples per frame
+        hop_length: Samples between frame starts
+
+    Returns:
+        Read-only (n_frames, frame_length) view of the samples
+    """
+    if samples.size < frame_length:
+        samples = np.pad(samples, (0, frame_length - samples.size))
+    return np.lib.stride_tricks.sliding_window_view(samples, frame_length)[::hop_length]
+
+
+def frame_energy(samples: np.ndarray, frame_length: int = FRAME_LENGTH, hop_length: int = HOP_LENGTH) -> np.ndarray:
+    """
+    Compute the RMS energy of each frame.
+
+    Args:
+        samples: Mono float32 samples
+        frame_length: Samples per frame
+        hop_length: Samples between frame starts
+
+    Returns:
+        RMS energy per frame
+    """
+    frames = frame_signal(samples, frame_length, hop_length)
+    return np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+
+
+def find_split_points(samples: np.ndarray, pieces: int, search_seconds: float = 10.0) -> List[int]:
+    """
+    Find cut points that split audio into roughly equal pieces at pauses.
+
+    Each cut is placed at the quietest 0.5 s stretch within search_seconds of the
+    ideal equal-length position, so words are not cut in half.
+
+    Args:
+        samples: Mono float32 16 kHz samples
+        pieces: Number of pieces
+        search_seconds: How far from the ideal position a cut may move
+
+    Returns:
+        Sample indices of the pieces' boundaries, including 0 and len(samples)
+    """
+    if pieces <= 1 or samples.size == 0:
+        return [0, samples.size]
+
+    energy = frame_energy(samples)
+    # Smooth over ~0.5 s so a cut lands in a pause rather than between two syllables
+    window = max(1, int(0.5 * SAMPLE_RATE / HOP_LENGTH))
+    smoothed = np.convolve(energy, np.ones(window, dtype=np.float32) / window, mode='same')
+    search_frames = int(search_seconds * SAMPLE_RATE / HOP_LENGTH)
+
+    points = [0]
+    for i in range(1, pieces):
+        ideal = int(len(smoothed) * i / pieces)
+        low = max(ideal - search_frames, 1)
+        high = min(ideal + search_frames, len(smoothed) - 1)
+        if high <= low:
+            continue
+        frame = low + int(np.argmin(smoothed[low:high]))
+        cut = frame * HOP_LENGTH + FRAME_LENGTH // 2
+        if points[-1] < cut < samples.size:
+            points.append(cut)
+    points.append(samples.size)
+    return points
+
+
+def music_context(band_energy: np.ndarray, stability: np.ndarray, loud: np.ndarray, context_frames: int,
+                  max_stability: float = 0.8, min_modulation: float = 1.0, block_windows: int = 1024) -> np.ndarray:
+    """
+    Decide for every frame whether the audio around it is music rather than speech.
+
+    Music holds its spectrum from one frame to the next (sustained notes and chords),
+    while speech reshapes it with every syllable. Speech also modulates its loudness
+    at the syllable rate, around 4 Hz, far more deeply than music does. A context is
+    music when its loud frames are spectrally stable on average and the 2-8 Hz
+    modulation energy of its speech-band envelope is low.
+
+    Args:
+        band_energy: Speech-band power of each frame
+        stability: Similarity of each frame's spectrum to the one STABILITY_LAG frames later (0-1)
+        loud: Frames above the noise floor; only these are judged
+        context_frames: Frames of context around each frame
+        max_stability: Mean stability above which a context can be music
+        min_modulation: Syllable-rate modulation energy (variance of the mean-normalised
+            envelope in the 2-8 Hz band) below which a stable context is music
+        block_windows: Context windows per FFT block, bounds memory on long audio
+
+    Returns:
+        True for every frame whose context is music
+    """
+    half = context_frames // 2
+    energy, steady, weight = (np.pad(values.astype(np.float32), half, mode='edge')
+                              for values in (band_energy, stability, loud))
+    rates = np.fft.rfftfreq(context_frames, HOP_LENGTH / SAMPLE_RATE)
+    syllabic = (rates >= 2.0) & (rates <= 8.0)
+    # Context windows centred on every CONTEXT_HOP-th frame
+    centres = np.arange(0, len(band_energy), CONTEXT_HOP)
+    music = np.zeros(len(centres), dtype=bool)
+    for start in range(0, len(centres), block_windows):
+        index = centres[start:start + block_windows, None] + np.arange(context_frames)
+        envelope = energy[index] / (energy[index].mean(axis=1, keepdims=True) + 1e-10)
+        envelope -= envelope.mean(axis=1, keepdims=True)
+        modulation = 2 * (np.abs(np.fft.rfft(envelope, axis=1)[:, syllabic]) ** 2).sum(axis=1) / context_frames ** 2
+        loud_frames = weight[index].sum(axis=1)
+        mean_stability = (steady[index] * weight[index]).sum(axis=1) / np.maximum(loud_frames, 1)
+        music[start:start + block_windows] = (loud_frames > 0.1 * context_frames) & \
+            (mean_stability > max_stability) & (modulation < min_modulation)
+    return np.repeat(music, CONTEXT_HOP)[:len(band_energy)]
+
+
+def detect_speech(samples: np.ndarray, energy_margin_db: float = 6.0, min_energy_db: float = -55.0,
+                  min_speech_seconds: float = 0.25, min_silence_seconds: float = 0.5,
+                  padding_seconds: float = 0.2, block_frames: int = 4096, context_seconds: float = 1.0,
+                  max_stability: float = 0.8, min_modulation: float = 1.0) -> List[Tuple[int, int]]:
+    """
+    Find speech regions with an energy/spectral voice activity detector.
+
+    A frame counts as speech when it is louder than the adaptive noise floor (10th
+    percentile of frame energy) by energy_margin_db, most of its energy lies in the
+    300-3400 Hz speech band, its spectrum is not noise-flat, and the second of audio
+    around it is not music (see music_context). Decisions are merged across short
+    pauses and padded so word edges are kept.
+
+    Args:
+        samples: Mono float32 16 kHz samples
+        energy_margin_db: Required loudness above the noise floor
+        min_energy_db: Absolute loudness (dBFS) below which a frame is never speech
+        min_speech_seconds: Shorter speech regions are dropped
+        min_silence_seconds: Shorter pauses do not split a region
+        padding_seconds: Audio kept on both sides of each region
+        block_frames: Frames per FFT block, bounds memory on long audio
+        context_seconds: Audio judged as speech or music around each frame
+        max_stability: See music_context
+        min_modulation: See music_context
+
+    Returns:
+        (start, end) sample indices of the speech regions
+    """
+    if samples.size == 0:
+        return []
+
+    frames = frame_signal(samples)
+    energy_db = 20 * np.log10(frame_energy(samples) + 1e-10)
+
+    freqs = np.fft.rfftfreq(FRAME_LENGTH, 1 / SAMPLE_RATE)
+    band = (freqs >= 300) & (freqs <= 3400)
+    window = np.hanning(FRAME_LENGTH).astype(np.float32)
+    band_energy = np.empty(len(frames), dtype=np.float32)
+    band_ratio = np.empty(len(frames), dtype=np.float32)
+    flatness = np.empty(len(frames), dtype=np.float32)
+    stability = np.zeros(len(frames), dtype=np.float32)
+    previous = np.zeros((0, int(band.sum())), dtype=np.float32)
+    for start in range(0, len(frames), block_frames):
+        power = np.abs(np.fft.rfft(frames[start:start + block_frames] * window, axis=1)) ** 2 + 1e-10
+        total = power.sum(axis=1)
+        band_energy[start:start + block_frames] = power[:, band].sum(axis=1)
+        band_ratio[start:start + block_frames] = band_energy[start:start + block_frames] / total
+        flatness[start:start + block_frames] = np.exp(np.log(power).mean(axis=1)) / power.mean(axis=1)
+        # Correlation of the speech-band magnitude spectrum with the one STABILITY_LAG
+        # frames later; the last frames of a block are compared across the boundary
+        shape = np.sqrt(power[:, band])
+        shape -= shape.mean(axis=1, keepdims=True)
+        shape /= np.linalg.norm(shape, axis=1, keepdims=True) + 1e-10
+        shape = np.concatenate([previous, shape.astype(np.float32)])
+        first = start - len(previous)
+        if len(shape) > STABILITY_LAG:
+            stability[first:first + len(shape) - STABILITY_LAG] = \
+                np.sum(shape[STABILITY_LAG:] * shape[:-STABILITY_LAG], axis=1)
+        previous = shape[-STABILITY_LAG:]
+
+    threshold = max(np.percentile(energy_db, 10) + energy_margin_db, min_energy_db)
+    loud = energy_db > threshold
+    music = music_context(band_energy, stability, loud, int(context_seconds * SAMPLE_RATE / HOP_LENGTH),
+                          max_stability, min_modulation)
+    is_speech = loud & (band_ratio > 0.3) & (flatness < 0.5) & ~music
+
+    # Runs of speech frames as [start, end) frame indices
+    edges = np.diff(np.concatenate([[0], is_speech.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    frames_per_second = SAMPLE_RATE / HOP_LENGTH
+    regions = []
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_silence_seconds * frames_per_second:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    padding = int(padding_seconds * SAMPLE_RATE)
+    speech = []
+    for start, end in regions:
+        if end - start < min_speech_seconds * frames_per_second:
+            continue
+        sample_start = max(start * HOP_LENGTH - padding, 0)
+        sample_end = min((end - 1) * HOP_LENGTH + FRAME_LENGTH + padding, samples.size)
+        if speech and sample_start <= speech[-1][1]:
+            speech[-1] = (speech[-1][0], int(sample_end))
+        else:
+            speech.append((int(sample_start), int(sample_end)))
+    return speech
+
+
+def compact_regions(samples: np.ndarray, regions: List[Tuple[int, int]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Concatenate the given regions into one shorter signal.
+
+    Args:
+        samples: Mono float32 16 kHz samples
+        regions: (start, end) sample indices, in order
+
+    Returns:
+        The compacted samples and a (n_regions, 2) array of
+        (start in compacted seconds, start in original seconds) for map_to_original
+    """
+    if not regions:
+        return np.zeros(0, dtype=np.float32), np.zeros((0, 2))
+    lengths = np.array([end - start for start, end in regions])
+    timeline = np.column_stack([
+        np.concatenate([[0], np.cumsum(lengths)[:-1]]) / SAMPLE_RATE,
+        np.array([start for start, _ in regions]) / SAMPLE_RATE
+    ])
+    return np.concatenate([samples[start:end] for start, end in regions]), timeline
+
+
+def map_to_original(seconds: float, timeline: np.ndarray) -> float:
+    """
+    Map a time in the compacted signal back onto the original timeline.
+
+    Args:
+        seconds: Time in the compacted signal
+        timeline: Second value returned by compact_regions
+
+    Returns:
+        Time in the original signal
+    """
+    if len(timeline) == 0:
+        return seconds
+    index = max(int(np.searchsorted(timeline[:, 0], seconds, side='right')) - 1, 0)
+    return float(timeline[index, 1] + seconds - timeline[index, 0])
+
+
+def drop_timeline_head(timeline: np.ndarray, seconds: float) -> np.ndarray:
+    """
+    Timeline of a compacted signal after its first seconds are cut off.
+
+    Args:
+        timeline: Second value returned by compact_regions
+        seconds: Compacted seconds removed from the start
+
+    Returns:
+        The timeline of the rest, starting at 0
+    """
+    index = max(int(np.searchsorted(timeline[:, 0], seconds, side='right')) - 1, 0)
+    rest = np.array(timeline[index:], dtype=np.float64)
+    rest[0] = (seconds, map_to_original(seconds, timeline))
+    rest[:, 0] -= seconds
+    return rest
+
+
+def speech_stats(total_samples: int, regions: List[Tuple[int, int]]) -> Dict[str, float]:
+    """Summarise how much audio the VAD kept and skipped."""
+    speech_samples = sum(end - start for start, end in regions)
+    return {
+        'total_seconds': total_samples / SAMPLE_RATE,
+        'speech_seconds': speech_samples / SAMPLE_RATE,
+        'skipped_seconds': (total_samples - speech_samples) / SAMPLE_RATE,
+        'speech_regions': len(regions)
+    }
@@ -0,0 +1,350 @@
+import sqlite3
+import threading
+import numpy as np
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from audio_analysis import frame_signal
+from video_processor import SAMPLE_RATE
+
+# 64 ms frames with a 32 ms hop; peaks are looked for below 4 kHz, where speech energy is
+FFT_SIZE = 1024
+FP_HOP = 512
+MAX_BIN = 256
+# A peak is the loudest point within this many bins/frames and stands out from its block
+NEIGHBOUR_BINS = 10
+NEIGHBOUR_FRAMES = 10
+PEAK_MARGIN_DB = 10.0
+# Every peak is paired with the next FAN_OUT peaks less than 64 frames (~2 s) later
+FAN_OUT = 5
+MAX_DELTA = 63
+FRAMES_PER_SECOND = SAMPLE_RATE / FP_HOP
+
+
+def find_peaks(samples: np.ndarray, block_frames: int = 4096) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the spectral peaks of a signal (the constellation the hashes are made of).
+
+    Args:
+        samples: Mono float32 16 kHz samples
+        block_frames: Frames per FFT block, bounds memory on long audio
+
+    Returns:
+        (frame, bin) arrays of the peaks, ordered by frame then bin
+    """
+    if samples.size == 0:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+    frames = frame_signal(samples, FFT_SIZE, FP_HOP)
+    window = np.hanning(FFT_SIZE).astype(np.float32)
+    peak_frames, peak_bins = [], []
+    for start in range(0, len(frames), block_frames):
+        # Blocks overlap by the neighbourhood so peaks at their edges are judged like any other
+        low = max(start - NEIGHBOUR_FRAMES, 0)
+        high = min(start + block_frames + NEIGHBOUR_FRAMES, len(frames))
+        spectrum = np.abs(np.fft.rfft(frames[low:high] * window, axis=1))[:, 1:MAX_BIN]
+        level = 20 * np.log10(spectrum + 1e-10)
+
+        padded = np.pad(level, ((NEIGHBOUR_FRAMES, NEIGHBOUR_FRAMES), (NEIGHBOUR_BINS, NEIGHBOUR_BINS)),
+                        constant_values=-np.inf)
+        # Separable maximum filter: over frequency, then over time
+        local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * NEIGHBOUR_BINS + 1, axis=1).max(axis=-1)
+        local_max = np.lib.stride_tricks.sliding_window_view(local_max, 2 * NEIGHBOUR_FRAMES + 1, axis=0).max(axis=-1)
+        is_peak = (level == local_max) & (level > np.median(level) + PEAK_MARGIN_DB)
+
+        frame, bin_ = np.nonzero(is_peak)
+        frame += low
+        keep = (frame >= start) & (frame < start + block_frames)
+        peak_frames.append(frame[keep])
+        peak_bins.append(bin_[keep] + 1)
+
+    return np.concatenate(peak_frames).astype(np.int32), np.concatenate(peak_bins).astype(np.int32)
+
+
+def fingerprint(samples: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the audio fingerprint of a signal as spectral-peak pair hashes.
+
+    Each hash packs the bins of two nearby peaks and their distance in frames, so it
+    survives re-encoding and does not depend on where the audio starts; the frame
+    of its first peak places it in time.
+
+    Args:
+        samples: Mono float32 16 kHz samples
+
+    Returns:
+        (hashes, frames) arrays; hashes are uint32, frames count FP_HOP samples
+    """
+    return pair_peaks(*find_peaks(samples))
+
+
+def pair_peaks(frames: np.ndarray, bins: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash pairs of nearby peaks (see fingerprint); peaks ordered by frame then bin."""
+    hashes, times = [], []
+    for step in range(1, FAN_OUT + 1):
+        delta = frames[step:] - frames[:-step]
+        valid = (delta > 0) & (delta <= MAX_DELTA)
+        anchor = np.flatnonzero(valid)
+        hashes.append((bins[anchor].astype(np.uint32) << 14) | (bins[anchor + step].astype(np.uint32) << 6)
+                      | delta[anchor].astype(np.uint32))
+        times.append(frames[anchor])
+    if not hashes:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+    return np.concatenate(hashes), np.concatenate(times)
+
+
+class Fingerprinter:
+    """
+    Compute fingerprint() of audio that arrives in consecutive pieces, e.g. decoded windows.
+
+    Only the audio not yet searched for peaks is kept, so memory stays bounded
+    however long the recording is; the peaks are paired in finish().
+    """
+    def __init__(self, block_frames: int = 4096):
+        """
+        Initialize the fingerprinter.
+
+        Args:
+            block_frames: Frames searched for peaks at a time
+        """
+        self.block_frames = block_frames
+        self.samples = 0
+        self._buffer = np.zeros(0, dtype=np.float32)
+        # Frame of the first buffered sample, and the first frame whose peaks are still to be found
+        self._buffer_frame = 0
+        self._next_frame = 0
+        self._frames, self._bins = [], []
+
+    @property
+    def duration(self) -> float:
+        """Seconds of audio added so far."""
+        return self.samples / SAMPLE_RATE
+
+    def add(self, samples: np.ndarray):
+        """Add the next piece of mono float32 16 kHz audio (any length; long audio is taken in blocks)."""
+        step = self.block_frames * FP_HOP
+        for start in range(0, samples.size, step):
+            piece = samples[start:start + step]
+            self.samples += piece.size
+            self._buffer = np.concatenate([self._buffer, piece])
+            while (self._buffer.size - FFT_SIZE) // FP_HOP + 1 >= self.block_frames + 2 * NEIGHBOUR_FRAMES:
+                self._search(final=False)
+
+    def follow(self, windows: Iterator[Tuple[float, np.ndarray]]) -> Iterator[Tuple[float, np.ndarray]]:
+        """Pass (start, samples) windows through, adding each one (see VideoProcessor.stream_audio)."""
+        try:
+            for start, samples in windows:
+                self.add(samples)
+                yield start, samples
+        finally:
+            windows.close()
+
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Search the rest of the audio and return the (hashes, frames) of everything added."""
+        if self._buffer.size:
+            self._search(final=True)
+        if not self._frames:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+        return pair_peaks(np.concatenate(self._frames), np.concatenate(self._bins))
+
+    def _search(self, final: bool):
+        frames, bins = find_peaks(self._buffer, self.block_frames + 2 * NEIGHBOUR_FRAMES)
+        frames += self._buffer_frame
+        total = self._buffer_frame + (max(self._buffer.size, FFT_SIZE) - FFT_SIZE) // FP_HOP + 1
+        # Peaks in the last frames are judged once the audio after them has arrived
+        limit = total if final else total - NEIGHBOUR_FRAMES
+        keep = (frames >= self._next_frame) & (frames < limit)
+        self._frames.append(frames[keep])
+        self._bins.append(bins[keep])
+        self._next_frame = limit
+        if final:
+            self._buffer = np.zeros(0, dtype=np.float32)
+            return
+        # Keep the neighbourhood before the next unsearched frame
+        start = limit - NEIGHBOUR_FRAMES
+        self._buffer = self._buffer[(start - self._buffer_frame) * FP_HOP:]
+        self._buffer_frame = start
+
+
+def shift_segments(segments: List[Dict[str, Any]], offset: float, duration: float) -> List[Dict[str, Any]]:
+    """
+    Move transcript segments onto the timeline of a copy starting `offset` seconds in.
+
+    Args:
+        segments: Segments of the original transcript
+        offset: Position in the original where the copy starts (negative if the copy
+            has extra audio before it)
+        duration: Duration of the copy in seconds
+
+    Returns:
+        The segments that fall inside the copy, renumbered and with shifted times
+    """
+    shifted = []
+    for segment in segments:
+        start, end = segment['start'] - offset, segment['end'] - offset
+        # Segments cut off by a trim are dropped rather than attributed half their text
+        if start < -0.5 or end > duration + 0.5 or end <= 0:
+            continue
+        segment = dict(segment)
+        segment['id'] = len(shifted)
+        segment['start'] = max(start, 0.0)
+        segment['end'] = min(end, duration)
+        shifted.append(segment)
+    return shifted
+
+
+class FingerprintIndex:
+    """
+    Persistent audio fingerprint index backed by SQLite.
+
+    Maps every hash to the videos and frames it occurs at, so a new upload can be
+    matched against the library before it is transcribed. Shared by the API process
+    and the ingestion workers; each process opens its own connection.
+    """
+    def __init__(self, db_path: str = "fingerprints.db", max_query_hashes: int = 20000):
+        """
+        Initialize the index.
+
+        Args:
+            db_path: Path of the SQLite database file
+            max_query_hashes: Hashes of a query looked up at most, spread evenly over it
+        """
+        self.db_path = db_path
+        self.max_query_hashes = max_query_hashes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS videos (
+                id INTEGER PRIMARY KEY,
+                video_path TEXT UNIQUE NOT NULL,
+                duration REAL NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                hash INTEGER NOT NULL,
+                video_id INTEGER NOT NULL,
+                frame INTEGER NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fingerprints_hash ON fingerprints (hash)")
+        self._conn.commit()
+
+    def add(self, video_path: str, hashes: np.ndarray, frames: np.ndarray, duration: float):
+        """
+        Store (or replace) the fingerprint of a video.
+
+        Args:
+            video_path: Path the video is indexed under
+            hashes: Hashes from fingerprint()
+            frames: Frames from fingerprint()
+            duration: Duration of the audio in seconds
+        """
+        with self._lock, self._conn:
+            self._delete(video_path)
+            video_id = self._conn.execute("INSERT INTO videos (video_path, duration) VALUES (?, ?)",
+                                          (video_path, duration)).lastrowid
+            self._conn.executemany("INSERT INTO fingerprints (hash, video_id, frame) VALUES (?, ?, ?)",
+                                   zip(hashes.tolist(), [video_id] * len(hashes), frames.tolist()))
+
+    def remove(self, video_path: str):
+        """Drop the fingerprint of a video."""
+        with self._lock, self._conn:
+            self._delete(video_path)
+
+    def _delete(self, video_path: str):
+        row = self._conn.execute("SELECT id FROM videos WHERE video_path = ?", (video_path,)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM fingerprints WHERE video_id = ?", (row[0],))
+            self._conn.execute("DELETE FROM videos WHERE id = ?", (row[0],))
+
+    def match(self, hashes: np.ndarray, frames: np.ndarray, duration: float, threshold: float = 0.15,
+              min_matches: int = 20, exclude: Optional[str] = None,
+              video_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find a video whose audio contains the queried audio.
+
+        Matching hashes vote for the time offset between the two recordings; the
+        share of the query's hashes agreeing on the best offset is the score. Only
+        videos covering the whole query at that offset qualify, so trimmed copies
+        match their original but not the other way round.
+
+        Args:
+            hashes: Hashes of the query from fingerprint()
+            frames: Frames of the query from fingerprint()
+            duration: Duration of the query in seconds
+            threshold: Minimum score
+            min_matches: Minimum number of hashes agreeing on the offset
+            exclude: Video path never matched (the query itself)
+            video_path: Only match this video
+
+        Returns:
+            {'video_path', 'offset', 'score', 'matches', 'duration'} of the best match,
+            where offset is the position in that video at which the query starts and
+            duration is that video's, or None
+        """
+        if hashes.size == 0:
+            return None
+        if hashes.size > self.max_query_hashes:
+            picked = np.linspace(0, hashes.size - 1, self.max_query_hashes).astype(np.int64)
+            hashes, frames = hashes[picked], frames[picked]
+
+        order = np.argsort(hashes, kind='stable')
+        query_hashes, query_frames = hashes[order], frames[order]
+        unique = np.unique(query_hashes).tolist()
+        rows = []
+        with self._lock:
+            videos = {video_id: (video_path, video_duration) for video_id, video_path, video_duration
+                      in self._conn.execute("SELECT id, video_path, duration FROM videos")}
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                rows.extend(self._conn.execute(
+                    f"SELECT hash, video_id, frame FROM fingerprints WHERE hash IN ({','.join('?' * len(batch))})",
+                    batch).fetchall())
+        if not rows:
+            return None
+
+        found = np.array(rows, dtype=np.int64)
+        # Pair every stored occurrence with every query occurrence of the same hash
+        left = np.searchsorted(query_hashes, found[:, 0], 'left')
+        counts = np.searchsorted(query_hashes, found[:, 0], 'right') - left
+        row_index = np.repeat(np.arange(len(found)), counts)
+        query_index = np.arange(counts.sum()) + np.repeat(left - np.cumsum(counts) + counts, counts)
+        offsets = found[row_index, 2] - query_frames[query_index]
+        video_ids = found[row_index, 1]
+
+        candidates = []
+        for video_id in np.unique(video_ids).tolist():
+            if video_id not in videos or videos[video_id][0] == exclude or \
+                    (video_path is not None and videos[video_id][0] != video_path):
+                continue
+            video_offsets = offsets[video_ids == video_id]
+            base = video_offsets.min()
+            votes = np.bincount(video_offsets - base)
+            # Copies rarely start on the same frame grid, so votes spill into the neighbouring offset
+            window = np.convolve(votes, np.ones(3, dtype=np.int64), mode='same')
+            best = int(np.argmax(window))
+            neighbourhood = np.arange(max(best - 1, 0), min(best + 2, len(votes)))
+            matches = int(window[best])
+            offset = float(np.average(neighbourhood, weights=votes[neighbourhood]) + base) / FRAMES_PER_SECOND
+            candidates.append((matches, video_id, offset))
+
+        for matches, video_id, offset in sorted(candidates, reverse=True):
+            score = matches / hashes.size
+            if matches < min_matches or score < threshold:
+                break
+            matched_path, video_duration = videos[video_id]
+            # A second of slack for container durations and the frame grid
+            if offset < -1.0 or offset + duration > video_duration + 1.0:
+                continue
+            return {'video_path': matched_path, 'offset': round(offset, 3), 'score': round(score, 4),
+                    'matches': matches, 'duration': video_duration}
+        return None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
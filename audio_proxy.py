@@ -0,0 +1,112 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional
+
+import ffmpeg
+
+from ffmpeg_executor import FFmpegExecutor, FFmpegError, default_executor, PRIORITY_BACKGROUND
+
+# Encoder settings per proxy codec: Opus at speech bitrate, or lossless FLAC
+PROXY_CODECS = {
+    'opus': {'extension': '.opus', 'format': 'ogg', 'acodec': 'libopus'},
+    'flac': {'extension': '.flac', 'format': 'flac', 'acodec': 'flac'}
+}
+
+
+class AudioProxyStore:
+    """
+    Compact mono 16 kHz audio copies of uploaded videos.
+
+    A proxy is a few percent of the video's size and decodes much faster, so every
+    transcription after the first (refinement, new model or language, resumed jobs)
+    reads the proxy instead of demuxing the original video again.
+    """
+    def __init__(self, storage_dir: str = "audio_proxies", codec: str = "opus", bitrate: str = "24k",
+                 executor: Optional[FFmpegExecutor] = None):
+        """
+        Initialize the proxy store.
+
+        Args:
+            storage_dir: Directory holding the proxies
+            codec: 'opus' (lossy, smallest) or 'flac' (lossless)
+            bitrate: Opus bitrate (ignored for FLAC)
+            executor: Executor running the ffmpeg processes (the process-wide default if None)
+        """
+        if codec not in PROXY_CODECS:
+            raise ValueError(f"Unsupported audio proxy codec: {codec}")
+        self.storage_dir = Path(storage_dir)
+        self.storage_dir.mkdir(exist_ok=True)
+        self.codec = codec
+        self.bitrate = bitrate
+        self.executor = executor or default_executor()
+
+    def proxy_path(self, video_path: str) -> Path:
+        """Path of the proxy of a video (whether or not it exists)."""
+        key = hashlib.sha1(os.path.abspath(video_path).encode('utf-8')).hexdigest()[:16]
+        return self.storage_dir / f"{Path(video_path).stem}_{key}{PROXY_CODECS[self.codec]['extension']}"
+
+    def get(self, video_path: str) -> Optional[str]:
+        """
+        Get the proxy of a video if it is up to date.
+
+        Returns:
+            Path of the proxy, or None if there is none or the video changed since
+        """
+        path = self.proxy_path(video_path)
+        try:
+            if path.stat().st_mtime >= os.path.getmtime(video_path):
+                return str(path)
+        except FileNotFoundError:
+            pass
+        return None
+
+    def ensure(self, video_path: str) -> str:
+        """
+        Create the proxy of a video unless an up-to-date one exists.
+
+        Only the audio stream is demuxed and decoded; the video stream is skipped.
+
+        Args:
+            video_path: Path to the video file
+
+        Returns:
+            Path of the proxy
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        existing = self.get(video_path)
+        if existing:
+            return existing
+
+        path = self.proxy_path(video_path)
+        settings = PROXY_CODECS[self.codec]
+        options = {'format': settings['format'], 'acodec': settings['acodec'], 'ac': 1, 'ar': '16k'}
+        if self.codec == 'opus':
+            options['audio_bitrate'] = self.bitrate
+
+        temp_path = str(path) + '.tmp'
+        try:
+            stream = ffmpeg.output(ffmpeg.input(video_path).audio, temp_path, **options)
+            # Nobody waits for a proxy; transcription decodes the video meanwhile
+            self.executor.run(ffmpeg.compile(stream, overwrite_output=True), priority=PRIORITY_BACKGROUND,
+                              label=f"audio proxy {os.path.basename(video_path)}")
+            os.replace(temp_path, path)
+        except FFmpegError as e:
+            raise Exception(f"FFmpeg error: {e}")
+        finally:
+            # Failed, timed out or cancelled
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return str(path)
+
+    def source_for(self, video_path: str) -> str:
+        """The file to decode a video's audio from: its proxy if available, else the video."""
+        return self.get(video_path) or video_path
+
+    def remove(self, video_path: str):
+        """Delete the proxy of a video, if any."""
+        path = self.proxy_path(video_path)
+        if path.exists():
+            path.unlink()
@@ -0,0 +1,296 @@
+import queue
+import threading
+import time
+import numpy as np
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
+
+# Whisper works on 30 s windows of 3000 mel frames; a timestamp token is worth two frames (20 ms)
+N_FRAMES = 3000
+INPUT_STRIDE = 2
+TIME_PRECISION = 0.02
+FRAMES_PER_SECOND = 100
+
+# Same fallback rules as whisper.transcribe: re-decode a window whose text is repetitive
+# or unlikely at a higher temperature, and drop windows that are silence
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+FALLBACK_TEMPERATURES = (0.2, 0.4, 0.6, 0.8, 1.0)
+
+
+class _WindowRequest:
+    """One 30 s mel window waiting for a batch slot, with its caller's temperature schedule and search width."""
+    def __init__(self, mel: Any, language: Optional[str], temperatures: Tuple[float, ...], best_of: Optional[int],
+                 beam_size: Optional[int]):
+        self.mel = mel
+        self.language = language
+        self.temperatures = temperatures
+        self.best_of = best_of
+        self.beam_size = beam_size
+        self.future = Future()
+
+    def options(self, language: str, temperature: float) -> Dict[str, Any]:
+        """DecodingOptions arguments at one temperature: beam search at 0, best-of sampling above, as whisper.transcribe."""
+        return {
+            'language': language,
+            'temperature': temperature,
+            'beam_size': self.beam_size if temperature == 0 else None,
+            'best_of': self.best_of if temperature > 0 else None
+        }
+
+
+class BatchedTranscriptionEngine:
+    """
+    Decode 30 s windows from many concurrent transcriptions in shared forward passes.
+
+    Every caller of transcribe() walks its own audio window by window like
+    whisper.transcribe, but instead of running the model itself it queues each
+    window. A single decoding thread collects the windows of all active calls
+    into batches, runs one encoder pass per batch and one decoder pass per
+    language in it, and hands every result back to the call it belongs to.
+    """
+    def __init__(self, transcriber, batch_size: int = 8, max_wait: float = 0.05):
+        """
+        Initialize the engine; the decoding thread starts with the first request.
+
+        Args:
+            transcriber: Transcriber whose (lazily loaded) model is used
+            batch_size: Most windows decoded together
+            max_wait: Seconds to wait for more windows once one is queued
+        """
+        self.transcriber = transcriber
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._requests = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.stats = {'batches': 0, 'windows': 0}
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = None,
+                   decode_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Transcribe float32 16 kHz samples; blocks until done. Safe to call from many threads.
+
+        Windows are decoded without the previous window's text as prompt, so that
+        windows of different calls can share a batch; condition_on_previous_text is
+        ignored. Windows with the same language, first temperature and search width
+        (beam_size, or best_of when sampling) are decoded together.
+
+        Args:
+            audio: Mono float32 16 kHz samples
+            language: Language code (optional, detected on the first window if None)
+            decode_options: whisper transcribe() 'temperature' schedule, 'beam_size'
+                and 'best_of' (whisper's defaults if missing)
+
+        Returns:
+            Transcription result with text, segments and language, like model.transcribe
+        """
+        import torch
+        import whisper
+
+        decode_options = decode_options or {}
+        temperatures = decode_options.get('temperature', (0.0,) + FALLBACK_TEMPERATURES)
+        temperatures = tuple(temperatures) if isinstance(temperatures, (list, tuple)) else (temperatures,)
+        best_of = decode_options.get('best_of')
+        beam_size = decode_options.get('beam_size')
+
+        model = self.transcriber.model
+        mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels, padding=whisper.audio.N_SAMPLES)
+        content_frames = mel.shape[-1] - N_FRAMES
+        tokenizer = None
+
+        segments = []
+        seek = 0
+        while seek < content_frames:
+            segment_size = min(N_FRAMES, content_frames - seek)
+            mel_segment = whisper.pad_or_trim(mel[:, seek:seek + segment_size], N_FRAMES)
+            language, result = self._submit(mel_segment, language, temperatures, best_of, beam_size).result()
+            if tokenizer is None:
+                tokenizer = whisper.tokenizer.get_tokenizer(
+                    model.is_multilingual, num_languages=model.num_languages, language=language, task='transcribe')
+
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                seek += segment_size
+                continue
+
+            time_offset = seek / FRAMES_PER_SECOND
+            window_segments, consumed = _parse_tokens(
+                torch.tensor(result.tokens), tokenizer, time_offset, segment_size)
+            for segment in window_segments:
+                if segment['text'].strip():
+                    segment['id'] = len(segments)
+                    segment['temperature'] = result.temperature
+                    segment['avg_logprob'] = result.avg_logprob
+                    segment['compression_ratio'] = result.compression_ratio
+                    segment['no_speech_prob'] = result.no_speech_prob
+                    segments.append(segment)
+            seek += consumed
+
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': language
+        }
+
+    def _submit(self, mel_segment: Any, language: Optional[str], temperatures: Tuple[float, ...],
+                best_of: Optional[int], beam_size: Optional[int]) -> Future:
+        """Queue one window; the future resolves to (language, DecodingResult)."""
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="whisper-batcher", daemon=True)
+                self._thread.start()
+        request = _WindowRequest(mel_segment, language, temperatures, best_of, beam_size)
+        self._requests.put(request)
+        return request.future
+
+    def _collect_batch(self) -> List[_WindowRequest]:
+        """Wait for a window, then gather more for up to max_wait seconds."""
+        batch = [self._requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        """Decoding thread: batch queued windows until the process exits."""
+        while True:
+            batch = self._collect_batch()
+            try:
+                for request, outcome in zip(batch, self._decode_batch(batch)):
+                    request.future.set_result(outcome)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _decode_batch(self, batch: List[_WindowRequest]) -> List[Tuple[str, Any]]:
+        """
+        Run one encoder pass over the batch and one decoder pass per set of decoding options.
+
+        Returns:
+            (language, DecodingResult) for each request, in order
+        """
+        import torch
+        import whisper
+
+        model = self.transcriber.model
+        with torch.no_grad():
+            mel = torch.stack([request.mel for request in batch]).to(model.device)
+            features = model.encoder(mel)
+
+            languages = [request.language for request in batch]
+            undetected = [i for i, language in enumerate(languages) if language is None]
+            if undetected:
+                if model.is_multilingual:
+                    _, probs = model.detect_language(features[undetected])
+                    for i, language_probs in zip(undetected, probs):
+                        languages[i] = max(language_probs, key=language_probs.get)
+                else:
+                    for i in undetected:
+                        languages[i] = 'en'
+
+            outcomes = [None] * len(batch)
+            groups = {}
+            for i, (language, request) in enumerate(zip(languages, batch)):
+                options = request.options(language, request.temperatures[0])
+                groups.setdefault(tuple(sorted(options.items())), []).append(i)
+            for key, members in groups.items():
+                options = whisper.DecodingOptions(**dict(key), fp16=False)
+                results = _decode(model, features[members], options)
+                for i, result in zip(members, results):
+                    outcomes[i] = (languages[i], self._fallback(features[i], languages[i], result, batch[i]))
+
+        self.stats['batches'] += 1
+        self.stats['windows'] += len(batch)
+        return outcomes
+
+    def _fallback(self, features: Any, language: str, result: Any, request: _WindowRequest) -> Any:
+        """Re-decode a single window at the request's later temperatures while the result looks broken."""
+        import whisper
+
+        for temperature in request.temperatures[1:]:
+            if not _needs_fallback(result):
+                break
+            options = whisper.DecodingOptions(**request.options(language, temperature), fp16=False)
+            result = whisper.decode(self.transcriber.model, features, options)
+        return result
+
+
+def _decode(model: Any, features: Any, options: Any) -> List[Any]:
+    """
+    whisper.decode for a batch of encoded windows that also works with beam search and best-of.
+
+    DecodingTask.run repeats the prompt tokens once per beam (or sample) but not the
+    audio features, which only broadcasts for a single window. For a batch the
+    features are repeated to match, and the language step sees one row per window.
+    """
+    from whisper.decoding import DecodingTask
+
+    task = DecodingTask(model, options)
+    n_group = task.n_group
+    if n_group > 1 and features.shape[0] > 1:
+        encode, detect_language = task._get_audio_features, task._detect_language
+        task._get_audio_features = lambda mel: encode(mel).repeat_interleave(n_group, dim=0)
+        task._detect_language = lambda audio_features, tokens: detect_language(audio_features[::n_group], tokens)
+    return task.run(features)
+
+
+def _needs_fallback(result: Any) -> bool:
+    """Whether whisper.transcribe would retry this window at a higher temperature."""
+    if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+        return False
+    return result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+
+
+def _parse_tokens(tokens: Any, tokenizer: Any, time_offset: float, segment_size: int) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Split the tokens of one window into timestamped segments.
+
+    Args:
+        tokens: Decoded token ids of the window (torch tensor)
+        tokenizer: Whisper tokenizer
+        time_offset: Start of the window in seconds
+        segment_size: Mel frames of real audio in the window
+
+    Returns:
+        (segments, mel frames consumed); a segment cut off by the end of the window
+        is not consumed, so the next window starts at its beginning
+    """
+    timestamp_begin = tokenizer.timestamp_begin
+
+    def make_segment(start: float, end: float, text_tokens: List[int]) -> Dict[str, Any]:
+        text_tokens = [token for token in text_tokens if token < tokenizer.eot]
+        return {'start': start, 'end': end, 'text': tokenizer.decode(text_tokens), 'tokens': text_tokens}
+
+    timestamp_tokens = tokens.ge(timestamp_begin)
+    single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+    consecutive = (timestamp_tokens[:-1] & timestamp_tokens[1:]).nonzero().flatten().add(1)
+
+    if len(consecutive) > 0:
+        slices = consecutive.tolist()
+        if single_timestamp_ending:
+            slices.append(len(tokens))
+        segments = []
+        last_slice = 0
+        for current_slice in slices:
+            sliced = tokens[last_slice:current_slice]
+            start = time_offset + (sliced[0].item() - timestamp_begin) * TIME_PRECISION
+            end = time_offset + (sliced[-1].item() - timestamp_begin) * TIME_PRECISION
+            segments.append(make_segment(start, end, sliced.tolist()))
+            last_slice = current_slice
+        if single_timestamp_ending:
+            return segments, segment_size
+        last_timestamp = tokens[last_slice - 1].item() - timestamp_begin
+        # Always move forward, even if the model only produced <|0.00|> pairs
+        return segments, last_timestamp * INPUT_STRIDE or segment_size
+
+    duration = segment_size / FRAMES_PER_SECOND
+    timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+    if len(timestamps) > 0 and timestamps[-1].item() != timestamp_begin:
+        duration = (timestamps[-1].item() - timestamp_begin) * TIME_PRECISION
+    return [make_segment(time_offset, time_offset + duration, tokens.tolist())], segment_size
@@ -0,0 +1,224 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Each measurement runs in a fresh interpreter so imports start cold
+STARTUP_PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    client.get("/")
+    first_request = time.perf_counter()
+    while client.get("/ready").status_code != 200 and main.startup_state["error"] is None:
+        time.sleep(0.005)
+    ready = time.perf_counter()
+    client.get("/index-info")
+    index_info = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - start,
+    "first_request_seconds": first_request - start,
+    "ready_seconds": ready - start,
+    "first_index_request_seconds": index_info - start,
+    "heavy_modules_loaded": sorted(m for m in ("torch", "whisper", "faiss", "openai", "PIL") if m in sys.modules)
+}))
+"""
+
+EAGER_MODEL_PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import whisper
+whisper.load_model(sys.argv[1])
+print(json.dumps({"whisper_load_seconds": time.perf_counter() - start}))
+"""
+
+# Model load in a fresh process (imports excluded): whisper's checkpoint vs. Transcriber's memory-mapped cache
+MODEL_LOAD_PROBE = r"""
+import json, sys, time
+import whisper
+from transcriber import Transcriber
+from configuration import video_config
+start = time.perf_counter()
+if sys.argv[2] == "checkpoint":
+    whisper.load_model(sys.argv[1], device="cpu")
+else:
+    Transcriber(sys.argv[1], sys.argv[2] == "int8", cache_dir=video_config.model_cache_dir).model
+print(json.dumps({"load_seconds": time.perf_counter() - start}))
+"""
+
+
+def _run_probe(code: str, *args: str) -> dict:
+    """Run a probe script in a new interpreter and parse its last output line."""
+    completed = subprocess.run([sys.executable, "-c", code, *args], capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "probe failed")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def benchmark_startup(runs: int = 5):
+    """Measure import-to-first-request time of the API process."""
+    print("=== Startup Benchmark ===\n")
+    samples = [_run_probe(STARTUP_PROBE) for _ in range(runs)]
+
+    for key in ("import_seconds", "first_request_seconds", "ready_seconds", "first_index_request_seconds"):
+        values = [sample[key] for sample in samples]
+        print(f"{key:30s} median {statistics.median(values):.3f}s  min {min(values):.3f}s  max {max(values):.3f}s")
+    print(f"Heavy modules loaded at startup: {samples[-1]['heavy_modules_loaded'] or 'none'}")
+
+    # What the old eager startup paid on top: importing torch/whisper and loading the model
+    from configuration import video_config
+    try:
+        eager = _run_probe(EAGER_MODEL_PROBE, video_config.whisper_model)
+        print(f"Eager Whisper '{video_config.whisper_model}' load (no longer paid at startup): {eager['whisper_load_seconds']:.3f}s")
+    except RuntimeError as e:
+        print(f"Eager Whisper load not measured: {e}")
+
+
+def benchmark_model_load(model_name: str, runs: int = 3):
+    """Measure Whisper model load time in fresh processes, before and after the weight cache."""
+    print(f"=== Model Load Benchmark ({model_name}) ===\n")
+    # Fill the caches (and the OS page cache) before measuring
+    for variant in ("cached", "int8"):
+        _run_probe(MODEL_LOAD_PROBE, model_name, variant)
+
+    print(f"{'variant':12s} {'median':>8s} {'min':>8s}")
+    for variant in ("checkpoint", "cached", "int8"):
+        seconds = [_run_probe(MODEL_LOAD_PROBE, model_name, variant)["load_seconds"] for _ in range(runs)]
+        print(f"{variant:12s} {statistics.median(seconds):7.3f}s {min(seconds):7.3f}s")
+
+
+def _edit_distance(reference: list, hypothesis: list) -> int:
+    """Levenshtein distance between two token sequences."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_token in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_token in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_token != hyp_token)))
+        previous = current
+    return previous[-1]
+
+
+def error_rates(reference: str, hypothesis: str) -> dict:
+    """Word error rate (whitespace tokens) and character error rate (for Chinese text)."""
+    ref_words, hyp_words = reference.split(), hypothesis.split()
+    ref_chars = [c for c in reference if not c.isspace()]
+    hyp_chars = [c for c in hypothesis if not c.isspace()]
+    return {
+        "wer": _edit_distance(ref_words, hyp_words) / max(len(ref_words), 1),
+        "cer": _edit_distance(ref_chars, hyp_chars) / max(len(ref_chars), 1)
+    }
+
+
+def benchmark_quantization(audio_path: str, thread_counts: list):
+    """Compare float32 and int8 Whisper: load time, real-time factor and WER/CER against float."""
+    from configuration import video_config
+    from transcriber import Transcriber
+    from video_processor import VideoProcessor
+
+    print("=== Quantization Benchmark ===\n")
+    samples = VideoProcessor().read_audio(audio_path)
+    duration = samples.size / 16000
+    print(f"Audio: {audio_path} ({duration:.1f}s), model: {video_config.whisper_model}\n")
+
+    reference = None
+    print(f"{'mode':6s} {'threads':>7s} {'load':>8s} {'transcribe':>11s} {'RTF':>6s} {'WER':>6s} {'CER':>6s}")
+    for threads in thread_counts:
+        for quantize in (False, True):
+            transcriber = Transcriber(video_config.whisper_model, quantize, threads, video_config.model_cache_dir)
+            start = time.perf_counter()
+            transcriber.model
+            load_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            text = transcriber.transcribe_samples(samples).get('text', '')
+            transcribe_seconds = time.perf_counter() - start
+
+            if reference is None:
+                reference = text
+            rates = error_rates(reference, text)
+            print(f"{'int8' if quantize else 'float':6s} {threads:7d} {load_seconds:7.2f}s {transcribe_seconds:10.2f}s "
+                  f"{transcribe_seconds / duration:6.3f} {rates['wer']:6.3f} {rates['cer']:6.3f}")
+    print("\nWER/CER are measured against the first float32 transcript.")
+
+
+def benchmark_batching(video_path: str, job_counts: list):
+    """
+    Compare ingestion throughput of concurrent jobs: one job at a time vs job threads with batched decoding.
+
+    Jobs run through VideoSearchTool.iter_video_chunks with the configured quality
+    profile, as ingestion workers run them, so a profile that bypasses the batched
+    engine shows up as no batches.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from configuration import video_config
+    from video_search_tool import VideoSearchTool
+
+    print("=== Batched Decoding Benchmark ===\n")
+    # Every run transcribes the whole video
+    video_config.transcribe_checkpoints = False
+    tool = VideoSearchTool(role='worker')
+    profile = video_config.quality_profile
+    print(f"Video: {video_path}, profile: {profile}\n")
+
+    def run_job(_):
+        state = {}
+        for _chunk in tool.iter_video_chunks(video_path, video_config.chunk_duration, None, state, False, profile):
+            pass
+        return state.get('total_seconds', 0.0)
+
+    def profile_transcriber(batched: bool):
+        # Profile transcribers take the engine of their base when they are created
+        tool.transcriber.engine = None
+        if batched:
+            tool.transcriber.enable_batching(video_config.whisper_batch_size, video_config.whisper_batch_wait)
+        tool._profile_transcribers.clear()
+        transcriber = tool.transcriber_for_profile(profile)
+        transcriber.model
+        return transcriber
+
+    print(f"{'jobs':>4s} {'mode':8s} {'wall':>8s} {'audio s/s':>10s} {'batches':>8s}")
+    for jobs in job_counts:
+        profile_transcriber(False)
+        start = time.perf_counter()
+        audio = sum(run_job(i) for i in range(jobs))
+        sequential = time.perf_counter() - start
+        print(f"{jobs:4d} {'separate':8s} {sequential:7.2f}s {audio / sequential:10.2f} {'-':>8s}")
+
+        transcriber = profile_transcriber(True)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(jobs) as pool:
+            audio = sum(pool.map(run_job, range(jobs)))
+        batched = time.perf_counter() - start
+        batches = transcriber.engine.stats['batches'] if transcriber.engine else '-'
+        print(f"{jobs:4d} {'batched':8s} {batched:7.2f}s {audio / batched:10.2f} {batches:>8}")
+        if transcriber.engine is None:
+            print(f"Profile '{profile}' does not use the batched engine")
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "startup"
+    if mode == "startup":
+        benchmark_startup()
+    elif mode == "quantization":
+        if len(sys.argv) < 3:
+            print("Usage: python benchmark.py quantization <audio_or_video_path> [threads ...]")
+            sys.exit(1)
+        thread_counts = [int(arg) for arg in sys.argv[3:]] or [os.cpu_count() or 1]
+        benchmark_quantization(sys.argv[2], thread_counts)
+    elif mode == "batching":
+        if len(sys.argv) < 3:
+            print("Usage: python benchmark.py batching <video_path> [concurrent jobs ...]")
+            sys.exit(1)
+        job_counts = [int(arg) for arg in sys.argv[3:]] or [1, 4]
+        benchmark_batching(sys.argv[2], job_counts)
+    elif mode == "model-load":
+        from configuration import video_config
+        benchmark_model_load(sys.argv[2] if len(sys.argv) > 2 else video_config.whisper_model)
+    else:
+        print(f"Unknown benchmark: {mode}")
+        sys.exit(1)
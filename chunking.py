@@ -0,0 +1,195 @@
+import re
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# CJK ideographs, kana, hangul and full-width forms: the embedding tokenizer emits one token per character
+_CJK = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+_WORD = re.compile(r'[^\W_]+')
+_SYMBOL = re.compile(r'[^\w\s]')
+_NOT_WORD = re.compile(r'[\W_]+')
+
+# [CLS] and [SEP] added by the embedding tokenizer
+SPECIAL_TOKENS = 2
+
+# Offset arrays stored with every chunk occurrence
+OFFSET_KEYS = ('segment_char_offsets', 'segment_starts', 'segment_ends')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the embedding tokenizer's token count without loading it.
+
+    CJK characters count as one token each, other words as one token per four
+    characters (rounded up), and punctuation as one token per symbol, which
+    slightly overestimates a WordPiece tokenizer.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated token count
+    """
+    cjk = len(_CJK.findall(text))
+    rest = _CJK.sub(' ', text)
+    words = sum((len(word) + 3) // 4 for word in _WORD.findall(rest))
+    return cjk + words + len(_SYMBOL.findall(rest))
+
+
+# A segment ready for chunking: (start, end, text, tokens)
+_Item = Tuple[float, float, str, int]
+
+
+def iter_chunks(segments: Iterable[Dict[str, Any]], max_duration: float = 30.0, max_tokens: int = 512,
+                min_duration: float = 0.0, overlap: float = 0.0) -> Iterator[Dict[str, Any]]:
+    """
+    Group transcript segments into chunks that fit the embedding model.
+
+    A chunk is closed before a segment that would take it over the token budget,
+    or once it spans max_duration seconds. A closed chunk is held back until the
+    next one spans min_duration, so a short tail is merged into its predecessor
+    instead of becoming a chunk of its own.
+
+    Args:
+        segments: Segments in time order (a list or a stream)
+        max_duration: Duration after which a chunk is closed, in seconds
+        max_tokens: Token limit of the embedding model
+        min_duration: Shortest duration of a last chunk, in seconds
+        overlap: Seconds of trailing segments repeated at the start of the next chunk
+
+    Yields:
+        Chunks with start, end, text, token_estimate and the segment offset arrays
+        (see build_chunk)
+    """
+    budget = max_tokens - SPECIAL_TOKENS
+    current: List[_Item] = []
+    tokens = 0
+    carried = 0
+    pending: Optional[List[_Item]] = None
+
+    for segment in segments:
+        text = segment['text'].strip()
+        if not text:
+            continue
+        item = (float(segment['start']), float(segment['end']), text, estimate_tokens(text))
+
+        if current and (tokens + item[3] > budget or current[-1][1] - current[0][0] >= max_duration):
+            if pending:
+                yield build_chunk(pending)
+            pending = current
+            current = _overlap_tail(current, overlap, min(budget - item[3], budget // 2))
+            carried = len(current)
+            tokens = sum(carried_item[3] for carried_item in current)
+
+        current.append(item)
+        tokens += item[3]
+
+        if pending and current[-1][1] - current[carried][0] >= min_duration:
+            yield build_chunk(pending)
+            pending = None
+
+    if pending:
+        merged = pending + current[carried:]
+        if sum(item[3] for item in merged) <= budget:
+            yield build_chunk(merged)
+            return
+        yield build_chunk(pending)
+    if current[carried:]:
+        yield build_chunk(current)
+
+
+def _overlap_tail(items: List[_Item], overlap: float, max_tokens: int) -> List[_Item]:
+    """Trailing items within overlap seconds of the end, never the whole chunk."""
+    if overlap <= 0:
+        return []
+    tail: List[_Item] = []
+    tokens = 0
+    for item in reversed(items[1:]):
+        if items[-1][1] - item[0] > overlap or tokens + item[3] > max_tokens:
+            break
+        tail.append(item)
+        tokens += item[3]
+    tail.reverse()
+    return tail
+
+
+def build_chunk(items: Sequence[_Item]) -> Dict[str, Any]:
+    """
+    Join segments into a chunk.
+
+    Besides the text, the chunk keeps one entry per segment in three parallel
+    arrays: the character offset of the segment in the text and its start and
+    end time, so a match can be narrowed down to the segments it came from.
+    """
+    texts = [item[2] for item in items]
+    offsets = []
+    position = 0
+    for text in texts:
+        offsets.append(position)
+        position += len(text) + 1
+    return {
+        'start': items[0][0],
+        'end': items[-1][1],
+        'text': ' '.join(texts),
+        'token_estimate': sum(item[3] for item in items) + SPECIAL_TOKENS,
+        'segment_char_offsets': offsets,
+        'segment_starts': [item[0] for item in items],
+        'segment_ends': [item[1] for item in items]
+    }
+
+
+def compact_offsets(chunk: Dict[str, Any]) -> Dict[str, array]:
+    """Pack a chunk's offset arrays into typed arrays for storage in the index metadata."""
+    if 'segment_char_offsets' not in chunk:
+        return {}
+    return {
+        'segment_char_offsets': array('I', chunk['segment_char_offsets']),
+        'segment_starts': array('f', chunk['segment_starts']),
+        'segment_ends': array('f', chunk['segment_ends'])
+    }
+
+
+def _bigrams(text: str) -> set:
+    """Character bigrams of the text with case, spaces and punctuation ignored."""
+    text = _NOT_WORD.sub('', text.lower())
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def locate_match(query: str, text: str, offsets: Sequence[int], starts: Sequence[float],
+                 ends: Sequence[float]) -> Optional[Tuple[float, float]]:
+    """
+    Find the part of a chunk that matches a query.
+
+    Each segment is scored by the share of the query's character bigrams it
+    contains; the best segment is extended over neighbours scoring at least
+    half as much.
+
+    Args:
+        query: Search query
+        text: Chunk text
+        offsets: Character offset of each segment in the text
+        starts: Start time of each segment
+        ends: End time of each segment
+
+    Returns:
+        (start, end) time of the matching segments, or None if no segment
+        shares anything with the query
+    """
+    query_bigrams = _bigrams(query)
+    if not query_bigrams or not offsets:
+        return None
+
+    bounds = list(offsets[1:]) + [len(text)]
+    scores = [len(query_bigrams & _bigrams(text[offset:bound])) / len(query_bigrams)
+              for offset, bound in zip(offsets, bounds)]
+    best = max(range(len(scores)), key=scores.__getitem__)
+    if scores[best] == 0:
+        return None
+
+    first = last = best
+    while first > 0 and scores[first - 1] >= scores[best] / 2:
+        first -= 1
+    while last < len(scores) - 1 and scores[last + 1] >= scores[best] / 2:
+        last += 1
+    return float(starts[first]), float(ends[last])
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+
+class ClipCache:
+    """
+    Cache of extracted video clips with size-bounded LRU eviction.
+
+    Clips are keyed by (video path, size, modification time, start, end, mode), like
+    the HLS packages (see hls_packager.source_signature), so a lookup costs one stat
+    and a replaced or edited video never serves stale clips. Concurrent requests for
+    the same clip wait for one ffmpeg run.
+    """
+    def __init__(self, storage_dir: str = "clip_cache", max_bytes: int = 1024 * 1024 * 1024):
+        """
+        Initialize the clip cache.
+
+        Args:
+            storage_dir: Directory holding the cached clips
+            max_bytes: Total size above which the least recently used clips are removed
+        """
+        self.storage_dir = Path(storage_dir)
+        self.storage_dir.mkdir(exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending: Dict[str, threading.Lock] = {}
+
+    def clip_path(self, video_path: str, start_time: float, end_time: float, mode: str) -> Path:
+        """Path of the cached clip for a video range (whether or not it exists)."""
+        stat = os.stat(video_path)
+        key = f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}:{start_time:.3f}:{end_time:.3f}:{mode}"
+        return self.storage_dir / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.mp4"
+
+    def get(self, video_path: str, start_time: float, end_time: float, mode: str) -> Optional[str]:
+        """
+        Get a cached clip without creating it.
+
+        Returns:
+            Path of the clip, or None on a miss
+        """
+        path = self.clip_path(video_path, start_time, end_time, mode)
+        try:
+            os.utime(path)
+            return str(path)
+        except FileNotFoundError:
+            return None
+
+    def get_or_create(self, video_path: str, start_time: float, end_time: float, mode: str,
+                      create: Callable[[str], None]) -> str:
+        """
+        Get a cached clip, creating it on a miss.
+
+        Args:
+            video_path: Path to the source video
+            start_time: Clip start in seconds
+            end_time: Clip end in seconds
+            mode: Extraction mode, part of the key
+            create: Called with a temporary path to write the clip to
+
+        Returns:
+            Path of the cached clip
+        """
+        path = self.clip_path(video_path, start_time, end_time, mode)
+        with self._lock:
+            pending = self._pending.setdefault(path.name, threading.Lock())
+        with pending:
+            if path.exists():
+                # Reads refresh the clip's position in the LRU order
+                os.utime(path)
+                return str(path)
+            temp_path = path.with_name(path.stem + '.tmp.mp4')
+            try:
+                create(str(temp_path))
+                os.replace(temp_path, path)
+            finally:
+                if temp_path.exists():
+                    temp_path.unlink()
+                with self._lock:
+                    self._pending.pop(path.name, None)
+        self.evict(keep=path)
+        return str(path)
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """
+        Remove least recently used clips until the cache fits in max_bytes.
+
+        Args:
+            keep: A clip that must stay, e.g. the one just created
+
+        Returns:
+            Number of clips removed
+        """
+        with self._lock:
+            clips = []
+            for path in self.storage_dir.glob('*.mp4'):
+                if path.name.endswith('.tmp.mp4'):
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                clips.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in clips)
+            removed = 0
+            for _, size, path in sorted(clips, key=lambda clip: clip[0]):
+                if total <= self.max_bytes:
+                    break
+                if keep is not None and path == keep:
+                    continue
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            return removed
+
+    def get_stats(self) -> Dict[str, int]:
+        """Number and total size of the cached clips."""
+        sizes = [path.stat().st_size for path in self.storage_dir.glob('*.mp4') if not path.name.endswith('.tmp.mp4')]
+        return {'clips': len(sizes), 'total_bytes': sum(sizes), 'max_bytes': self.max_bytes}
@@ -53,9 +53,100 @@ class VideoSearchConfiguration:
         """Initialize video search configuration with environment variables."""
         load_dotenv()
         self.whisper_model = os.getenv("WHISPER_MODEL", "base")
+        # Two-pass ingestion: index a fast draft transcript from this model first, then
+        # replace it with WHISPER_MODEL's transcript in the background (empty = one pass)
+        self.draft_whisper_model = os.getenv("DRAFT_WHISPER_MODEL", "")
+        # Speed/quality profile (model, beam size, temperature fallback...) of the final pass;
+        # QUALITY_PROFILES is a JSON object overriding or adding profiles (see quality_profiles.py)
+        self.quality_profile = os.getenv("QUALITY_PROFILE", "balanced")
+        self.quality_profiles = json.loads(os.getenv("QUALITY_PROFILES", "") or "{}")
+        # > 0: background ingestion picks a profile per job so the queue drains within this
+        # many seconds, falling back to faster profiles under load (0 = always QUALITY_PROFILE)
+        self.quality_target_latency = float(os.getenv("QUALITY_TARGET_LATENCY", "0"))
+        # CPU inference: int8 dynamic quantization and torch intra-op threads (0 = torch default)
+        self.whisper_quantize = os.getenv("WHISPER_QUANTIZE", "false").lower() == "true"
+        self.torch_num_threads = int(os.getenv("TORCH_NUM_THREADS", "0"))
+        self.model_cache_dir = os.getenv("MODEL_CACHE_DIR", "model_cache")
+        # >1: cut long audio at pauses and transcribe the pieces in this many processes
+        self.transcribe_workers = int(os.getenv("TRANSCRIBE_WORKERS", "1"))
+        # Energy/spectral voice activity pre-pass: only speech is passed to Whisper; silence
+        # and music (steady spectra without syllable-rate modulation) are skipped
+        self.vad_enabled = os.getenv("VAD_ENABLED", "true").lower() == "true"
         self.embedding_dimension = int(os.getenv("EMBEDDING_DIMENSION", "1024"))
         self.index_file = os.getenv("INDEX_FILE", "video_index.faiss")
         self.chunk_duration = float(os.getenv("CHUNK_DURATION", "30.0"))
+        # Chunks stay under the embedding model's token limit (text beyond it is truncated)
+        self.embedding_max_tokens = int(os.getenv("EMBEDDING_MAX_TOKENS", "512"))
+        self.chunk_min_duration = float(os.getenv("CHUNK_MIN_DURATION", "5.0"))
+        self.chunk_overlap = float(os.getenv("CHUNK_OVERLAP", "0.0"))
+        self.dedupe_threshold = float(os.getenv("DEDUPE_THRESHOLD", "0.98"))
+        # Chunk text -> embedding cache; re-indexing only embeds texts not seen before (empty = off)
+        self.embedding_cache = os.getenv("EMBEDDING_CACHE", "embedding_cache.db")
+        # Audio fingerprints of ingested videos; an upload whose audio is found within an indexed video
+        # (re-encoded or trimmed copy) reuses its transcript instead of running Whisper (empty = off)
+        self.fingerprint_index = os.getenv("FINGERPRINT_INDEX", "fingerprints.db")
+        self.fingerprint_threshold = float(os.getenv("FINGERPRINT_THRESHOLD", "0.15"))
+        # Seconds of audio at the start and at the end of an upload matched against the index
+        self.fingerprint_seconds = float(os.getenv("FINGERPRINT_SECONDS", "60"))
+        # standalone: one process does everything; writer: owns ingestion and publishes
+        # index versions; reader: read-only search process following published versions
+        self.index_role = os.getenv("INDEX_ROLE", "standalone")
+        self.index_poll_interval = float(os.getenv("INDEX_POLL_INTERVAL", "1.0"))
+        # Transcribe audio window by window and index chunks as soon as they close
+        self.streaming_ingest = os.getenv("STREAMING_INGEST", "true").lower() == "true"
+        self.stream_window = float(os.getenv("STREAM_WINDOW", "60.0"))
+        # Compact mono audio copy kept per video; later transcriptions decode it instead of the video
+        self.audio_proxy_enabled = os.getenv("AUDIO_PROXY", "true").lower() == "true"
+        self.audio_proxy_dir = os.getenv("AUDIO_PROXY_DIR", "audio_proxies")
+        self.audio_proxy_codec = os.getenv("AUDIO_PROXY_CODEC", "opus")
+        self.audio_proxy_bitrate = os.getenv("AUDIO_PROXY_BITRATE", "24k")
+        # Remux uploads into faststart MP4 copies in the background; /video serves those
+        self.faststart_remux = os.getenv("FASTSTART_REMUX", "true").lower() == "true"
+        self.playback_dir = os.getenv("PLAYBACK_DIR", "playback")
+        # HLS packaging after indexing: a rendition per HEIGHT:VIDEO_KBPS entry, segments of at
+        # most HLS_SEGMENT_DURATION seconds cut at every chunk start. Off by default: the
+        # multi-rendition encode competes with transcription for CPU
+        self.hls_enabled = os.getenv("HLS", "false").lower() == "true"
+        self.hls_dir = os.getenv("HLS_DIR", "hls")
+        self.hls_renditions = os.getenv("HLS_RENDITIONS", "360:800,540:1600,720:2800")
+        self.hls_segment_duration = float(os.getenv("HLS_SEGMENT_DURATION", "6.0"))
+        # Thumbnail sprite sheets made in one ffmpeg pass at ingestion: a frame every
+        # PREVIEW_INTERVAL seconds, PREVIEW_COLUMNS x PREVIEW_ROWS tiles per sheet
+        self.previews_enabled = os.getenv("PREVIEWS", "true").lower() == "true"
+        self.preview_dir = os.getenv("PREVIEW_DIR", "previews")
+        self.preview_interval = float(os.getenv("PREVIEW_INTERVAL", "10.0"))
+        self.preview_tile_width = int(os.getenv("PREVIEW_TILE_WIDTH", "160"))
+        self.preview_tile_height = int(os.getenv("PREVIEW_TILE_HEIGHT", "90"))
+        self.preview_columns = int(os.getenv("PREVIEW_COLUMNS", "10"))
+        self.preview_rows = int(os.getenv("PREVIEW_ROWS", "10"))
+        # ffmpeg/ffprobe processes running at once (more wait, clips before ingestion before
+        # proxies and previews) and seconds one may run before it is killed (0 = no limit)
+        self.ffmpeg_concurrency = int(os.getenv("FFMPEG_CONCURRENCY", "4"))
+        # Lock file through which the API and ingestion worker processes share those slots
+        # (empty = each process gets FFMPEG_CONCURRENCY of its own)
+        self.ffmpeg_slot_file = os.getenv("FFMPEG_SLOT_FILE", "ffmpeg_slots.lock")
+        # Of those, slots kept free for interactive work (clips, probes) so it never waits behind
+        # transcription decodes, proxies, previews, remuxes or HLS encodes
+        self.ffmpeg_interactive_slots = int(os.getenv("FFMPEG_INTERACTIVE_SLOTS", "1"))
+        self.ffmpeg_timeout = float(os.getenv("FFMPEG_TIMEOUT", "3600"))
+        # Extracted clips: 'fast' stream-copies between keyframes, 'accurate' re-encodes the exact range;
+        # clips are cached by video file (path, size, mtime) and range, least recently used first out above the size limit
+        self.clip_mode = os.getenv("CLIP_MODE", "fast")
+        self.clip_cache_dir = os.getenv("CLIP_CACHE_DIR", "clip_cache")
+        self.clip_cache_max_mb = float(os.getenv("CLIP_CACHE_MAX_MB", "1024"))
+        # Clips streamed by GET /clip are piped from ffmpeg; at most this many ffmpeg processes at once
+        self.clip_stream_concurrency = int(os.getenv("CLIP_STREAM_CONCURRENCY", "4"))
+        # Save streaming transcription progress after every window so an interrupted job resumes
+        self.transcribe_checkpoints = os.getenv("TRANSCRIBE_CHECKPOINTS", "true").lower() == "true"
+        # Background ingestion: uploads become jobs transcribed by this many worker
+        # processes (0 = transcribe and index inside the upload request)
+        self.ingest_workers = int(os.getenv("INGEST_WORKERS", "1"))
+        self.ingest_db = os.getenv("INGEST_DB", "ingestion_jobs.db")
+        self.ingest_poll_interval = float(os.getenv("INGEST_POLL_INTERVAL", "1.0"))
+        # Jobs each worker transcribes at once; > 1 decodes their Whisper windows in shared batches
+        self.ingest_job_threads = int(os.getenv("INGEST_JOB_THREADS", "1"))
+        self.whisper_batch_size = int(os.getenv("WHISPER_BATCH_SIZE", "8"))
+        self.whisper_batch_wait = float(os.getenv("WHISPER_BATCH_WAIT", "0.05"))
 
 # class AgentConfiguration:
 #     def __init__(self, config_path: str) -> None:
@@ -1,5 +1,4 @@
 import os  # 操作系统接口
-from openai import OpenAI  # OpenAI客户端（未使用）
 import numpy as np  # 数值计算（未使用）
 import aiohttp  # 异步HTTP客户端
 import asyncio  # 异步编程
@@ -0,0 +1,73 @@
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Tuple
+
+
+class EmbeddingCache:
+    """
+    Persistent text -> embedding cache backed by SQLite.
+
+    Keys are hashes of the exact chunk text, so re-chunking a library only calls
+    the embedding API for texts that have never been embedded before.
+    """
+    def __init__(self, db_path: str = "embedding_cache.db", dimension: int = 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            db_path: Path of the SQLite database file
+            dimension: Dimension of the embedding vectors; other sizes are ignored
+        """
+        self.db_path = db_path
+        self.dimension = dimension
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    @staticmethod
+    def key(text: str) -> str:
+        """Cache key of a text."""
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            texts: Texts to look up
+
+        Returns:
+            Mapping from each cached text to its float32 vector
+        """
+        keys = {self.key(text): text for text in texts}
+        found = {}
+        with self._lock:
+            items = list(keys)
+            # Stay below SQLite's bound-parameter limit
+            for start in range(0, len(items), 500):
+                batch = items[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})", batch).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    # A zero vector is a failed embedding seeded from an old index; embed it again
+                    if vector.size == self.dimension and vector.any():
+                        found[keys[key]] = vector
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, np.ndarray]]):
+        """Store (text, vector) pairs."""
+        rows = [(self.key(text), np.asarray(vector, dtype=np.float32).tobytes()) for text, vector in items]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,552 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Job priorities: lower numbers get free slots first, equal priorities in arrival order
+PRIORITY_INTERACTIVE = 0   # someone is waiting for the result: clips, probes
+PRIORITY_INGEST = 10       # decoding audio for transcription
+PRIORITY_BACKGROUND = 20   # derived files nobody waits for: audio proxies, previews
+
+# Keys ffmpeg writes for every -progress report; each report ends with 'progress='
+PROGRESS_KEYS = {'frame', 'fps', 'bitrate', 'total_size', 'out_time_us', 'out_time_ms', 'out_time',
+                 'dup_frames', 'drop_frames', 'speed', 'progress'}
+
+_cancel_scope = contextvars.ContextVar('ffmpeg_cancel_scope', default=None)
+
+
+class FFmpegError(Exception):
+    """An ffmpeg or ffprobe process failed; the message ends with the last lines it logged."""
+
+
+class FFmpegTimeout(FFmpegError):
+    """An ffmpeg or ffprobe process ran longer than its timeout and was killed."""
+
+
+class CancelScope:
+    """
+    Cancels the ffmpeg jobs started inside it, from any thread.
+
+    The scope is carried by a context variable, so jobs started by code running in
+    `asyncio.to_thread` inside the `with` block belong to it too. Cancelling kills
+    running processes, drops queued jobs and makes new jobs fail right away with
+    concurrent.futures.CancelledError.
+    """
+    def __init__(self):
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._cancels = set()
+        self._token = None
+
+    def __enter__(self):
+        self._token = _cancel_scope.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _cancel_scope.reset(self._token)
+
+    def cancel(self):
+        """Cancel all jobs of the scope, now and later."""
+        with self._lock:
+            self.cancelled = True
+            cancels = list(self._cancels)
+            self._cancels.clear()
+        for cancel in cancels:
+            cancel()
+
+    def _add(self, cancel: Callable[[], Any]) -> bool:
+        with self._lock:
+            if not self.cancelled:
+                self._cancels.add(cancel)
+                return True
+        return False
+
+    def _discard(self, cancel: Callable[[], Any]):
+        with self._lock:
+            self._cancels.discard(cancel)
+
+
+class SharedSlots:
+    """
+    Slots shared by every process that uses the same lock file, one locked byte per slot.
+
+    The locks belong to the process and are dropped by the OS when it exits, so a
+    process that crashes never keeps its slots. Within a process the executor decides
+    who gets a slot; this only tracks which bytes the process already holds, since
+    the OS lets a process lock its own byte again.
+    """
+    def __init__(self, path: str, count: int):
+        self.path = path
+        self.count = count
+        self._file = None
+        self._held = set()
+
+    def try_acquire(self, count: int) -> Optional[int]:
+        """Lock one of the first `count` slots if another process does not hold it; returns its index."""
+        if self._file is None:
+            self._file = open(self.path, 'a+b')
+        for index in range(min(count, self.count)):
+            if index not in self._held and _lock_byte(self._file, index, True):
+                self._held.add(index)
+                return index
+        return None
+
+    def release(self, index: int):
+        """Unlock a slot returned by try_acquire."""
+        self._held.discard(index)
+        _lock_byte(self._file, index, False)
+
+
+def _lock_byte(file, index: int, lock: bool) -> bool:
+    """Lock (without waiting) or unlock one byte of an open file; False if another process holds it."""
+    try:
+        if fcntl is not None:
+            fcntl.lockf(file.fileno(), (fcntl.LOCK_EX | fcntl.LOCK_NB) if lock else fcntl.LOCK_UN, 1, index)
+        else:
+            file.seek(index)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK if lock else msvcrt.LK_UNLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+class FFmpegProcess:
+    """
+    A running ffmpeg process whose stdout is read by the caller (see FFmpegExecutor.open).
+
+    The process holds an executor slot until it is closed; closing kills it if it is
+    still running. Reads are available both blocking and as coroutines.
+    """
+    def __init__(self, executor: 'FFmpegExecutor', job: Dict[str, Any], process):
+        self._executor = executor
+        self._job = job
+        self._process = process
+        self._closed = False
+
+    def read(self, size: int) -> bytes:
+        """Read `size` bytes of stdout, fewer only at the end of the output (blocking)."""
+        return self._executor._call(self._read(size))
+
+    async def read_async(self, size: int) -> bytes:
+        """Read `size` bytes of stdout, fewer only at the end of the output."""
+        return await self._executor._call_async(self._read(size))
+
+    def wait(self) -> int:
+        """Wait for the process to exit and raise FFmpegError if it failed (blocking)."""
+        return self._executor._call(self._wait())
+
+    async def wait_async(self) -> int:
+        """Wait for the process to exit and raise FFmpegError if it failed."""
+        return await self._executor._call_async(self._wait())
+
+    def close(self):
+        """Kill the process if it is still running and free its slot."""
+        if not self._closed:
+            self._closed = True
+            self._executor._call(self._close(), cancellable=False)
+
+    async def close_async(self):
+        """Kill the process if it is still running and free its slot."""
+        if not self._closed:
+            self._closed = True
+            await self._executor._call_async(self._close(), cancellable=False)
+
+    def _abandon(self):
+        """Close without waiting, from any thread (including the executor's)."""
+        if not self._closed:
+            self._closed = True
+            asyncio.run_coroutine_threadsafe(self._close(), self._executor._loop)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    async def _read(self, size: int) -> bytes:
+        try:
+            return await self._process.stdout.readexactly(size)
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+
+    async def _wait(self) -> int:
+        returncode = await self._process.wait()
+        if self._job.get('timed_out'):
+            raise FFmpegTimeout(f"{self._job['label']} timed out after {self._job['timeout']} seconds")
+        if returncode != 0:
+            raise FFmpegError(f"{self._job['label']} exited with code {returncode}")
+        return returncode
+
+    async def _close(self):
+        try:
+            if self._process.returncode is None:
+                self._process.kill()
+            # Unread output keeps the pipe paused, and wait() only returns once it reaches EOF
+            await self._process.stdout.read()
+            await self._process.wait()
+        finally:
+            self._executor._finish(self._job)
+
+
+class FFmpegExecutor:
+    """
+    Runs ffmpeg and ffprobe processes with a bounded number of slots.
+
+    Processes are asyncio subprocesses driven by one event loop in a background
+    thread, so both blocking callers (worker threads, ingestion processes) and
+    coroutines on any event loop can submit jobs. At most `max_concurrency`
+    processes run at once; waiting jobs get free slots by priority, and
+    `interactive_slots` of them are kept for interactive jobs, so clips and probes
+    never wait behind long decodes and encodes. With a `slot_file`, the limits hold
+    for all processes using that file together (API and ingestion workers): a job
+    that got a slot here also locks one of the file's slots, polling while other
+    processes hold them all (across processes there is no priority order, only the
+    interactive reserve). Without it they hold per process. Jobs have a
+    timeout, are killed when their caller is cancelled (see cancel_scope), and
+    report progress parsed from ffmpeg's `-progress` output.
+    """
+    def __init__(self, max_concurrency: int = 4, default_timeout: Optional[float] = None,
+                 interactive_slots: int = 1, slot_file: Optional[str] = None):
+        """
+        Initialize the executor.
+
+        Args:
+            max_concurrency: Processes running at once (in all processes sharing slot_file)
+            default_timeout: Seconds a job may run once started (None or 0 = no limit)
+            interactive_slots: Slots only PRIORITY_INTERACTIVE jobs may use (at most
+                max_concurrency - 1, so other jobs always get one)
+            slot_file: Lock file shared with other processes (None = limits per process)
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.default_timeout = default_timeout or None
+        self.interactive_slots = min(max(0, interactive_slots), self.max_concurrency - 1)
+        self.shared = SharedSlots(slot_file, self.max_concurrency) if slot_file else None
+        self._running = 0
+        self._running_other = 0
+        self._waiters = []
+        self._order = itertools.count()
+        self._jobs = {}
+        self._loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def cancel_scope(self) -> CancelScope:
+        """A scope whose cancel() stops the jobs started inside it (see CancelScope)."""
+        return CancelScope()
+
+    def run(self, args: List[str], priority: int = PRIORITY_INGEST, timeout: Optional[float] = None,
+            duration: Optional[float] = None, on_progress: Optional[Callable[[Dict[str, Any]], Any]] = None,
+            label: Optional[str] = None) -> bytes:
+        """
+        Run a process to completion (blocking).
+
+        Args:
+            args: Command line, starting with ffmpeg or ffprobe
+            priority: Slot priority (PRIORITY_*)
+            timeout: Seconds the process may run (default_timeout if None, 0 = no limit)
+            duration: Media duration in seconds, to report progress as a fraction
+            on_progress: Called with each progress report (ffmpeg only, see get_stats);
+                it runs on the executor's thread and must not block
+            label: Name of the job in errors and stats (the program name if None)
+
+        Returns:
+            The process's stdout
+        """
+        return self._call(self._run(args, priority, timeout, duration, on_progress, label))
+
+    async def run_async(self, args: List[str], priority: int = PRIORITY_INGEST, timeout: Optional[float] = None,
+                        duration: Optional[float] = None, on_progress: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                        label: Optional[str] = None) -> bytes:
+        """Run a process to completion, as run(); cancelling the awaiting task kills the process."""
+        return await self._call_async(self._run(args, priority, timeout, duration, on_progress, label))
+
+    def open(self, args: List[str], priority: int = PRIORITY_INGEST, timeout: Optional[float] = None,
+             label: Optional[str] = None) -> FFmpegProcess:
+        """
+        Start a process whose stdout the caller reads (blocking until a slot is free).
+
+        Args:
+            args: Command line writing to stdout (e.g. output 'pipe:')
+            priority: Slot priority (PRIORITY_*)
+            timeout: Seconds until the process is killed (0 or None = no limit; the
+                default timeout does not apply, since the reader sets the pace)
+            label: Name of the job in errors and stats
+
+        Returns:
+            The process; close it when done
+        """
+        return self._call(self._open(args, priority, timeout, label))
+
+    async def open_async(self, args: List[str], priority: int = PRIORITY_INGEST, timeout: Optional[float] = None,
+                         label: Optional[str] = None) -> FFmpegProcess:
+        """Start a process whose stdout the caller reads, as open()."""
+        return await self._call_async(self._open(args, priority, timeout, label), on_abandon=FFmpegProcess._abandon)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Slot usage and the running and queued jobs with their latest progress."""
+        now = time.time()
+        jobs = [
+            {
+                'id': job['id'],
+                'label': job['label'],
+                'priority': job['priority'],
+                'state': job['state'],
+                'waited': round((job.get('started') or now) - job['submitted'], 3),
+                'progress': job.get('progress')
+            }
+            for job in list(self._jobs.values())
+        ]
+        return {
+            'max_concurrency': self.max_concurrency,
+            'interactive_slots': self.interactive_slots,
+            'slot_file': self.shared.path if self.shared else None,
+            'running': self._running,
+            'queued': len(self._waiters),
+            'jobs': jobs
+        }
+
+    # Calls into the executor loop
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='ffmpeg-executor', daemon=True)
+                self._thread.start()
+        return self._loop
+
+    def _call(self, coro, cancellable: bool = True):
+        """Run a coroutine on the executor loop and wait for it in this thread."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        scope = _cancel_scope.get() if cancellable else None
+        if scope is not None and not scope._add(future.cancel):
+            future.cancel()
+        try:
+            return future.result()
+        finally:
+            if scope is not None:
+                scope._discard(future.cancel)
+
+    async def _call_async(self, coro, on_abandon: Optional[Callable[[Any], Any]] = None, cancellable: bool = True):
+        """Await a coroutine running on the executor loop from any other event loop."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        scope = _cancel_scope.get() if cancellable else None
+        if scope is not None and not scope._add(future.cancel):
+            future.cancel()
+        try:
+            # Shielded so that uncancellable calls (closing a process) finish in the background
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except asyncio.CancelledError:
+            if cancellable:
+                future.cancel()
+            if on_abandon:
+                # The result may have arrived just as the caller was cancelled
+                future.add_done_callback(
+                    lambda f: on_abandon(f.result()) if not f.cancelled() and f.exception() is None else None)
+            raise
+        finally:
+            if scope is not None:
+                scope._discard(future.cancel)
+
+    # Slots (executor loop only)
+
+    async def _acquire(self, job: Dict[str, Any]):
+        waiter = asyncio.get_running_loop().create_future()
+        entry = [job['priority'], next(self._order), waiter]
+        heapq.heappush(self._waiters, entry)
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release(job['priority'])
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                # A waiter blocked behind this one may be able to start now
+                self._dispatch()
+            raise
+
+    async def _acquire_shared(self, job: Dict[str, Any]):
+        """Lock a slot of the slot file, waiting while other processes hold them all."""
+        count = self.max_concurrency
+        if job['priority'] > PRIORITY_INTERACTIVE:
+            count -= self.interactive_slots
+        delay = 0.02
+        while True:
+            index = self.shared.try_acquire(count)
+            if index is not None:
+                job['shared_slot'] = index
+                return
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+    def _release(self, priority: int):
+        self._running -= 1
+        if priority > PRIORITY_INTERACTIVE:
+            self._running_other -= 1
+        self._dispatch()
+
+    def _can_start(self, priority: int) -> bool:
+        if self._running >= self.max_concurrency:
+            return False
+        return priority <= PRIORITY_INTERACTIVE or \
+            self._running_other < self.max_concurrency - self.interactive_slots
+
+    def _dispatch(self):
+        """Hand free slots to the waiting jobs in priority order."""
+        while self._waiters:
+            priority, _, waiter = self._waiters[0]
+            if waiter.done():
+                heapq.heappop(self._waiters)
+                continue
+            # Everything behind the first waiter has an equal or lower priority, so it cannot start either
+            if not self._can_start(priority):
+                break
+            heapq.heappop(self._waiters)
+            self._running += 1
+            if priority > PRIORITY_INTERACTIVE:
+                self._running_other += 1
+            waiter.set_result(None)
+
+    def _submit(self, args: List[str], priority: int, label: Optional[str], timeout: Optional[float]) -> Dict[str, Any]:
+        job = {
+            'id': next(self._order),
+            'label': label or args[0],
+            'priority': priority,
+            'state': 'queued',
+            'submitted': time.time(),
+            'timeout': timeout
+        }
+        self._jobs[job['id']] = job
+        return job
+
+    def _finish(self, job: Dict[str, Any]):
+        self._jobs.pop(job['id'], None)
+        if job.get('shared_slot') is not None:
+            self.shared.release(job.pop('shared_slot'))
+        if job.pop('has_slot', False):
+            job['state'] = 'done'
+            self._release(job['priority'])
+
+    async def _start(self, job: Dict[str, Any], args: List[str], stderr):
+        try:
+            await self._acquire(job)
+        except BaseException:
+            self._jobs.pop(job['id'], None)
+            raise
+        job['has_slot'] = True
+        try:
+            if self.shared is not None:
+                await self._acquire_shared(job)
+            job['state'] = 'running'
+            job['started'] = time.time()
+            return await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.DEVNULL,
+                                                        stdout=asyncio.subprocess.PIPE, stderr=stderr)
+        except BaseException:
+            self._finish(job)
+            raise
+
+    async def _run(self, args, priority, timeout, duration, on_progress, label) -> bytes:
+        timeout = self.default_timeout if timeout is None else (timeout or None)
+        job = self._submit(args, priority, label, timeout)
+        is_ffmpeg = args[0].endswith('ffmpeg')
+        if is_ffmpeg:
+            # Machine-readable progress on stderr instead of the status line; only errors are logged
+            args = [args[0], '-progress', 'pipe:2', '-nostats', '-loglevel', 'error'] + list(args[1:])
+        process = await self._start(job, args, asyncio.subprocess.PIPE)
+        errors = []
+
+        async def read_stderr():
+            report = {}
+            async for raw in process.stderr:
+                line = raw.decode('utf-8', 'replace').strip()
+                key, sep, value = line.partition('=')
+                if not (is_ffmpeg and sep and (key in PROGRESS_KEYS or key.startswith('stream_'))):
+                    errors.append(line)
+                    del errors[:-20]
+                    continue
+                report[key] = value
+                if key == 'progress':
+                    job['progress'] = _progress(report, duration)
+                    report = {}
+                    if on_progress:
+                        on_progress(job['progress'])
+
+        async def communicate():
+            return await asyncio.gather(process.stdout.read(), read_stderr(), process.wait())
+
+        try:
+            output, _, returncode = await asyncio.wait_for(communicate(), timeout)
+        except asyncio.TimeoutError:
+            raise FFmpegTimeout(f"{job['label']} timed out after {timeout} seconds")
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            self._finish(job)
+        if returncode != 0:
+            raise FFmpegError(f"{job['label']} exited with code {returncode}: {' | '.join(filter(None, errors))}")
+        return output
+
+    async def _open(self, args, priority, timeout, label) -> FFmpegProcess:
+        job = self._submit(args, priority, label, timeout or None)
+        process = await self._start(job, args, asyncio.subprocess.DEVNULL)
+        if timeout:
+            def expire():
+                if process.returncode is None:
+                    job['timed_out'] = True
+                    process.kill()
+            asyncio.get_running_loop().call_later(timeout, expire)
+        return FFmpegProcess(self, job, process)
+
+
+def _progress(report: Dict[str, str], duration: Optional[float]) -> Dict[str, Any]:
+    """One -progress report as processed media time, fraction of the duration and speed."""
+    position = None
+    try:
+        # out_time_ms is in microseconds as well, for historical reasons
+        position = int(report.get('out_time_us') or report.get('out_time_ms')) / 1e6
+    except (TypeError, ValueError):
+        pass
+    try:
+        speed = float(report.get('speed', '').rstrip('x'))
+    except ValueError:
+        speed = None
+    fraction = None
+    if position is not None and duration:
+        fraction = min(max(position / duration, 0.0), 1.0)
+    done = report.get('progress') == 'end'
+    if done and duration:
+        fraction = 1.0
+    return {'time': position, 'fraction': fraction, 'speed': speed, 'done': done}
+
+
+_default_executor = None
+_default_lock = threading.Lock()
+
+
+def default_executor() -> FFmpegExecutor:
+    """The process-wide executor used when no executor is passed in."""
+    global _default_executor
+    with _default_lock:
+        if _default_executor is None:
+            _default_executor = FFmpegExecutor()
+        return _default_executor
+
+
+def set_default_executor(executor: FFmpegExecutor):
+    """Make an executor the process-wide default, so all ffmpeg processes share its slots."""
+    global _default_executor
+    with _default_lock:
+        _default_executor = executor
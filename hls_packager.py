@@ -0,0 +1,277 @@
+import bisect
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ffmpeg_executor import FFmpegExecutor, FFmpegError, default_executor, PRIORITY_BACKGROUND
+
+# Segments shorter than this are merged into their neighbour
+MIN_SEGMENT_SECONDS = 1.0
+# A package whose cuts are all this close to the wanted ones is not re-encoded
+CUT_TOLERANCE_SECONDS = 1.0
+# Files a rendition directory may contain
+RENDITION_FILE = re.compile(r'^(index\.m3u8|seg_\d{5}\.ts)$')
+
+
+def parse_renditions(spec: str) -> List[Dict[str, Any]]:
+    """
+    Parse a rendition ladder like "360:800,540:1600,720:2800" (height:video kbps).
+
+    Returns:
+        Renditions from the lowest bitrate up, with 'name', 'height', 'video_kbps'
+        and 'audio_kbps' (lower audio bitrate for the small renditions)
+    """
+    renditions = []
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        height, kbps = item.split(':')
+        height = int(height)
+        renditions.append({
+            'name': f"{height}p",
+            'height': height,
+            'video_kbps': int(kbps),
+            'audio_kbps': 64 if height < 480 else 128
+        })
+    if not renditions:
+        raise ValueError(f"No HLS renditions in {spec!r}")
+    return sorted(renditions, key=lambda rendition: rendition['video_kbps'])
+
+
+def segment_times(boundaries: List[float], duration: Optional[float], max_segment: float) -> List[float]:
+    """
+    Cut points of the segments: every chunk boundary, plus even cuts so no segment is longer than max_segment.
+
+    Args:
+        boundaries: Chunk start times in seconds
+        duration: Video duration in seconds (without it nothing after the last boundary is cut)
+        max_segment: Longest segment in seconds
+
+    Returns:
+        Sorted cut times in seconds (0 excluded)
+    """
+    points = sorted({round(t, 3) for t in boundaries if t > 0 and (not duration or t < duration)})
+    if duration:
+        points.append(duration)
+    cuts = []
+    previous = 0.0
+    for point in points:
+        pieces = max(1, math.ceil((point - previous) / max_segment - 1e-6))
+        cuts.extend(round(previous + (point - previous) * i / pieces, 3) for i in range(1, pieces + 1))
+        previous = point
+    if duration and cuts:
+        cuts.pop()
+    # A boundary right after another one would make a sliver of a segment
+    kept = []
+    for cut in cuts:
+        if cut - (kept[-1] if kept else 0.0) >= MIN_SEGMENT_SECONDS:
+            kept.append(cut)
+    return kept
+
+
+def cuts_match(packaged: List[float], wanted: List[float], tolerance: float = CUT_TOLERANCE_SECONDS) -> bool:
+    """
+    Whether a package cut at `packaged` serves segments cut at `wanted` well enough.
+
+    Every wanted cut must have a packaged cut within `tolerance` seconds, so a
+    search hit still starts at most that far into its segment. Extra packaged
+    cuts only make some segments shorter.
+    """
+    for cut in wanted:
+        i = bisect.bisect_left(packaged, cut)
+        nearest = [packaged[j] for j in (i - 1, i) if 0 <= j < len(packaged)]
+        if not nearest or min(abs(cut - t) for t in nearest) > tolerance:
+            return False
+    return True
+
+
+def source_signature(video_path: str) -> List[int]:
+    """Size and modification time (ns) of a video, to tell whether it changed since it was packaged."""
+    st = os.stat(video_path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class HLSPackager:
+    """
+    Adaptive-bitrate HLS renditions of uploaded videos.
+
+    One ffmpeg pass decodes the video once and encodes every rendition of the
+    ladder into MPEG-TS segments. Keyframes are forced at the segment cuts, which
+    include every indexed chunk start, so jumping to a search hit fetches exactly
+    the segment it starts in, at the bitrate the player's bandwidth allows.
+    """
+    def __init__(self, storage_dir: str = "hls", renditions: Optional[List[Dict[str, Any]]] = None,
+                 segment_duration: float = 6.0, executor: Optional[FFmpegExecutor] = None):
+        """
+        Initialize the packager.
+
+        Args:
+            storage_dir: Directory holding one package directory per video
+            renditions: Rendition ladder (see parse_renditions; 360p/540p/720p if None)
+            segment_duration: Longest segment in seconds
+            executor: Executor running the ffmpeg processes (the process-wide default if None)
+        """
+        self.storage_dir = Path(storage_dir)
+        self.storage_dir.mkdir(exist_ok=True)
+        self.renditions = renditions or parse_renditions("360:800,540:1600,720:2800")
+        self.segment_duration = segment_duration
+        self.executor = executor or default_executor()
+        self._manifests = {}
+        self._lock = threading.Lock()
+        self._pending: Dict[str, threading.Lock] = {}
+
+    def package_dir(self, video_path: str) -> Path:
+        """Directory of the HLS package of a video (whether or not it exists)."""
+        key = hashlib.sha1(os.path.abspath(video_path).encode('utf-8')).hexdigest()[:16]
+        return self.storage_dir / f"{Path(video_path).stem}_{key}"
+
+    def get(self, video_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the manifest of a video's package if it is up to date.
+
+        Returns:
+            Renditions and segment cut times, or None
+        """
+        manifest_path = self.package_dir(video_path) / "package.json"
+        try:
+            mtime = manifest_path.stat().st_mtime
+            if mtime < os.path.getmtime(video_path):
+                return None
+        except FileNotFoundError:
+            return None
+        cached = self._manifests.get(manifest_path)
+        if cached is None or cached[0] != mtime:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                cached = (mtime, json.load(f))
+            self._manifests[manifest_path] = cached
+        source = cached[1].get('source')
+        if source is not None and source != source_signature(video_path):
+            return None
+        return cached[1]
+
+    def ensure(self, video_path: str, boundaries: Optional[List[float]] = None, duration: Optional[float] = None,
+               resolution: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        """
+        Package a video unless an up-to-date package with (nearly) the same segment cuts exists.
+
+        Re-chunking or refining a transcript moves chunk starts only a little; as long
+        as the source file is unchanged and every new cut is within CUT_TOLERANCE_SECONDS
+        of a packaged one, the existing package is kept rather than re-encoded.
+
+        Args:
+            video_path: Path to the video file
+            boundaries: Chunk start times the segments are aligned to
+            duration: Video duration in seconds
+            resolution: (width, height) of the video; renditions taller than it are skipped
+
+        Returns:
+            The package manifest
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        cuts = segment_times(boundaries or [], duration, self.segment_duration)
+        target = self.package_dir(video_path)
+        # One packaging run per video at a time; a later request waits and rechecks
+        with self._lock:
+            pending = self._pending.setdefault(target.name, threading.Lock())
+        with pending:
+            existing = self.get(video_path)
+            if existing is not None and cuts_match(existing['segment_times'], cuts):
+                return existing
+            return self._package(video_path, target, cuts, duration, resolution)
+
+    def _package(self, video_path: str, target: Path, cuts: List[float], duration: Optional[float],
+                 resolution: Optional[Tuple[int, int]]) -> Dict[str, Any]:
+        """Encode the renditions into a temporary directory and swap it in."""
+        renditions = [r for r in self.renditions if not resolution or r['height'] <= resolution[1]] or self.renditions[:1]
+        temp_dir = target.with_name(target.name + '.tmp')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        temp_dir.mkdir()
+
+        splits = ''.join(f"[s{i}]" for i in range(len(renditions)))
+        scales = ';'.join(f"[s{i}]scale=-2:{r['height']}[v{i}]" for i, r in enumerate(renditions))
+        args = ['ffmpeg', '-y', '-i', video_path,
+                '-filter_complex', f"[0:v]split={len(renditions)}{splits};{scales}"]
+        if cuts:
+            cut_list = ','.join(f"{t:.3f}" for t in cuts)
+            keyframes, segmenting = cut_list, ['-segment_times', cut_list]
+        else:
+            keyframes = f"expr:gte(t,n_forced*{self.segment_duration})"
+            segmenting = ['-segment_time', str(self.segment_duration)]
+        for i, rendition in enumerate(renditions):
+            rendition_dir = temp_dir / rendition['name']
+            rendition_dir.mkdir()
+            kbps = rendition['video_kbps']
+            args += ['-map', f"[v{i}]", '-map', '0:a:0?',
+                     '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', f"{kbps}k",
+                     '-maxrate', f"{int(kbps * 1.1)}k", '-bufsize', f"{int(kbps * 1.5)}k",
+                     # Segments can only start on keyframes
+                     '-force_key_frames', keyframes, '-sc_threshold', '0',
+                     '-c:a', 'aac', '-b:a', f"{rendition['audio_kbps']}k", '-ac', '2',
+                     '-f', 'segment', '-segment_format', 'mpegts', *segmenting,
+                     '-segment_list', str(rendition_dir / 'index.m3u8'), '-segment_list_type', 'm3u8',
+                     str(rendition_dir / 'seg_%05d.ts')]
+        try:
+            self.executor.run(args, priority=PRIORITY_BACKGROUND, duration=duration,
+                              label=f"hls {os.path.basename(video_path)}")
+        except BaseException as e:
+            # Failed, timed out or cancelled
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if isinstance(e, FFmpegError):
+                raise Exception(f"FFmpeg error: {e}")
+            raise
+
+        variants = []
+        for rendition in renditions:
+            variant = dict(rendition, bandwidth=int((rendition['video_kbps'] + rendition['audio_kbps']) * 1100))
+            if resolution:
+                # scale=-2 keeps the aspect ratio with an even width
+                variant['width'] = int(round(resolution[0] * rendition['height'] / resolution[1] / 2)) * 2
+            variants.append(variant)
+        with open(temp_dir / "master.m3u8", 'w', encoding='utf-8') as f:
+            f.write(self._master_playlist(variants))
+        manifest = {'renditions': variants, 'segment_times': cuts, 'duration': duration,
+                    'source': source_signature(video_path)}
+        # The manifest is written last: its presence marks a complete package
+        with open(temp_dir / "package.json", 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(temp_dir, target)
+        return manifest
+
+    def _master_playlist(self, variants: List[Dict[str, Any]]) -> str:
+        """Master playlist listing the renditions, lowest bitrate first."""
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+        for variant in variants:
+            attributes = f"BANDWIDTH={variant['bandwidth']}"
+            if 'width' in variant:
+                attributes += f",RESOLUTION={variant['width']}x{variant['height']}"
+            lines += [f"#EXT-X-STREAM-INF:{attributes}", f"{variant['name']}/index.m3u8"]
+        return '\n'.join(lines) + '\n'
+
+    def master_path(self, video_path: str) -> Optional[Path]:
+        """Path of a video's master playlist, or None if the video is not packaged."""
+        if not self.get(video_path):
+            return None
+        return self.package_dir(video_path) / "master.m3u8"
+
+    def file_path(self, video_path: str, rendition: str, name: str) -> Optional[Path]:
+        """Path of a rendition's playlist or segment, or None if there is no such file."""
+        manifest = self.get(video_path)
+        if not manifest or not RENDITION_FILE.match(name):
+            return None
+        if rendition not in {variant['name'] for variant in manifest['renditions']}:
+            return None
+        path = self.package_dir(video_path) / rendition / name
+        return path if path.exists() else None
+
+    def remove(self, video_path: str):
+        """Delete the package of a video, if any."""
+        shutil.rmtree(self.package_dir(video_path), ignore_errors=True)
@@ -1,9 +1,11 @@
-import faiss
 import numpy as np
 from typing import List, Dict, Any, Optional
 import os
+import json
+import time
 import pickle
 from embedding import emb
+from chunking import compact_offsets, locate_match, OFFSET_KEYS
 import asyncio
 
 
@@ -11,26 +13,78 @@ class VideoIndexer:
     """
     A class for indexing video transcription chunks using FAISS and embeddings.
     """
-    def __init__(self, dimension: int = 1024, index_file: Optional[str] = None):
+    def __init__(self, dimension: int = 1024, index_file: Optional[str] = None, dedupe_threshold: float = 0.98, publish_versions: bool = False,
+                 embedding_cache=None):
         """
         Initialize the indexer.
 
         Args:
             dimension: Dimension of the embedding vectors
             index_file: Path to save/load the FAISS index
+            dedupe_threshold: Cosine similarity above which a new chunk is stored as another
+                occurrence of an existing vector instead of a new vector (> 1.0 disables dedupe)
+            publish_versions: Publish every saved state as a new version for read-only
+                search processes (see ReadOnlyVideoIndexer)
+            embedding_cache: Optional EmbeddingCache consulted before calling the embedding API
         """
         self.dimension = dimension
+        self.embedding_cache = embedding_cache
+        # Chunk texts embedded through the API vs. served from the cache
+        self.embedding_stats = {'embedded': 0, 'cached': 0}
         self.index_file = index_file or "video_index.faiss"
         self.metadata_file = self.index_file.replace('.faiss', '_metadata.pkl')
+        self.manifest_file = self.index_file.replace('.faiss', '.manifest.json')
+        self.dedupe_threshold = dedupe_threshold
+        self.publish_versions = publish_versions
+
+        # Published version state; a writer always starts a fresh vector log generation
+        self.version = 0
+        self._generation = None
+        self._log_ntotal = None
+
+        # FAISS is imported and the index read on first use (see _ensure_loaded)
+        self._index = None
+        self._metadata = None
+
+    def _ensure_loaded(self):
+        """Create the FAISS index and load the saved one, if any."""
+        if self._index is not None:
+            return
+        import faiss
 
         # Initialize FAISS index
-        self.index = faiss.IndexFlatIP(dimension)  # Inner product (cosine similarity with normalized vectors)
-        self.metadata = []  # List of metadata for each vector
+        self._index = faiss.IndexFlatIP(self.dimension)  # Inner product (cosine similarity with normalized vectors)
+        self._metadata = []  # List of metadata for each vector
 
         # Load existing index if available
         if os.path.exists(self.index_file) and os.path.exists(self.metadata_file):
             self.load_index()
 
+    @property
+    def index(self):
+        """The FAISS index, loaded on first access."""
+        self._ensure_loaded()
+        return self._index
+
+    @index.setter
+    def index(self, value):
+        self._index = value
+
+    @property
+    def metadata(self) -> List[Dict[str, Any]]:
+        """Metadata for each vector, loaded together with the index."""
+        self._ensure_loaded()
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, value: List[Dict[str, Any]]):
+        self._metadata = value
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the index has been loaded."""
+        return self._index is not None
+
     async def add_chunks(self, chunks: List[Dict[str, Any]], video_path: str):
         """
         Add transcription chunks to the index.
@@ -39,44 +93,249 @@ class VideoIndexer:
             chunks: List of chunk dictionaries
             video_path: Path to the original video file
         """
+        embeddings_array = await self._embed_chunks(chunks)
+        if embeddings_array is None:
+            return
+
+        # Add vectors one by one so that duplicates inside the same batch collapse too
+        for chunk, vector in zip(chunks, embeddings_array):
+            self._add_vector(vector, chunk['text'], self._make_occurrence(chunk, video_path))
+
+        # Save index
+        self.save_index()
+
+    async def replace_video(self, chunks: List[Dict[str, Any]], video_path: str):
+        """
+        Replace everything indexed for a video with new chunks.
+
+        The new chunks are embedded first; the old occurrences are then removed and
+        the new ones added without yielding to the event loop, and the result is
+        saved (and published) as one version, so searches see either the old or the
+        new chunks of the video, never a mix or neither.
+
+        Args:
+            chunks: List of chunk dictionaries
+            video_path: Path to the original video file
+        """
+        embeddings_array = await self._embed_chunks(chunks)
+
+        self._drop_video(video_path)
+        if embeddings_array is not None:
+            for chunk, vector in zip(chunks, embeddings_array):
+                self._add_vector(vector, chunk['text'], self._make_occurrence(chunk, video_path))
+
+        self.save_index()
+
+    async def _embed_chunks(self, chunks: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Embed chunk texts.
+
+        Returns:
+            Normalized float32 vectors, or None if there are no chunks
+        """
+        import faiss
         texts = [chunk['text'] for chunk in chunks]
+        if not texts:
+            return None
+
+        cached = self.embedding_cache.get_many(texts) if self.embedding_cache is not None else {}
 
-        # Get embeddings for all texts
+        # Get embeddings for all texts that are not cached yet
         embeddings = []
+        fresh = []
         for text in texts:
+            if text in cached:
+                embeddings.append(cached[text])
+                self.embedding_stats['cached'] += 1
+                continue
             embedding = await emb(text)
+            self.embedding_stats['embedded'] += 1
             if embedding:
                 embeddings.append(embedding)
+                fresh.append(len(embeddings) - 1)
             else:
                 print(f"Failed to get embedding for text: {text[:50]}...")
                 embeddings.append(np.zeros(self.dimension))  # Fallback
 
-        if not embeddings:
-            return
-
         # Convert to numpy array
         embeddings_array = np.array(embeddings, dtype=np.float32)
 
         # Normalize vectors for cosine similarity
         faiss.normalize_L2(embeddings_array)
 
-        # Add to index
-        self.index.add(embeddings_array)
+        # Failed embeddings are not cached so the next run retries them
+        if self.embedding_cache is not None and fresh:
+            self.embedding_cache.put_many((texts[i], embeddings_array[i]) for i in fresh)
+        return embeddings_array
 
-        # Add metadata
-        for i, chunk in enumerate(chunks):
-            metadata_entry = {
-                'video_path': video_path,
-                'start_time': chunk['start'],
-                'end_time': chunk['end'],
-                'text': chunk['text'],
-                'chunk_index': len(self.metadata) + i
-            }
-            self.metadata.append(metadata_entry)
+    def seed_embedding_cache(self) -> int:
+        """
+        Copy the vectors already in the index into the embedding cache.
 
-        # Save index
+        Each index entry's vector was embedded from the entry's text, so an existing
+        library can be re-chunked without re-embedding unchanged chunks. The zero
+        vectors stored for failed embeddings are left out, so reindex retries them.
+
+        Returns:
+            Number of texts added to the cache
+        """
+        self._ensure_loaded()
+        if self.embedding_cache is None or self._index.ntotal == 0:
+            return 0
+        texts = {}
+        for i, entry in enumerate(self._metadata):
+            text = entry.get('text')
+            if text and text not in texts:
+                texts[text] = i
+        known = self.embedding_cache.get_many(list(texts))
+        missing = [(text, self._index.reconstruct(i)) for text, i in texts.items() if text not in known]
+        missing = [(text, vector) for text, vector in missing if np.linalg.norm(vector) > 0]
+        if missing:
+            self.embedding_cache.put_many(missing)
+        return len(missing)
+
+    def truncate_video(self, video_path: str, start_time: float):
+        """
+        Remove a video's occurrences that start after a time and save the index.
+
+        Used when an interrupted transcription resumes from its checkpoint: the chunks
+        indexed after the checkpoint are produced again.
+        """
+        self._drop_video(video_path, start_time)
         self.save_index()
 
+    def _drop_video(self, video_path: str, after: Optional[float] = None):
+        """
+        Remove every occurrence in a video (only those starting after `after` if given),
+        and the vectors left without occurrences.
+
+        Vectors shared with other videos stay; the index is rebuilt in memory.
+        """
+        import faiss
+
+        # Vector ids change, so the next published version needs a new vector log
+        self._log_ntotal = None
+
+        vectors = self.index.reconstruct_n(0, self.index.ntotal) if self.index.ntotal else np.zeros((0, self.dimension), dtype=np.float32)
+        old_metadata = self.metadata
+
+        self.index = faiss.IndexFlatIP(self.dimension)
+        self.metadata = []
+        for vector, entry in zip(vectors, old_metadata):
+            occurrences = [o for o in entry['occurrences']
+                           if o['video_path'] != video_path or (after is not None and o['start_time'] <= after)]
+            if not occurrences:
+                continue
+            self.index.add(vector.reshape(1, -1))
+            self.metadata.append({
+                **occurrences[0],
+                'text': entry['text'],
+                'chunk_index': len(self.metadata),
+                'occurrences': occurrences
+            })
+
+    def _make_occurrence(self, chunk: Dict[str, Any], video_path: str) -> Dict[str, Any]:
+        """Build the (video, time) reference stored for one chunk, with its segment offsets."""
+        occurrence = {
+            'video_path': video_path,
+            'start_time': chunk['start'],
+            'end_time': chunk['end'],
+            **compact_offsets(chunk)
+        }
+        if chunk.get('provisional'):
+            # From a fast draft transcription; replaced once the refined transcript is indexed
+            occurrence['provisional'] = True
+        return occurrence
+
+    def _find_duplicate(self, vector: np.ndarray) -> Optional[int]:
+        """
+        Find an existing vector that is a near-duplicate of the given one.
+
+        Args:
+            vector: Normalized embedding vector
+
+        Returns:
+            Index of the duplicate vector, or None if there is none
+        """
+        if self.index.ntotal == 0 or self.dedupe_threshold > 1.0:
+            return None
+        scores, indices = self.index.search(vector.reshape(1, -1), 1)
+        if indices[0][0] != -1 and scores[0][0] >= self.dedupe_threshold:
+            return int(indices[0][0])
+        return None
+
+    def _add_vector(self, vector: np.ndarray, text: str, occurrence: Dict[str, Any]) -> int:
+        """
+        Store a vector, or attach the occurrence to an existing near-duplicate.
+
+        Args:
+            vector: Normalized embedding vector
+            text: Chunk text
+            occurrence: (video, time) reference for this chunk
+
+        Returns:
+            Index of the vector the occurrence was attached to
+        """
+        duplicate = self._find_duplicate(vector)
+        if duplicate is not None:
+            self._attach_occurrence(duplicate, text, occurrence)
+            return duplicate
+
+        occurrence = {key: value for key, value in occurrence.items() if key != 'text'}
+        self.index.add(vector.reshape(1, -1))
+        self.metadata.append({
+            **occurrence,
+            'text': text,
+            'chunk_index': len(self.metadata),
+            'occurrences': [occurrence]
+        })
+        return len(self.metadata) - 1
+
+    def _attach_occurrence(self, target: int, text: str, occurrence: Dict[str, Any]):
+        """
+        Add an occurrence to an existing vector.
+
+        Near-duplicates rarely have the very same text; the occurrence then keeps its
+        own chunk text, which its segment offsets refer to.
+        """
+        occurrence = {key: value for key, value in occurrence.items() if key != 'text'}
+        if text != self.metadata[target]['text']:
+            occurrence['text'] = text
+        occurrences = self.metadata[target]['occurrences']
+        if occurrence not in occurrences:
+            occurrences.append(occurrence)
+
+    def compact(self):
+        """
+        Rebuild the index so that near-duplicate vectors are stored once.
+
+        Older index files kept one vector per chunk; their metadata entries are
+        converted to the occurrence-list format while being merged.
+        """
+        import faiss
+
+        # Vector ids change, so the next published version needs a new vector log
+        self._log_ntotal = None
+
+        vectors = self.index.reconstruct_n(0, self.index.ntotal) if self.index.ntotal else np.zeros((0, self.dimension), dtype=np.float32)
+        old_metadata = self.metadata
+
+        self.index = faiss.IndexFlatIP(self.dimension)
+        self.metadata = []
+        for vector, entry in zip(vectors, old_metadata):
+            occurrences = entry.get('occurrences') or [{
+                'video_path': entry['video_path'],
+                'start_time': entry['start_time'],
+                'end_time': entry['end_time']
+            }]
+            target = None
+            for occurrence in occurrences:
+                text = occurrence.get('text', entry['text'])
+                if target is None:
+                    target = self._add_vector(vector, text, occurrence)
+                else:
+                    self._attach_occurrence(target, text, occurrence)
+
     async def search(self, query: str, top_k: int = 5, video_filename: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Search for similar chunks based on query.
@@ -89,7 +348,9 @@ class VideoIndexer:
         Returns:
             List of matching chunks with scores
         """
-        # Get embedding for query
+        import faiss
+
+        # Get embedding for query
         query_embedding = await emb(query)
         if not query_embedding:
             return []
@@ -100,40 +361,291 @@ class VideoIndexer:
         # Search
         scores, indices = self.index.search(query_array, min(top_k * 2, self.index.ntotal))  # Get more results initially for filtering
 
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx != -1 and idx < len(self.metadata):
-                result = self.metadata[idx].copy()
-                result['score'] = float(score)
-                
-                # Filter by video filename if provided
-                if video_filename:
-                    from pathlib import Path
-                    if Path(result['video_path']).name == video_filename:
-                        results.append(result)
-                else:
-                    results.append(result)
-        
-        # Return only the top_k results after filtering
+        results = []
+        for score, idx in zip(scores[0], indices[0]):
+            if idx != -1 and idx < len(self.metadata):
+                entry = self.metadata[idx]
+                occurrences = entry['occurrences']
+
+                # Filter by video filename if provided
+                if video_filename:
+                    from pathlib import Path
+                    occurrences = [o for o in occurrences if Path(o['video_path']).name == video_filename]
+                    if not occurrences:
+                        continue
+
+                # One result per unique content, with every place it occurs
+                result = entry.copy()
+                result['occurrences'] = [self._locate_in_occurrence(query, entry['text'], o) for o in occurrences]
+                result.update(result['occurrences'][0])
+                result['score'] = float(score)
+                for key in OFFSET_KEYS:
+                    result.pop(key, None)
+                results.append(result)
+
+        # Return only the top_k results after filtering
         return sorted(results, key=lambda x: x['score'], reverse=True)[:top_k]
 
+    def _locate_in_occurrence(self, query: str, text: str, occurrence: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Copy an occurrence for a search result, narrowed to the segments matching the query.
+
+        The copy gets match_start_time/match_end_time (the whole chunk when the chunk
+        has no segment offsets or no segment shares text with the query) and drops
+        the offset arrays. The offsets are applied to the occurrence's own text when it
+        has one (a near-duplicate merged into another chunk's vector).
+        """
+        located = {key: value for key, value in occurrence.items() if key not in OFFSET_KEYS}
+        match = None
+        if 'segment_char_offsets' in occurrence:
+            match = locate_match(query, occurrence.get('text', text), occurrence['segment_char_offsets'],
+                                 occurrence['segment_starts'], occurrence['segment_ends'])
+        located['match_start_time'], located['match_end_time'] = match or (occurrence['start_time'], occurrence['end_time'])
+        return located
+
     def save_index(self):
         """Save the FAISS index and metadata to disk."""
-        faiss.write_index(self.index, self.index_file)
-        with open(self.metadata_file, 'wb') as f:
+        import faiss
+        # Write next to the targets and rename, so a crash never leaves a truncated file
+        faiss.write_index(self.index, self.index_file + '.tmp')
+        os.replace(self.index_file + '.tmp', self.index_file)
+        with open(self.metadata_file + '.tmp', 'wb') as f:
+            pickle.dump(self.metadata, f)
+        os.replace(self.metadata_file + '.tmp', self.metadata_file)
+
+        if self.publish_versions:
+            self.publish()
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        """Read the manifest of the latest published version, if any."""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _published_path(self, name: str) -> str:
+        """Resolve a file name from the manifest next to the manifest itself."""
+        return os.path.join(os.path.dirname(self.manifest_file), name)
+
+    def publish(self):
+        """
+        Publish the current index as a new version for read-only search processes.
+
+        Vectors are appended to a raw float32 log, so a reader only loads the rows
+        added since the version it already has. Rewrites such as compaction start a
+        new log generation, which readers load in full. The manifest is replaced
+        atomically and always points at complete files.
+        """
+        manifest = self._read_manifest() or {}
+        version = max(manifest.get('version', 0), self.version) + 1
+        base_name = os.path.basename(self.index_file).replace('.faiss', '')
+
+        if self._log_ntotal is None or self._log_ntotal > self.index.ntotal:
+            self._generation = max(manifest.get('generation', 0), self._generation or 0) + 1
+            self._log_ntotal = 0
+
+        # Append the vectors added since the last publish
+        vectors_name = f"{base_name}.g{self._generation}.vectors"
+        new_rows = self.index.ntotal - self._log_ntotal
+        with open(self._published_path(vectors_name), 'ab' if self._log_ntotal else 'wb') as f:
+            if new_rows > 0:
+                self.index.reconstruct_n(self._log_ntotal, new_rows).astype(np.float32).tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_ntotal = self.index.ntotal
+
+        metadata_name = f"{base_name}.v{version}_metadata.pkl"
+        with open(self._published_path(metadata_name), 'wb') as f:
             pickle.dump(self.metadata, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        manifest = {
+            'version': version,
+            'generation': self._generation,
+            'ntotal': self.index.ntotal,
+            'dimension': self.dimension,
+            'vectors_file': vectors_name,
+            'metadata_file': metadata_name,
+            'published_at': time.time()
+        }
+        temp_manifest = self.manifest_file + '.tmp'
+        with open(temp_manifest, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_manifest, self.manifest_file)
+        self.version = version
+
+        self._remove_old_versions(base_name, version, self._generation)
+
+    def _remove_old_versions(self, base_name: str, version: int, generation: int):
+        """Delete published files that no reader can still be switching to."""
+        directory = os.path.dirname(self.manifest_file) or '.'
+        for name in os.listdir(directory):
+            if not name.startswith(base_name + '.'):
+                continue
+            suffix = name[len(base_name) + 1:]
+            try:
+                if suffix.startswith('v') and suffix.endswith('_metadata.pkl'):
+                    stale = int(suffix[1:-len('_metadata.pkl')]) < version - 1
+                elif suffix.startswith('g') and suffix.endswith('.vectors'):
+                    stale = int(suffix[1:-len('.vectors')]) < generation - 1
+                else:
+                    continue
+            except ValueError:
+                continue
+            if stale:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
 
     def load_index(self):
         """Load the FAISS index and metadata from disk."""
+        import faiss
         self.index = faiss.read_index(self.index_file)
         with open(self.metadata_file, 'rb') as f:
             self.metadata = pickle.load(f)
 
+        # Index files written before dedupe have one vector per chunk
+        if any('occurrences' not in entry for entry in self.metadata):
+            self.compact()
+
+    def indexed_videos(self) -> List[str]:
+        """Paths of all videos with at least one indexed occurrence, in first-indexed order."""
+        videos = {}
+        for entry in self.metadata:
+            for occurrence in entry['occurrences']:
+                videos.setdefault(occurrence['video_path'], None)
+        return list(videos)
+
+    def chunk_starts(self, video_path: str) -> List[float]:
+        """Sorted start times of a video's indexed chunks, i.e. where search hits in it begin."""
+        return sorted({occurrence['start_time'] for entry in self.metadata for occurrence in entry['occurrences']
+                       if occurrence['video_path'] == video_path})
+
     def get_index_info(self) -> Dict[str, Any]:
         """Get information about the current index."""
         return {
             'total_vectors': self.index.ntotal,
+            'total_occurrences': sum(len(entry['occurrences']) for entry in self.metadata),
             'dimension': self.dimension,
             'index_file': self.index_file,
-            'metadata_file': self.metadata_file
+            'metadata_file': self.metadata_file,
+            'version': self.version
         }
+
+
+class ReadOnlyVideoIndexer(VideoIndexer):
+    """
+    A read-only view of the index published by a writer process.
+
+    Search processes use this instead of VideoIndexer: they never run ingestion,
+    and pick up new versions from the manifest, loading only newly added vectors
+    when the vector log generation is unchanged.
+    """
+    def __init__(self, dimension: int = 1024, index_file: Optional[str] = None, poll_interval: float = 1.0):
+        """
+        Initialize the read-only indexer.
+
+        Args:
+            dimension: Dimension of the embedding vectors
+            index_file: Path of the writer's FAISS index; the manifest is found next to it
+            poll_interval: Minimum seconds between two manifest checks
+        """
+        self.poll_interval = poll_interval
+        self._last_poll = 0.0
+        super().__init__(dimension, index_file)
+
+    def _ensure_loaded(self):
+        """Create an empty FAISS index and load the latest published version, if any."""
+        if self._index is not None:
+            return
+        import faiss
+        self._index = faiss.IndexFlatIP(self.dimension)
+        self._metadata = []
+        self.refresh(force=True)
+
+    def load_index(self):
+        """Load the latest published version instead of the writer's working files."""
+        self.refresh(force=True)
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Switch to the latest published version if it changed.
+
+        Args:
+            force: Check the manifest even if the poll interval has not passed
+
+        Returns:
+            True if a new version was loaded
+        """
+        if self._index is None:
+            # First use: _ensure_loaded loads the latest version
+            self._ensure_loaded()
+            return self.version > 0
+
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_interval:
+            return False
+        self._last_poll = now
+
+        manifest = self._read_manifest()
+        if manifest is None or manifest['version'] == self.version:
+            return False
+
+        try:
+            self._load_version(manifest)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError) as e:
+            # The writer may have moved on and removed these files; retry on the next poll
+            print(f"Failed to load index version {manifest['version']}: {e}")
+            return False
+        return True
+
+    def _load_version(self, manifest: Dict[str, Any]):
+        """Load the vectors and metadata of a published version."""
+        import faiss
+        with open(self._published_path(manifest['metadata_file']), 'rb') as f:
+            metadata = pickle.load(f)
+
+        ntotal = manifest['ntotal']
+        if manifest['generation'] == self._generation and ntotal >= self.index.ntotal:
+            index = self.index
+        else:
+            index = faiss.IndexFlatIP(self.dimension)
+
+        start = index.ntotal
+        if ntotal > start:
+            rows = np.fromfile(
+                self._published_path(manifest['vectors_file']),
+                dtype=np.float32,
+                count=(ntotal - start) * self.dimension,
+                offset=start * self.dimension * 4
+            )
+            if rows.size != (ntotal - start) * self.dimension:
+                raise ValueError("vector log is shorter than the manifest")
+            index.add(rows.reshape(-1, self.dimension))
+
+        self.index = index
+        self.metadata = metadata
+        self.version = manifest['version']
+        self._generation = manifest['generation']
+
+    async def add_chunks(self, chunks: List[Dict[str, Any]], video_path: str):
+        raise RuntimeError("This index is read-only; send ingestion to the writer process")
+
+    async def replace_video(self, chunks: List[Dict[str, Any]], video_path: str):
+        raise RuntimeError("This index is read-only; send ingestion to the writer process")
+
+    def truncate_video(self, video_path: str, start_time: float):
+        raise RuntimeError("This index is read-only; send ingestion to the writer process")
+
+    def save_index(self):
+        raise RuntimeError("This index is read-only; send ingestion to the writer process")
+
+    async def search(self, query: str, top_k: int = 5, video_filename: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Search the latest published version (see VideoIndexer.search)."""
+        self.refresh()
+        return await super().search(query, top_k, video_filename)
@@ -0,0 +1,478 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+# Job lifecycle: queued -> running (worker transcribes, chunks stream into job_chunks)
+# -> transcribed (worker finished) -> done (writer indexed every chunk), or failed
+QUEUED = 'queued'
+RUNNING = 'running'
+TRANSCRIBED = 'transcribed'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobStore:
+    """
+    Persistent ingestion job queue backed by SQLite.
+
+    Shared by the API process and the worker processes; each process opens its own
+    connection. Chunks produced by workers are stored per job until the writer has
+    indexed them, so jobs survive restarts of either side.
+    """
+    def __init__(self, db_path: str = "ingestion_jobs.db"):
+        """
+        Initialize the job store.
+
+        Args:
+            db_path: Path of the SQLite database file
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                video_path TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress REAL NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_chunks (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                chunk TEXT NOT NULL,
+                indexed INTEGER NOT NULL DEFAULT 0,
+                deferred INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, seq)
+            )""")
+        self._ensure_column('job_chunks', 'deferred', 'INTEGER NOT NULL DEFAULT 0')
+
+    def _ensure_column(self, table: str, column: str, declaration: str):
+        """Add a column missing from a database created by an older version."""
+        columns = [row['name'] for row in self._conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def enqueue(self, video_path: str, params: Dict[str, Any]) -> str:
+        """
+        Add a job to the queue.
+
+        Args:
+            video_path: Path of the uploaded video
+            params: Ingestion parameters (chunk_duration, language, ...)
+
+        Returns:
+            The new job id
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, video_path, params, status, stage, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, video_path, json.dumps(params, ensure_ascii=False), QUEUED, QUEUED, now, now))
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically take the oldest queued job.
+
+        Args:
+            worker_id: Identifier of the claiming worker
+
+        Returns:
+            The claimed job, or None if the queue is empty
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, stage = ?, worker = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, 'starting', worker_id, time.time(), row['id']))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        job = self._row_to_job(row)
+        job['status'] = RUNNING
+        return job
+
+    def update(self, job_id: str, **fields: Any):
+        """
+        Update fields of a job (status, stage, progress, result, error).
+
+        Args:
+            job_id: Job id
+            fields: Column values; 'result' is stored as JSON
+        """
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'], ensure_ascii=False)
+        fields['updated_at'] = time.time()
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by id, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """List the most recent jobs."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def count(self, status: str) -> int:
+        """Number of jobs with the given status."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def add_chunk(self, job_id: str, seq: int, chunk: Dict[str, Any], deferred: bool = False):
+        """
+        Store a chunk produced by a worker until the writer indexes it.
+
+        Deferred chunks (the refined pass of a two-pass job) are not indexed one by
+        one; they replace the video's chunks together once the job is transcribed.
+        A resumed job produces its chunks again; the stored ones keep their indexed flag.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO job_chunks (job_id, seq, chunk, indexed, deferred) VALUES (?, ?, ?, 0, ?)",
+                (job_id, seq, json.dumps(chunk, ensure_ascii=False), int(deferred)))
+
+    def pending_chunks(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Chunks to index one by one, oldest job first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT c.job_id, c.seq, c.chunk, j.video_path FROM job_chunks c JOIN jobs j ON j.id = c.job_id "
+                "WHERE c.indexed = 0 AND c.deferred = 0 ORDER BY j.created_at, c.seq LIMIT ?", (limit,)).fetchall()
+        return [{'job_id': row['job_id'], 'seq': row['seq'], 'video_path': row['video_path'],
+                 'chunk': json.loads(row['chunk'])} for row in rows]
+
+    def deferred_chunks(self, job_id: str) -> List[Dict[str, Any]]:
+        """Deferred chunks of a job that are not indexed yet, in order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, chunk FROM job_chunks WHERE job_id = ? AND indexed = 0 AND deferred = 1 ORDER BY seq",
+                (job_id,)).fetchall()
+        return [{'seq': row['seq'], 'chunk': json.loads(row['chunk'])} for row in rows]
+
+    def mark_indexed(self, job_id: str, seqs: List[int]):
+        """Mark chunks as indexed."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE job_chunks SET indexed = 1 WHERE job_id = ? AND seq = ?", [(job_id, seq) for seq in seqs])
+
+    def finished_transcriptions(self) -> List[Dict[str, Any]]:
+        """Transcribed jobs whose chunks have all been indexed, apart from deferred ones."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs j WHERE status = ? AND NOT EXISTS "
+                "(SELECT 1 FROM job_chunks c WHERE c.job_id = j.id AND c.indexed = 0 AND c.deferred = 0)",
+                (TRANSCRIBED,)).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def requeue_interrupted(self) -> int:
+        """
+        Put jobs that were running when the service stopped back in the queue.
+
+        Their unindexed chunks are dropped; the job is transcribed again and chunks
+        that were already indexed collapse onto the existing vectors.
+
+        Returns:
+            Number of requeued jobs
+        """
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM job_chunks WHERE indexed = 0 AND job_id IN (SELECT id FROM jobs WHERE status = ?)", (RUNNING,))
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, worker = NULL, updated_at = ? WHERE status = ?",
+                (QUEUED, QUEUED, time.time(), RUNNING))
+            return cursor.rowcount
+
+    def close(self):
+        self._conn.close()
+
+
+def run_worker(db_path: str, worker_id: str, stop_event, poll_interval: float = 1.0, job_threads: int = 1):
+    """
+    Entry point of an ingestion worker process.
+
+    Claims jobs and transcribes them; chunks are handed to the writer through the
+    job store as soon as they close. Workers never touch the index. With several
+    job threads, the jobs share one model and their Whisper windows are decoded
+    in common batches. With QUALITY_TARGET_LATENCY set, each job's quality profile
+    is picked from the queue depth (see quality_profiles.QualityController).
+    """
+    from video_search_tool import VideoSearchTool
+    from configuration import video_config
+    from quality_profiles import QualityController
+
+    store = JobStore(db_path)
+    # The indexer of this tool is never loaded; the worker only transcribes
+    tool = VideoSearchTool(role='worker')
+    if job_threads > 1:
+        tool.transcriber.enable_batching(video_config.whisper_batch_size, video_config.whisper_batch_wait)
+    controller = None
+    if video_config.quality_target_latency > 0:
+        controller = QualityController(tool.quality_profiles, video_config.quality_target_latency,
+                                       max(video_config.ingest_workers, 1) * job_threads)
+    print(f"Ingestion worker {worker_id} started ({job_threads} job thread(s))")
+
+    threads = [
+        threading.Thread(target=_process_jobs,
+                         args=(store, tool, f"{worker_id}-{i}", stop_event, poll_interval, controller))
+        for i in range(job_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+
+
+def _process_jobs(store: JobStore, tool, worker_id: str, stop_event, poll_interval: float, controller=None):
+    """Claim and transcribe jobs until the worker is stopped."""
+    while not stop_event.is_set():
+        job = store.claim(worker_id)
+        if job is None:
+            stop_event.wait(poll_interval)
+            continue
+
+        print(f"Worker {worker_id} processing job {job['id']}: {job['video_path']}")
+        try:
+            result = _transcribe_job(job, store, tool, controller)
+            store.update(job['id'], status=TRANSCRIBED, stage='indexing', progress=0.95, result=result)
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            store.update(job['id'], status=FAILED, stage=FAILED, error=str(e))
+
+
+def _transcribe_job(job: Dict[str, Any], store: JobStore, tool, controller=None) -> Dict[str, Any]:
+    """
+    Transcribe one job, streaming its chunks into the store and reporting progress.
+
+    A copy of an already indexed video (matched by audio fingerprint) is not
+    transcribed: the original's shifted transcript is chunked and stored at once.
+    With a draft model configured, the draft chunks are indexed as they arrive and
+    the job reaches the 'refining' stage, where the video is already searchable;
+    the chunks of the refined pass are deferred until the pass is complete.
+    The final pass uses the quality profile picked by the controller, if any.
+    """
+    video_path = job['video_path']
+    params = job['params']
+    try:
+        duration = tool.video_processor.get_video_duration(video_path)
+    except Exception:
+        duration = None
+
+    profile = None
+    if controller:
+        profile = controller.choose(store.count(QUEUED), duration)
+        print(f"Job {job['id']}: quality profile '{profile}' ({store.count(QUEUED)} job(s) queued)")
+
+    two_pass = tool.draft_transcriber is not None
+    passes = [('drafting', True, 0.05, 0.3), ('refining', False, 0.35, 0.6)] if two_pass else \
+        [('transcribing', False, 0.05, 0.9)]
+
+    # The audio proxy is written while the first pass reads the video; later passes decode the proxy
+    proxy = threading.Thread(target=tool.prepare_audio, args=(video_path,), daemon=True)
+    proxy.start()
+    # Preview sprite sheets come from their own pass over the video frames
+    previews = threading.Thread(target=tool.prepare_previews, args=(video_path,), daemon=True)
+    previews.start()
+
+    duplicate = tool.reuse_duplicate_transcript(video_path)
+    if duplicate is not None:
+        print(f"Job {job['id']}: audio matches {duplicate['reused_from']['video_filename']}, reusing its transcript")
+        chunks = tool.split_transcript(duplicate, params['chunk_duration'])
+        for seq, chunk in enumerate(chunks):
+            store.add_chunk(job['id'], seq, chunk)
+        transcript_file = tool.transcript_storage.save_transcript(Path(video_path).name, duplicate)
+        proxy.join()
+        previews.join()
+        return {
+            'video_path': video_path,
+            'video_filename': Path(video_path).name,
+            'total_chunks': len(chunks),
+            'transcript_saved': True,
+            'transcript_file': transcript_file,
+            'two_pass': False,
+            'quality_profile': duplicate.get('quality_profile'),
+            'reused_transcript': duplicate['reused_from']
+        }
+
+    seq = 0
+    total_chunks = 0
+    for stage, draft, base, span in passes:
+        if stage == 'refining':
+            proxy.join()
+        store.update(job['id'], stage=stage, progress=base)
+        state = {}
+        total_chunks = 0
+        started = time.perf_counter()
+        for chunk in tool.iter_video_chunks(video_path, params['chunk_duration'], params.get('language'), state,
+                                            draft, profile):
+            store.add_chunk(job['id'], seq, chunk, deferred=two_pass and not draft)
+            seq += 1
+            total_chunks += 1
+            if duration:
+                store.update(job['id'], progress=base + span * min(state.get('total_seconds', 0.0) / duration, 1.0))
+        if controller and not draft:
+            controller.record(state['quality_profile'], state.get('total_seconds', 0.0) - state.get('resumed_at', 0.0),
+                              time.perf_counter() - started)
+        transcript_file = tool.save_stream_transcript(video_path, state)
+    proxy.join()
+    previews.join()
+
+    return {
+        'video_path': video_path,
+        'video_filename': Path(video_path).name,
+        'total_chunks': total_chunks,
+        'transcript_saved': True,
+        'transcript_file': transcript_file,
+        'two_pass': two_pass,
+        'quality_profile': state.get('quality_profile'),
+        'vad': tool.stream_vad_stats(state)
+    }
+
+
+class IngestionQueue:
+    """
+    Background ingestion: a pool of worker processes transcribes uploaded videos
+    while the API process, the single index writer, indexes their chunks.
+    """
+    def __init__(self, video_tool, db_path: str = "ingestion_jobs.db", workers: int = 1, poll_interval: float = 1.0,
+                 job_threads: int = 1):
+        """
+        Initialize the ingestion queue.
+
+        Args:
+            video_tool: VideoSearchTool whose indexer receives the chunks
+            db_path: Path of the SQLite job database
+            workers: Number of worker processes
+            poll_interval: Seconds between checks for new work
+            job_threads: Jobs transcribed at once by each worker, with batched decoding if > 1
+        """
+        self.video_tool = video_tool
+        self.db_path = db_path
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.job_threads = job_threads
+        self.store = JobStore(db_path)
+        self._context = multiprocessing.get_context('spawn')
+        self._stop_event = self._context.Event()
+        self._processes = []
+        self._index_task = None
+
+    def start(self):
+        """Requeue interrupted jobs, start the workers and the indexing loop."""
+        requeued = self.store.requeue_interrupted()
+        if requeued:
+            print(f"Requeued {requeued} interrupted ingestion job(s)")
+
+        for i in range(self.workers):
+            process = self._context.Process(
+                target=run_worker,
+                args=(self.db_path, f"worker-{os.getpid()}-{i}", self._stop_event, self.poll_interval, self.job_threads),
+                daemon=True)
+            process.start()
+            self._processes.append(process)
+        self._index_task = asyncio.create_task(self._index_loop())
+
+    async def stop(self):
+        """Stop the indexing loop and the workers; running jobs resume on next start."""
+        self._stop_event.set()
+        if self._index_task:
+            self._index_task.cancel()
+        for process in self._processes:
+            await asyncio.to_thread(process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def submit(self, video_path: str, chunk_duration: float, language: Optional[str]) -> str:
+        """
+        Queue a video for ingestion.
+
+        Returns:
+            Job id
+        """
+        return self.store.enqueue(video_path, {'chunk_duration': chunk_duration, 'language': language})
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job with its status, stage and progress."""
+        return self.store.get(job_id)
+
+    def list_jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """List the most recent jobs."""
+        return self.store.list(limit)
+
+    async def _index_loop(self):
+        """Index chunks produced by the workers and complete finished jobs."""
+        while True:
+            try:
+                indexed = await self._index_pending()
+                for job in self.store.finished_transcriptions():
+                    if (job['result'] or {}).get('two_pass'):
+                        # Refined pass of a two-pass job: swap out the provisional chunks at once
+                        # Nothing left when a restart comes after the swap; replacing with no
+                        # chunks would drop the video from the index
+                        deferred = self.store.deferred_chunks(job['id'])
+                        if deferred:
+                            await self.video_tool.indexer.replace_video([row['chunk'] for row in deferred],
+                                                                        job['video_path'])
+                            self.store.mark_indexed(job['id'], [row['seq'] for row in deferred])
+                    result = job['result'] or {}
+                    result['index_info'] = self.video_tool.get_index_info()
+                    self.store.update(job['id'], status=DONE, stage=DONE, progress=1.0, result=result)
+                    print(f"Job {job['id']} done: {job['video_path']}")
+                    # All chunks are indexed, so HLS segments can be cut at their boundaries
+                    self.video_tool.schedule_packaging(job['video_path'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Indexing loop error: {e}")
+                indexed = 0
+            if not indexed:
+                await asyncio.sleep(self.poll_interval)
+
+    async def _index_pending(self) -> int:
+        """Index the chunks waiting in the store; returns how many were indexed."""
+        pending = self.store.pending_chunks()
+        by_job = {}
+        for row in pending:
+            by_job.setdefault((row['job_id'], row['video_path']), []).append(row)
+
+        for (job_id, video_path), rows in by_job.items():
+            await self.video_tool.indexer.add_chunks([row['chunk'] for row in rows], video_path)
+            self.store.mark_indexed(job_id, [row['seq'] for row in rows])
+        return len(pending)
@@ -1,22 +1,53 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Form
-from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, StreamingResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Form, Request
+from fastapi.responses import JSONResponse, HTMLResponse, FileResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Dict, Any, Optional
 import os
 import shutil
 import tempfile
 import asyncio
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from video_search_tool import VideoSearchTool
+from ingestion_queue import IngestionQueue, DONE, FAILED
+from playback import media_type
 from configuration import video_config
-from content_generator import ContentGenerator
-from master_agent import MasterAgent
-from certificate_generator import CertificateGenerator
 from pydantic import BaseModel
 import json
 
-app = FastAPI(title="VedioS - 视频检索API", description="基于FastAPI的视频上传和检索服务")
+# 进程启动时间，用于就绪检查中报告启动耗时
+PROCESS_START = time.perf_counter()
+startup_state: Dict[str, Any] = {"ready_seconds": None, "error": None}
+# 不等待结果的后台任务（如上传后的转封装），保留引用以免被回收
+background_tasks: set = set()
+
+
+async def warm_up_index():
+    """后台加载索引（不加载Whisper模型，模型在首次转录时才加载）"""
+    try:
+        await asyncio.to_thread(video_tool.warm_up)
+        startup_state["ready_seconds"] = time.perf_counter() - PROCESS_START
+        print(f"索引加载完成，启动耗时 {startup_state['ready_seconds']:.2f} 秒")
+    except Exception as e:
+        startup_state["error"] = str(e)
+        print(f"索引加载失败: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up_task = asyncio.create_task(warm_up_index())
+    # 写入进程启动后台转录进程，上传只负责排队
+    if ingestion_queue:
+        ingestion_queue.start()
+    yield
+    if ingestion_queue:
+        await ingestion_queue.stop()
+    warm_up_task.cancel()
+
+
+app = FastAPI(title="VedioS - 视频检索API", description="基于FastAPI的视频上传和检索服务", lifespan=lifespan)
 
 # 添加CORS中间件，允许所有来源
 app.add_middleware(
@@ -27,11 +58,41 @@ app.add_middleware(
     allow_headers=["*"],  # 允许所有头部
 )
 
-# 全局工具实例
+# 全局工具实例（Whisper模型和索引都按需加载，构造很快）
 video_tool = VideoSearchTool()
-content_generator = ContentGenerator()
-master_agent = MasterAgent()
-certificate_generator = CertificateGenerator()
+
+# 后台处理队列（只读检索进程和 INGEST_WORKERS=0 时不启用）
+ingestion_queue: Optional[IngestionQueue] = None
+if video_tool.role != 'reader' and video_config.ingest_workers > 0:
+    ingestion_queue = IngestionQueue(video_tool, video_config.ingest_db, video_config.ingest_workers,
+                                     video_config.ingest_poll_interval, video_config.ingest_job_threads)
+
+# 内容生成、大师和证书模块首次使用时才创建，避免启动时导入LLM客户端和PIL
+_services: Dict[str, Any] = {}
+
+
+def get_content_generator():
+    """获取内容生成器（首次调用时创建）"""
+    if "content_generator" not in _services:
+        from content_generator import ContentGenerator
+        _services["content_generator"] = ContentGenerator()
+    return _services["content_generator"]
+
+
+def get_master_agent():
+    """获取百变大师（首次调用时创建）"""
+    if "master_agent" not in _services:
+        from master_agent import MasterAgent
+        _services["master_agent"] = MasterAgent()
+    return _services["master_agent"]
+
+
+def get_certificate_generator():
+    """获取证书生成器（首次调用时创建）"""
+    if "certificate_generator" not in _services:
+        from certificate_generator import CertificateGenerator
+        _services["certificate_generator"] = CertificateGenerator()
+    return _services["certificate_generator"]
 
 # 确保上传目录存在
 UPLOAD_DIR = Path("uploaded_videos")
@@ -49,13 +110,27 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "POST /upload": "上传视频文件并自动处理索引",
+            "GET /jobs/{job_id}": "查询后台处理任务进度",
             "GET /search": "基于自然语言查询检索视频片段",
             "GET /video/{filename}": "获取上传的视频文件",
             "GET /index-info": "获取索引信息",
-            "POST /extract-segment": "提取视频片段"
+            "GET /ready": "就绪检查",
+            "POST /extract-segment": "提取视频片段",
+            "GET /clip/{video_filename}": "流式播放视频片段",
+            "GET /previews/{video_filename}/{sheet}": "获取视频预览缩略图拼图",
+            "GET /hls/{video_filename}/master.m3u8": "自适应码率HLS播放列表"
         }
     }
 
+@app.get("/ready")
+async def readiness():
+    """就绪检查：索引加载完成后返回200，否则返回503"""
+    readiness_info = video_tool.get_readiness()
+    readiness_info["uptime_seconds"] = time.perf_counter() - PROCESS_START
+    readiness_info["ready_seconds"] = startup_state["ready_seconds"]
+    readiness_info["error"] = startup_state["error"]
+    return JSONResponse(content=readiness_info, status_code=200 if readiness_info["ready"] else 503)
+
 @app.post("/upload")
 async def upload_video(
     file: UploadFile = File(...),
@@ -69,6 +144,10 @@ async def upload_video(
     - **chunk_duration**: 每个文本块的持续时间（秒）
     - **language**: 转录语言代码（可选）
     """
+    # 只读检索进程不处理上传，由写入进程负责索引
+    if video_tool.role == 'reader':
+        raise HTTPException(status_code=403, detail="当前为只读检索进程，请将上传请求发送到写入进程（INDEX_ROLE=writer）")
+
     # 验证文件类型
     allowed_extensions = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv"}
     file_extension = Path(file.filename).suffix.lower()
@@ -105,6 +184,31 @@ async def upload_video(
         shutil.move(temp_file_path, final_path)
         temp_file_path = None
 
+        # 后台转封装为索引前置（faststart）的MP4，供 /video 播放和跳转
+        if video_tool.playback:
+            remux = asyncio.create_task(asyncio.to_thread(video_tool.prepare_playback, str(final_path)))
+            background_tasks.add(remux)
+            remux.add_done_callback(background_tasks.discard)
+
+        # 后台处理：立即返回任务ID，进度通过 /jobs/{job_id} 查询
+        if ingestion_queue:
+            job_id = ingestion_queue.submit(str(final_path), chunk_duration, language)
+            print(f"视频已加入处理队列: {final_path} (任务 {job_id})")
+            return JSONResponse(
+                content={
+                    "status": "accepted",
+                    "message": "视频上传成功，正在后台处理",
+                    "data": {
+                        "filename": final_filename,
+                        "file_path": str(final_path),
+                        "file_size": file_size,
+                        "job_id": job_id,
+                        "job_url": f"/jobs/{job_id}"
+                    }
+                },
+                status_code=202
+            )
+
         # 开始处理视频
         print(f"开始处理视频: {final_path}")
         result = await video_tool.index_video(
@@ -135,7 +239,14 @@ async def upload_video(
     finally:
         await file.close()
 
-@app.get("/search")
+def preview_tile(video_path: str, time: float) -> Optional[dict]:
+    """检索结果对应时刻的预览缩略图：拼图地址及其中图块的坐标和大小"""
+    tile = video_tool.get_preview_tile(video_path, time)
+    if tile:
+        tile["url"] = f"/previews/{Path(video_path).name}/{tile['sheet']}"
+    return tile
+
+@app.get("/search")
 async def search_videos(
     q: str = Query(..., description="自然语言查询"),
     top_k: int = Query(5, description="返回结果数量", ge=1, le=20),
@@ -159,9 +270,24 @@ async def search_videos(
                 "text": result["text"],
                 "start_time": result["start_time"],
                 "end_time": result["end_time"],
-                "duration": result["end_time"] - result["start_time"],
-                "video_filename": Path(result["video_path"]).name,
-                "chunk_index": result["chunk_index"]
+                "duration": result["end_time"] - result["start_time"],
+                "match_start_time": result["match_start_time"],
+                "match_end_time": result["match_end_time"],
+                "provisional": result.get("provisional", False),
+                "video_filename": Path(result["video_path"]).name,
+                "chunk_index": result["chunk_index"],
+                "preview": preview_tile(result["video_path"], result["match_start_time"]),
+                "occurrences": [
+                    {
+                        "video_filename": Path(occurrence["video_path"]).name,
+                        "start_time": occurrence["start_time"],
+                        "end_time": occurrence["end_time"],
+                        "match_start_time": occurrence["match_start_time"],
+                        "match_end_time": occurrence["match_end_time"],
+                        "preview": preview_tile(occurrence["video_path"], occurrence["match_start_time"])
+                    }
+                    for occurrence in result["occurrences"]
+                ]
             }
             formatted_results.append(formatted_result)
 
@@ -193,29 +319,233 @@ async def get_index_info():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取索引信息时出错: {str(e)}")
 
-@app.get("/video/{video_filename}")
-async def get_video(video_filename: str):
+@app.post("/reindex")
+async def reindex_videos(
+    video_filename: Optional[str] = Query(None, description="视频文件名（可选，默认全部已索引视频）"),
+    chunk_duration: Optional[float] = Query(None, description="分块持续时间（秒，可选，默认使用配置）")
+):
+    """
+    根据已保存的转录文本重新分块并更新索引，不重新运行Whisper
+
+    - **video_filename**: 只重建该视频的索引
+    - **chunk_duration**: 新的分块持续时间
+
+    只有嵌入缓存中不存在的分块文本才会调用嵌入接口
+    """
+    if video_tool.role == 'reader':
+        raise HTTPException(status_code=403, detail="当前为只读检索进程，请将重建索引请求发送到写入进程（INDEX_ROLE=writer）")
+    try:
+        result = await video_tool.reindex_all(chunk_duration, [video_filename] if video_filename else None)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"重建索引时出错: {str(e)}")
+    if video_filename and not result["videos"]:
+        detail = result["failed"][0]["error"] if result["failed"] else "该视频尚未建立索引"
+        raise HTTPException(status_code=404, detail=f"无法重建索引: {detail}")
+    return JSONResponse(content={"status": "success", **result}, status_code=200)
+
+def _get_job_or_404(job_id: str) -> Dict[str, Any]:
+    if not ingestion_queue:
+        raise HTTPException(status_code=404, detail="未启用后台处理队列")
+    job = ingestion_queue.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+@app.get("/jobs")
+async def list_jobs(limit: int = Query(50, description="返回的任务数量")):
+    """列出最近的后台处理任务"""
+    if not ingestion_queue:
+        return {"status": "success", "jobs": []}
+    return {"status": "success", "jobs": ingestion_queue.list_jobs(limit)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """查询后台处理任务的状态、阶段和进度"""
+    return {"status": "success", "job": _get_job_or_404(job_id)}
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request):
+    """以Server-Sent Events推送任务进度，任务完成或失败后结束"""
+    _get_job_or_404(job_id)
+
+    async def event_stream():
+        last_event = None
+        while not await request.is_disconnected():
+            job = ingestion_queue.get_job(job_id)
+            event = json.dumps(job, ensure_ascii=False)
+            if event != last_event:
+                yield f"data: {event}\n\n"
+                last_event = event
+            if job['status'] in (DONE, FAILED):
+                break
+            await asyncio.sleep(ingestion_queue.poll_interval)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+class VideoFileResponse(FileResponse):
+    """按较大的块读取视频文件，减少大文件和大范围请求的读取次数"""
+    chunk_size = 1024 * 1024
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否匹配当前 ETag（按弱比较，忽略 W/ 前缀）"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+@app.api_route("/video/{video_filename}", methods=["GET", "HEAD"])
+async def get_video(video_filename: str, request: Request):
     """
     获取上传的视频文件
 
     - **video_filename**: 视频文件名
+
+    支持 Range 请求（播放和跳转时只传输需要的部分）、强 ETag 和 If-None-Match/If-Range 校验；
+    后台转封装完成后返回索引前置（faststart）的MP4，跳转到检索结果时无需先下载文件末尾
     """
-    video_path = UPLOAD_DIR / video_filename
+    video_path = UPLOAD_DIR / Path(video_filename).name
     if not video_path.exists():
         raise HTTPException(status_code=404, detail="视频文件不存在")
 
+    # 判断是否已是 faststart 需要读取文件，放到线程中避免阻塞事件循环
+    serve_path, final = await asyncio.to_thread(video_tool.playback_source, str(video_path))
+    stat_result = await asyncio.to_thread(os.stat, serve_path)
+    # 文件大小和纳秒级修改时间确定文件内容，可作为强 ETag
+    etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+    headers = {
+        "ETag": etag,
+        # 转封装完成前返回的原文件之后会被替换，需要每次校验
+        "Cache-Control": "public, max-age=86400" if final else "no-cache"
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return VideoFileResponse(
+        path=serve_path,
+        media_type=media_type(serve_path),
+        headers=headers,
+        filename=Path(video_filename).stem + Path(serve_path).suffix,
+        stat_result=stat_result,
+        content_disposition_type="inline"
+    )
+
+@app.get("/previews/{video_filename}/{sheet}")
+async def get_preview_sheet(video_filename: str, sheet: str):
+    """
+    获取视频的预览缩略图拼图（入库时生成，图块坐标见 /search 结果中的 preview）
+
+    - **video_filename**: 视频文件名
+    - **sheet**: 拼图文件名
+    """
+    video_path = UPLOAD_DIR / Path(video_filename).name
+    sheet_path = video_tool.previews.sheet_path(str(video_path), sheet) if video_tool.previews else None
+    if not sheet_path or not sheet_path.exists():
+        raise HTTPException(status_code=404, detail="预览图不存在")
+
     return FileResponse(
-        path=str(video_path),
-        media_type='video/mp4',
-        filename=video_filename
+        path=str(sheet_path),
+        media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=86400"}
+    )
+
+@app.api_route("/hls/{video_filename}/master.m3u8", methods=["GET", "HEAD"])
+async def get_hls_master(video_filename: str):
+    """
+    获取视频的HLS主播放列表（多种码率，播放器按带宽自动切换）
+
+    视频索引完成后在后台打包，片段边界与索引文本块的开始时间对齐；尚未打包时返回404，可改用 /video
+    """
+    video_path = UPLOAD_DIR / Path(video_filename).name
+    master_path = video_tool.hls.master_path(str(video_path)) if video_tool.hls else None
+    if not master_path or not master_path.exists():
+        raise HTTPException(status_code=404, detail="HLS播放列表不存在")
+    # 重新打包（如重建索引后片段边界变化）会替换播放列表
+    return FileResponse(path=str(master_path), media_type="application/vnd.apple.mpegurl",
+                        headers={"Cache-Control": "no-cache"})
+
+@app.api_route("/hls/{video_filename}/{rendition}/{name}", methods=["GET", "HEAD"])
+async def get_hls_file(video_filename: str, rendition: str, name: str):
+    """
+    获取某一码率的HLS播放列表（index.m3u8）或视频片段（seg_*.ts）
+
+    - **video_filename**: 视频文件名
+    - **rendition**: 码率档位，如 360p
+    - **name**: 文件名
+    """
+    video_path = UPLOAD_DIR / Path(video_filename).name
+    file_path = video_tool.hls.file_path(str(video_path), rendition, name) if video_tool.hls else None
+    if not file_path:
+        raise HTTPException(status_code=404, detail="HLS文件不存在")
+    if name.endswith(".m3u8"):
+        return FileResponse(path=str(file_path), media_type="application/vnd.apple.mpegurl",
+                            headers={"Cache-Control": "no-cache"})
+    return FileResponse(path=str(file_path), media_type="video/mp2t",
+                        headers={"Cache-Control": "public, max-age=86400"})
+
+@app.get("/clip/{video_filename}")
+async def stream_clip(
+    video_filename: str,
+    start_time: float = Query(..., description="开始时间（秒）", ge=0),
+    end_time: float = Query(..., description="结束时间（秒）", ge=0),
+    mode: Optional[str] = Query(None, description="提取模式：fast（关键帧对齐，不重新编码）或 accurate（精确重新编码）")
+):
+    """
+    以流的方式返回视频片段（分片MP4），边提取边播放，不在磁盘上生成文件
+
+    - **video_filename**: 视频文件名
+    - **start_time**: 开始时间（秒）
+    - **end_time**: 结束时间（秒）
+    - **mode**: 提取模式，默认使用配置 CLIP_MODE
+
+    响应头 X-Clip-Start / X-Clip-End 为片段的实际起止时间（fast 模式对齐到关键帧，End 为空表示到视频结尾）
+    """
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="开始时间必须小于结束时间")
+    if mode not in (None, "fast", "accurate"):
+        raise HTTPException(status_code=400, detail="mode 必须为 fast 或 accurate")
+    video_path = UPLOAD_DIR / Path(video_filename).name
+    if not video_path.exists():
+        raise HTTPException(status_code=404, detail="视频文件不存在")
+
+    try:
+        clip = await asyncio.to_thread(video_tool.open_clip_stream, str(video_path), start_time, end_time, mode)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"提取片段时出错: {str(e)}")
+
+    return StreamingResponse(
+        clip["chunks"],
+        media_type="video/mp4",
+        headers={
+            "X-Clip-Start": str(clip["start_time"]),
+            "X-Clip-End": "" if clip["end_time"] is None else str(clip["end_time"]),
+            "X-Clip-Mode": clip["mode"]
+        }
     )
 
+async def run_until_disconnected(request: Request, func, *args):
+    """
+    在线程中执行 func 并等待结果；客户端中途断开连接时取消其中的 ffmpeg 任务（终止进程）
+    """
+    # 取消范围通过上下文变量随 to_thread 传到线程中
+    with video_tool.ffmpeg.cancel_scope() as scope:
+        task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=0.5)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            scope.cancel()
+            raise HTTPException(status_code=499, detail="客户端已断开连接")
+
 @app.post("/extract-segment")
 async def extract_segment(
+    request: Request,
     video_path: str = Form(..., description="视频文件路径"),
     start_time: float = Form(..., description="开始时间（秒）", ge=0),
     end_time: float = Form(..., description="结束时间（秒）", ge=0),
-    output_filename: str = Form(..., description="输出文件名")
+    output_filename: str = Form(..., description="输出文件名"),
+    mode: Optional[str] = Form(None, description="提取模式：fast（关键帧对齐，不重新编码）或 accurate（精确重新编码）")
 ):
     """
     提取视频片段
@@ -224,9 +554,14 @@ async def extract_segment(
     - **start_time**: 开始时间（秒）
     - **end_time**: 结束时间（秒）
     - **output_filename**: 输出文件名
+    - **mode**: 提取模式，默认使用配置 CLIP_MODE；fast 模式的实际起止时间对齐到关键帧
+
+    相同视频内容和时间范围的片段会从片段缓存中直接复用；客户端断开连接时提取会被取消
     """
     if start_time >= end_time:
         raise HTTPException(status_code=400, detail="开始时间必须小于结束时间")
+    if mode not in (None, "fast", "accurate"):
+        raise HTTPException(status_code=400, detail="mode 必须为 fast 或 accurate")
 
     # 检查视频文件是否存在，如果不是绝对路径则在上传目录中查找
     if not os.path.exists(video_path):
@@ -246,10 +581,12 @@ async def extract_segment(
     # 确保输出目录存在
     output_dir = Path("extracted_segments")
     output_dir.mkdir(exist_ok=True)
-    output_path = output_dir / output_filename
+    # 只取文件名部分，避免写到 extracted_segments 目录之外
+    output_path = output_dir / Path(output_filename).name
 
     try:
-        video_tool.extract_segment(video_path, start_time, end_time, str(output_path))
+        clip = await run_until_disconnected(request, video_tool.extract_segment, video_path, start_time, end_time,
+                                            str(output_path), mode)
 
         # 验证输出文件是否成功创建
         if not os.path.exists(str(output_path)):
@@ -264,6 +601,9 @@ async def extract_segment(
                     "start_time": start_time,
                     "end_time": end_time,
                     "duration": end_time - start_time,
+                    "clip_start_time": clip["start_time"],
+                    "clip_end_time": clip["end_time"],
+                    "mode": clip["mode"],
                     "output_path": str(output_path),
                     "output_filename": output_filename
                 }
@@ -271,6 +611,8 @@ async def extract_segment(
             status_code=200
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         # 清理可能创建的输出文件
         if os.path.exists(str(output_path)):
@@ -318,6 +660,7 @@ async def generate_content(request: GenerateContentRequest):
         
         # 并行生成内容（在实际实现中应该使用asyncio.gather）
         # 这里为了简化，先串行执行
+        content_generator = get_content_generator()
         title_summary = content_generator.generate_title_and_summary(
             content_generator.transcript_storage.get_full_text(video_filename) or ""
         )
@@ -482,7 +825,7 @@ async def generate_certificate(
                 video_title = content_data.get("title", video_title)
         
         # 生成证书
-        certificate_path = certificate_generator.generate_certificate(
+        certificate_path = get_certificate_generator().generate_certificate(
             user_name=user_name,
             video_title=video_title,
             score=score,
@@ -513,7 +856,7 @@ async def get_certificate(certificate_filename: str):
     """
     获取生成的证书图片
     """
-    certificate_path = certificate_generator.output_dir / certificate_filename
+    certificate_path = get_certificate_generator().output_dir / certificate_filename
     if not certificate_path.exists():
         raise HTTPException(status_code=404, detail="证书文件不存在")
     
@@ -541,7 +884,7 @@ async def generate_master_identity(video_filename: str = Query(...)):
         if not summary:
             raise HTTPException(status_code=400, detail="摘要不存在")
         
-        identity = master_agent.generate_master_identity(summary)
+        identity = get_master_agent().generate_master_identity(summary)
         
         return JSONResponse(
             content={
@@ -612,7 +955,7 @@ async def chat_with_master(request: MasterChatRequest, stream: bool = Query(True
                 quiz_results = json.load(f)
         
         # 与大师对话
-        response = master_agent.chat_with_master(
+        response = get_master_agent().chat_with_master(
             user_message=request.user_message,
             summary=summary,
             quiz_results=quiz_results,
@@ -630,7 +973,7 @@ async def chat_with_master(request: MasterChatRequest, stream: bool = Query(True
                         # 强制刷新缓冲区，避免连接重置
                         await asyncio.sleep(0.01)
                     # 发送完成信号
-                    yield f"data: {json.dumps({'chunk': '', 'done': True, 'master_info': master_agent.get_master_info()}, ensure_ascii=False)}\n\n"
+                    yield f"data: {json.dumps({'chunk': '', 'done': True, 'master_info': get_master_agent().get_master_info()}, ensure_ascii=False)}\n\n"
                 except ConnectionResetError:
                     # 客户端断开连接，静默处理
                     print("客户端断开连接，停止流式响应")
@@ -660,7 +1003,7 @@ async def chat_with_master(request: MasterChatRequest, stream: bool = Query(True
                     "status": "success",
                     "data": {
                         "response": response,
-                        "master_info": master_agent.get_master_info()
+                        "master_info": get_master_agent().get_master_info()
                     }
                 },
                 status_code=200
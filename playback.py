@@ -0,0 +1,152 @@
+import hashlib
+import os
+import struct
+from pathlib import Path
+from typing import Optional
+
+from ffmpeg_executor import FFmpegExecutor, FFmpegError, default_executor, PRIORITY_BACKGROUND
+
+# MIME types of the containers uploads may come in (browsers need the right one to pick a demuxer)
+VIDEO_MEDIA_TYPES = {
+    '.mp4': 'video/mp4',
+    '.m4v': 'video/mp4',
+    '.mov': 'video/quicktime',
+    '.mkv': 'video/x-matroska',
+    '.webm': 'video/webm',
+    '.avi': 'video/x-msvideo',
+    '.flv': 'video/x-flv',
+    '.wmv': 'video/x-ms-wmv'
+}
+
+
+def media_type(path: str) -> str:
+    """MIME type of a video file from its extension."""
+    return VIDEO_MEDIA_TYPES.get(Path(path).suffix.lower(), 'application/octet-stream')
+
+
+def is_faststart(path: str) -> bool:
+    """
+    Check whether an MP4/MOV file has its index ('moov' box) before the media data ('mdat').
+
+    Only the top-level box headers are read. A player needs the index before it can
+    decode or seek anything, so with the index at the end a browser has to fetch the
+    tail of the file first.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        position = 0
+        while position + 8 <= size:
+            f.seek(position)
+            box_size, box_type = struct.unpack('>I4s', f.read(8))
+            if box_type == b'moov':
+                return True
+            if box_type == b'mdat':
+                return False
+            if box_size == 1:
+                # 64-bit size follows the type
+                box_size = struct.unpack('>Q', f.read(8))[0]
+            elif box_size == 0:
+                # The box runs to the end of the file
+                break
+            if box_size < 8:
+                break
+            position += box_size
+    return False
+
+
+class PlaybackStore:
+    """
+    Faststart MP4 copies of uploaded videos for browser playback.
+
+    Uploads are remuxed (streams copied, not re-encoded) into MP4 with the index at
+    the front, so playback and seeking to a search hit start after a few small range
+    requests instead of a download of the file's tail. MP4s that already are
+    faststart are served as they are.
+    """
+    def __init__(self, storage_dir: str = "playback", executor: Optional[FFmpegExecutor] = None):
+        """
+        Initialize the playback store.
+
+        Args:
+            storage_dir: Directory holding the remuxed copies
+            executor: Executor running the ffmpeg processes (the process-wide default if None)
+        """
+        self.storage_dir = Path(storage_dir)
+        self.storage_dir.mkdir(exist_ok=True)
+        self.executor = executor or default_executor()
+
+    def playback_path(self, video_path: str) -> Path:
+        """Path of the remuxed copy of a video (whether or not it exists)."""
+        key = hashlib.sha1(os.path.abspath(video_path).encode('utf-8')).hexdigest()[:16]
+        return self.storage_dir / f"{Path(video_path).stem}_{key}.mp4"
+
+    def get(self, video_path: str) -> Optional[str]:
+        """
+        Get the remuxed copy of a video if it is up to date.
+
+        Returns:
+            Path of the copy, or None if there is none or the video changed since
+        """
+        path = self.playback_path(video_path)
+        try:
+            if path.stat().st_mtime >= os.path.getmtime(video_path):
+                return str(path)
+        except FileNotFoundError:
+            pass
+        return None
+
+    def needs_remux(self, video_path: str) -> bool:
+        """Whether a video has to be remuxed to play well in a browser (anything but a faststart MP4)."""
+        if Path(video_path).suffix.lower() not in ('.mp4', '.m4v'):
+            return True
+        try:
+            return not is_faststart(video_path)
+        except (OSError, struct.error):
+            return True
+
+    def ensure(self, video_path: str) -> str:
+        """
+        Remux a video into a faststart MP4 unless it is one already or an up-to-date copy exists.
+
+        Only the first video and audio streams are kept, since other streams (subtitles,
+        data) may have no MP4 mapping. Codecs MP4 cannot carry make the remux fail.
+
+        Args:
+            video_path: Path to the video file
+
+        Returns:
+            Path of the file to serve: the copy, or the video itself if it needs no remux
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        existing = self.get(video_path)
+        if existing:
+            return existing
+        if not self.needs_remux(video_path):
+            return video_path
+
+        path = self.playback_path(video_path)
+        temp_path = str(path) + '.tmp'
+        args = ['ffmpeg', '-y', '-i', video_path, '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy',
+                '-movflags', '+faststart', '-f', 'mp4', temp_path]
+        try:
+            self.executor.run(args, priority=PRIORITY_BACKGROUND, label=f"faststart {os.path.basename(video_path)}")
+            os.replace(temp_path, path)
+        except FFmpegError as e:
+            raise Exception(f"FFmpeg error: {e}")
+        finally:
+            # Failed, timed out or cancelled
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return str(path)
+
+    def source_for(self, video_path: str) -> str:
+        """The file to serve for a video: its remuxed copy if available, else the video."""
+        return self.get(video_path) or video_path
+
+    def remove(self, video_path: str):
+        """Delete the remuxed copy of a video, if any."""
+        path = self.playback_path(video_path)
+        if path.exists():
+            path.unlink()
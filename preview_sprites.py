@@ -0,0 +1,171 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import ffmpeg
+
+from ffmpeg_executor import FFmpegExecutor, FFmpegError, default_executor, PRIORITY_BACKGROUND
+
+
+class PreviewStore:
+    """
+    Thumbnail sprite sheets and a seek index per video.
+
+    One ffmpeg pass samples a frame every `interval` seconds, scales it to a fixed
+    tile size and packs the tiles into grid images. A search hit then maps its time
+    to a sheet and a tile offset, so previews cost no decoding at query time.
+    """
+    def __init__(self, storage_dir: str = "previews", interval: float = 10.0, tile_width: int = 160,
+                 tile_height: int = 90, columns: int = 10, rows: int = 10,
+                 executor: Optional[FFmpegExecutor] = None):
+        """
+        Initialize the preview store.
+
+        Args:
+            storage_dir: Directory holding one sub-directory of sheets per video
+            interval: Seconds between sampled frames
+            tile_width: Width of a tile in pixels
+            tile_height: Height of a tile in pixels (frames are letterboxed to fit)
+            columns: Tiles per sheet row
+            rows: Tile rows per sheet
+            executor: Executor running the ffmpeg processes (the process-wide default if None)
+        """
+        self.storage_dir = Path(storage_dir)
+        self.storage_dir.mkdir(exist_ok=True)
+        self.interval = interval
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.columns = columns
+        self.rows = rows
+        self.executor = executor or default_executor()
+        self._indexes = {}
+
+    def preview_dir(self, video_path: str) -> Path:
+        """Directory of the previews of a video (whether or not it exists)."""
+        key = hashlib.sha1(os.path.abspath(video_path).encode('utf-8')).hexdigest()[:16]
+        return self.storage_dir / f"{Path(video_path).stem}_{key}"
+
+    def get(self, video_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the seek index of a video if its previews are up to date.
+
+        Returns:
+            The seek index (interval, tile size, grid, sheet names, frame count), or None
+        """
+        index_path = self.preview_dir(video_path) / "index.json"
+        try:
+            mtime = index_path.stat().st_mtime
+            if mtime < os.path.getmtime(video_path):
+                return None
+        except FileNotFoundError:
+            return None
+        cached = self._indexes.get(index_path)
+        if cached is None or cached[0] != mtime:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                cached = (mtime, json.load(f))
+            self._indexes[index_path] = cached
+        return cached[1]
+
+    def ensure(self, video_path: str, duration: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Create the previews of a video unless up-to-date ones exist.
+
+        Args:
+            video_path: Path to the video file
+            duration: Video duration in seconds, to count the frames (counted from the sheets if None)
+
+        Returns:
+            The seek index
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        existing = self.get(video_path)
+        if existing:
+            return existing
+
+        target = self.preview_dir(video_path)
+        temp_dir = target.with_name(target.name + '.tmp')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        temp_dir.mkdir()
+        try:
+            stream = (
+                ffmpeg.input(video_path).video
+                .filter('fps', fps=f"1/{self.interval}")
+                .filter('scale', self.tile_width, self.tile_height, force_original_aspect_ratio='decrease')
+                .filter('pad', self.tile_width, self.tile_height, '(ow-iw)/2', '(oh-ih)/2')
+                .filter('tile', f"{self.columns}x{self.rows}")
+            )
+            stream = ffmpeg.output(stream, str(temp_dir / "sheet_%03d.jpg"), **{'q:v': 5})
+            self.executor.run(ffmpeg.compile(stream, overwrite_output=True), priority=PRIORITY_BACKGROUND,
+                              duration=duration, label=f"previews {os.path.basename(video_path)}")
+        except BaseException as e:
+            # Failed, timed out or cancelled
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if isinstance(e, FFmpegError):
+                raise Exception(f"FFmpeg error: {e}")
+            raise
+
+        sheets = sorted(path.name for path in temp_dir.glob("sheet_*.jpg"))
+        per_sheet = self.columns * self.rows
+        count = len(sheets) * per_sheet
+        if duration:
+            count = min(count, max(math.ceil(duration / self.interval), 1))
+        index = {
+            'interval': self.interval,
+            'tile_width': self.tile_width,
+            'tile_height': self.tile_height,
+            'columns': self.columns,
+            'rows': self.rows,
+            'sheets': sheets,
+            'count': count
+        }
+        # The index is written last: its presence marks complete previews
+        with open(temp_dir / "index.json", 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(temp_dir, target)
+        return index
+
+    def tile(self, video_path: str, time: float) -> Optional[Dict[str, Any]]:
+        """
+        Locate the preview tile of a moment in a video.
+
+        Args:
+            video_path: Path to the video file
+            time: Position in seconds
+
+        Returns:
+            'sheet' file name, tile 'x', 'y', 'width', 'height' in pixels and the 'time'
+            the tile shows, or None if the video has no previews
+        """
+        index = self.get(video_path)
+        if not index or not index['sheets']:
+            return None
+        per_sheet = index['columns'] * index['rows']
+        frame = min(max(int(time // index['interval']), 0), index['count'] - 1)
+        sheet, position = divmod(frame, per_sheet)
+        sheet = min(sheet, len(index['sheets']) - 1)
+        return {
+            'sheet': index['sheets'][sheet],
+            'x': (position % index['columns']) * index['tile_width'],
+            'y': (position // index['columns']) * index['tile_height'],
+            'width': index['tile_width'],
+            'height': index['tile_height'],
+            'time': frame * index['interval']
+        }
+
+    def sheet_path(self, video_path: str, sheet: str) -> Optional[Path]:
+        """Path of a sheet of a video's previews, or None if there is no such sheet."""
+        index = self.get(video_path)
+        if not index or sheet not in index['sheets']:
+            return None
+        return self.preview_dir(video_path) / sheet
+
+    def remove(self, video_path: str):
+        """Delete the previews of a video, if any."""
+        shutil.rmtree(self.preview_dir(video_path), ignore_errors=True)
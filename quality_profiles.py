@@ -0,0 +1,134 @@
+import threading
+from typing import Dict, Any, Optional
+
+# Speed/quality trade-offs for Whisper, highest quality first. 'model' empty means the
+# configured WHISPER_MODEL; 'rtf' is the expected processing time per second of audio on
+# one job slot, a starting point that QualityController replaces with measured values.
+# 'balanced' is whisper.transcribe's own default decoding.
+DEFAULT_PROFILES = {
+    'accurate': {
+        'model': '',
+        'beam_size': 5,
+        'best_of': 5,
+        'temperature': [0.0, 0.2, 0.4, 0.6, 0.8, 1.0],
+        'condition_on_previous_text': True,
+        'rtf': 0.5
+    },
+    'balanced': {
+        'model': '',
+        'beam_size': None,
+        'best_of': None,
+        'temperature': [0.0, 0.2, 0.4, 0.6, 0.8, 1.0],
+        'condition_on_previous_text': True,
+        'rtf': 0.25
+    },
+    'fast': {
+        'model': 'tiny',
+        'beam_size': None,
+        'best_of': None,
+        'temperature': [0.0],
+        'condition_on_previous_text': False,
+        'rtf': 0.05
+    }
+}
+
+DECODE_KEYS = ('beam_size', 'best_of', 'temperature', 'condition_on_previous_text')
+
+
+def load_profiles(overrides: Optional[Dict[str, Dict[str, Any]]] = None, default_model: str = "base") -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve the quality profiles.
+
+    Args:
+        overrides: Per-profile settings merged over DEFAULT_PROFILES; unknown names add
+            profiles, which rank below the built-in ones in the given order
+        default_model: Model used by profiles without their own
+
+    Returns:
+        Profiles by name, highest quality first
+    """
+    profiles = {}
+    for name, settings in {**DEFAULT_PROFILES, **(overrides or {})}.items():
+        profile = {**DEFAULT_PROFILES.get(name, DEFAULT_PROFILES['balanced']), **settings}
+        profile['model'] = profile['model'] or default_model
+        profiles[name] = profile
+    return profiles
+
+
+def decode_options(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Whisper transcribe() options of a profile."""
+    options = {key: profile[key] for key in DECODE_KEYS if profile.get(key) is not None}
+    if 'temperature' in options:
+        options['temperature'] = tuple(options['temperature'])
+    return options
+
+
+class QualityController:
+    """
+    Pick a quality profile per job so the ingestion backlog drains within a target latency.
+
+    The expected time until the last queued job is transcribed is the queued audio
+    (queue depth times the mean job duration, plus the job being started) times a
+    profile's real-time factor, spread over the job slots. The highest-quality profile
+    that keeps this under the target is chosen; when none does, the fastest one is.
+    Real-time factors are measured from finished jobs, so the choice follows the
+    actual speed of the hardware.
+    """
+    def __init__(self, profiles: Dict[str, Dict[str, Any]], target_latency: float, slots: int = 1,
+                 smoothing: float = 0.3):
+        """
+        Initialize the controller.
+
+        Args:
+            profiles: Profiles by name, highest quality first (see load_profiles)
+            target_latency: Seconds within which queued jobs should be transcribed
+            slots: Jobs transcribed at once across all workers
+            smoothing: Weight of a new measurement in the moving averages
+        """
+        self.profiles = profiles
+        self.target_latency = target_latency
+        self.slots = max(slots, 1)
+        self.smoothing = smoothing
+        self._rtf = {name: float(profile['rtf']) for name, profile in profiles.items()}
+        self._mean_duration = None
+        self._lock = threading.Lock()
+
+    def estimate(self, profile: str, queue_depth: int, duration: float) -> float:
+        """Expected seconds until the queue is drained if jobs use this profile."""
+        mean_duration = self._mean_duration or duration
+        return (queue_depth * mean_duration + duration) * self._rtf[profile] / self.slots
+
+    def choose(self, queue_depth: int, duration: Optional[float]) -> str:
+        """
+        Pick the profile for a job that is about to start.
+
+        Args:
+            queue_depth: Jobs still waiting behind this one
+            duration: Audio duration of this job in seconds (None if unknown)
+
+        Returns:
+            Profile name
+        """
+        names = list(self.profiles)
+        with self._lock:
+            duration = duration or self._mean_duration or 0.0
+            for name in names:
+                if self.estimate(name, queue_depth, duration) <= self.target_latency:
+                    return name
+            return min(names, key=lambda name: self._rtf[name])
+
+    def record(self, profile: str, audio_seconds: float, elapsed: float):
+        """Update the real-time factor of a profile and the mean job duration from a finished job."""
+        if audio_seconds <= 0 or profile not in self._rtf:
+            return
+        with self._lock:
+            self._rtf[profile] += self.smoothing * (elapsed / audio_seconds - self._rtf[profile])
+            if self._mean_duration is None:
+                self._mean_duration = audio_seconds
+            else:
+                self._mean_duration += self.smoothing * (audio_seconds - self._mean_duration)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Current real-time factors and mean job duration."""
+        return {'rtf': dict(self._rtf), 'mean_duration': self._mean_duration}
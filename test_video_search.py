@@ -1,5 +1,6 @@
 import asyncio
 import os
+import numpy as np
 from video_search_tool import VideoSearchTool
 from video_processor import VideoProcessor
 from transcriber import Transcriber
@@ -120,7 +121,8 @@ async def test_pipeline_components():
             chunk_duration_actual = chunk['end'] - chunk['start']
             print(f"  块{i+1}: {chunk['start']:.2f}s - {chunk['end']:.2f}s ({chunk_duration_actual:.2f}s)")
             print(f"    文本长度: {len(chunk['text'])} 字符")
-            print(f"    包含段落数: {len(chunk['segments'])}")
+            print(f"    包含段落数: {len(chunk['segment_starts'])}")
+            print(f"    估算token数: {chunk['token_estimate']}")
             print(f"    文本预览: {chunk['text'][:150]}...")
             print()
 
@@ -165,6 +167,196 @@ async def test_pipeline_components():
     print("=== 管道组件测试完成 ===")
 
 
+def test_profiles_share_batched_engine():
+    """With batching on, every quality profile's transcriber (the default one included) decodes through the engine."""
+    from configuration import video_config
+
+    tool = VideoSearchTool(role='worker')
+    tool.transcriber.enable_batching(video_config.whisper_batch_size, video_config.whisper_batch_wait)
+    assert tool.transcriber_for_profile(video_config.quality_profile).engine is tool.transcriber.engine
+    for name in tool.quality_profiles:
+        assert tool.transcriber_for_profile(name).engine is not None, name
+
+
+def test_seed_embedding_cache_skips_failed_embeddings():
+    """Zero vectors stored for failed embeddings are not seeded into the cache, so reindex re-embeds them."""
+    import tempfile
+    import numpy as np
+    from embedding_cache import EmbeddingCache
+    from indexer import VideoIndexer
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = EmbeddingCache(os.path.join(temp_dir, "embedding_cache.db"), dimension=4)
+        indexer = VideoIndexer(4, os.path.join(temp_dir, "index.faiss"), dedupe_threshold=1.1, embedding_cache=cache)
+        vectors = np.array([[1, 0, 0, 0], [0, 0, 0, 0]], dtype=np.float32)
+
+        async def embed_chunks(chunks):
+            return vectors
+
+        indexer._embed_chunks = embed_chunks
+        chunks = [{'start': 0.0, 'end': 30.0, 'text': "embedded"}, {'start': 30.0, 'end': 60.0, 'text': "failed"}]
+        asyncio.run(indexer.add_chunks(chunks, "video.mp4"))
+
+        assert indexer.seed_embedding_cache() == 1
+        assert list(cache.get_many(["embedded", "failed"])) == ["embedded"]
+        cache.close()
+
+
+SAMPLE_RATE = 16000
+
+
+def _speech_fixture(seconds, seed=0):
+    """Syllables of formant-filtered glottal pulses at a speaking rate of about five per second, with pauses."""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * SAMPLE_RATE))
+    vowels = [(730, 1090, 2440), (270, 2290, 3010), (300, 870, 2240), (530, 1840, 2480), (570, 840, 2410)]
+    time = 0.0
+    while time < seconds - 0.5:
+        length = int(rng.uniform(0.12, 0.28) * SAMPLE_RATE)
+        pitch = 140 * rng.uniform(0.85, 1.15) * np.linspace(1.1, 0.9, length)
+        pulses = np.diff(np.floor(np.cumsum(pitch / SAMPLE_RATE)), prepend=0)
+        frequencies = np.fft.rfftfreq(length, 1 / SAMPLE_RATE)
+        gain = np.ones_like(frequencies)
+        for formant in vowels[rng.integers(len(vowels))]:
+            gain *= formant ** 2 / np.sqrt((formant ** 2 - frequencies ** 2) ** 2 + (100 * frequencies) ** 2)
+        voiced = np.fft.irfft(np.fft.rfft(pulses) * gain, length)
+        start = int(time * SAMPLE_RATE)
+        audio[start:start + length] += voiced / np.abs(voiced).max() * np.sin(np.linspace(0, np.pi, length)) ** 0.6
+        time += length / SAMPLE_RATE + rng.uniform(0.0, 0.06) + (rng.uniform(0.3, 0.6) if rng.random() < 0.15 else 0)
+    return (audio / np.abs(audio).max() * 0.5).astype(np.float32)
+
+
+def _music_fixture(seconds):
+    """Sustained major chords with harmonic partials, changing every two seconds."""
+    time = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = np.zeros_like(time)
+    for index, root in enumerate(np.resize([57, 62, 64, 57], int(np.ceil(seconds / 2)))):
+        mask = (time >= 2 * index) & (time < 2 * index + 2)
+        local = time[mask] - 2 * index
+        for note in (root, root + 4, root + 7):
+            frequency = 440 * 2 ** ((note - 69) / 12)
+            audio[mask] += sum(np.sin(2 * np.pi * k * frequency * local) / k for k in range(1, 6)) * np.exp(-0.8 * local)
+    return (audio / np.abs(audio).max() * 0.5).astype(np.float32)
+
+
+def test_resumed_stream_does_not_reindex_chunks():
+    """A streaming index interrupted after a checkpoint resumes without indexing its chunks twice, even without dedupe."""
+    import subprocess
+    import tempfile
+    from configuration import video_config
+    from indexer import VideoIndexer
+    from transcript_storage import TranscriptStorage
+
+    class StepModel:
+        def transcribe(self, audio, **options):
+            bounds = np.append(np.arange(0, audio.size / SAMPLE_RATE, 5.0), audio.size / SAMPLE_RATE)
+            return {'language': 'en', 'segments': [{'start': start, 'end': end, 'text': f" words for {len(audio)} {start}"}
+                                                   for start, end in zip(bounds[:-1], bounds[1:])]}
+
+    saved = (video_config.transcribe_checkpoints, video_config.vad_enabled, video_config.stream_window)
+    video_config.transcribe_checkpoints, video_config.vad_enabled, video_config.stream_window = True, False, 60.0
+    try:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            audio_path = os.path.join(temp_dir, "tone.wav")
+            subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", "sine=frequency=440:duration=150",
+                            audio_path], check=True)
+            tool = VideoSearchTool(role='worker')
+            transcriber = Transcriber()
+            transcriber._model = StepModel()
+            tool.transcriber_for_profile = lambda name: transcriber
+            tool.transcript_storage = TranscriptStorage(os.path.join(temp_dir, "transcripts"))
+            tool.audio_proxies = None
+            tool.fingerprints = None
+            tool.indexer = VideoIndexer(4, os.path.join(temp_dir, "index.faiss"), dedupe_threshold=1.1)
+            add_chunks = tool.indexer.add_chunks
+
+            async def embed_chunks(chunks):
+                return np.random.default_rng(len(tool.indexer.metadata)).random((len(chunks), 4)).astype(np.float32)
+
+            async def crash_after_four(chunks, video_path):
+                if len(tool.indexer.metadata) == 4:
+                    raise RuntimeError("worker stopped")
+                await add_chunks(chunks, video_path)
+
+            tool.indexer._embed_chunks = embed_chunks
+            tool.indexer.add_chunks = crash_after_four
+            try:
+                asyncio.run(tool._index_video_streaming(audio_path, 20.0, None))
+                assert False, "the first pass should have been interrupted"
+            except RuntimeError:
+                pass
+            tool.indexer.add_chunks = add_chunks
+            asyncio.run(tool._index_video_streaming(audio_path, 20.0, None))
+
+            ranges = [(occurrence['start_time'], occurrence['end_time'])
+                      for entry in tool.indexer.metadata for occurrence in entry['occurrences']]
+            assert len(ranges) == len(set(ranges)) and len(ranges) > 4
+            assert max(end for _, end in ranges) > 149
+    finally:
+        video_config.transcribe_checkpoints, video_config.vad_enabled, video_config.stream_window = saved
+
+
+def test_ffmpeg_slots_shared_between_processes():
+    """A slot locked by another process is unavailable until that process exits."""
+    import subprocess
+    import sys
+    import tempfile
+    from ffmpeg_executor import SharedSlots
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, "ffmpeg_slots.lock")
+        holder = subprocess.Popen(
+            [sys.executable, "-c", "import sys; from ffmpeg_executor import SharedSlots; "
+                                   f"slots = SharedSlots({path!r}, 2); print(slots.try_acquire(2), flush=True); sys.stdin.read()"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        assert holder.stdout.readline().strip() == "0"
+
+        slots = SharedSlots(path, 2)
+        assert slots.try_acquire(2) == 1
+        assert slots.try_acquire(2) is None
+        holder.stdin.close()
+        holder.wait()
+        assert slots.try_acquire(2) == 0
+
+
+def test_detect_speech_fixtures():
+    """The VAD keeps synthetic speech and drops synthetic music, silence and low noise."""
+    from audio_analysis import detect_speech
+
+    def speech_fraction(samples):
+        return sum(end - start for start, end in detect_speech(samples)) / len(samples)
+
+    for seed in range(2):
+        assert speech_fraction(_speech_fixture(20, seed)) > 0.8
+    assert speech_fraction(_music_fixture(20)) < 0.1
+    assert speech_fraction(np.zeros(20 * SAMPLE_RATE, dtype=np.float32)) == 0
+    noise = np.random.default_rng(0).standard_normal(20 * SAMPLE_RATE) * 1e-3
+    assert speech_fraction(noise.astype(np.float32)) == 0
+
+
+def test_stream_vad_skips_music_inside_window():
+    """Music in the middle of a window is not decoded, and later segments keep their original timestamps."""
+    decoded = []
+
+    class SplitModel:
+        def transcribe(self, audio, **options):
+            decoded.append(audio.size / SAMPLE_RATE)
+            bounds = np.append(np.arange(0, audio.size / SAMPLE_RATE, 2.0), audio.size / SAMPLE_RATE)
+            return {'language': 'en', 'segments': [{'start': start, 'end': end, 'text': " words"}
+                                                   for start, end in zip(bounds[:-1], bounds[1:])]}
+
+    transcriber = Transcriber()
+    transcriber._model = SplitModel()
+    window = np.concatenate([_speech_fixture(8), _music_fixture(10), _speech_fixture(8, 1)])
+    state = {}
+    segments = list(transcriber.transcribe_stream([(100.0, window)], state=state, vad=True))
+
+    assert len(decoded) == 1 and decoded[0] < 17
+    assert state['skipped_seconds'] > 9
+    assert segments[0]['start'] < 101 and segments[-1]['end'] > 124
+    assert not any(109 < segment['start'] < 117 for segment in segments)
+
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == "pipeline":
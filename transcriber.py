@@ -1,20 +1,173 @@
-import whisper
-from typing import List, Dict, Any, Optional
+import numpy as np
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Union, Callable
 import os
+import tempfile
+import threading
+from pathlib import Path
+from video_processor import SAMPLE_RATE
+from transcription_service import TranscriptionService, open_pcm
+from audio_analysis import (find_split_points, detect_speech, compact_regions, map_to_original, drop_timeline_head,
+                            speech_stats)
+import chunking
 
 
 class Transcriber:
     """
     A class for transcribing audio files using Whisper.
     """
-    def __init__(self, model_name: str = "base"):
+    def __init__(self, model_name: str = "base", quantize: bool = False, num_threads: Optional[int] = None,
+                 cache_dir: str = "model_cache", decode_options: Optional[Dict[str, Any]] = None):
         """
-        Initialize the transcriber with a Whisper model.
+        Initialize the transcriber. The Whisper model is loaded on first use,
+        so processes that never transcribe do not pay for torch and the weights.
 
         Args:
             model_name: Whisper model name (tiny, base, small, medium, large)
+            quantize: Run CPU inference with int8 dynamically quantized linear layers
+            num_threads: Torch intra-op thread count (torch default if None)
+            cache_dir: Directory for converted model weights
+            decode_options: Extra whisper transcribe() options, e.g. from a quality profile
         """
-        self.model = whisper.load_model(model_name)
+        self.model_name = model_name
+        self.quantize = quantize
+        self.num_threads = num_threads
+        self.cache_dir = cache_dir
+        self.decode_options = dict(decode_options or {})
+        self._base = None
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._service = None
+        self.engine = None
+
+    @property
+    def model(self):
+        """The Whisper model, loaded on first access."""
+        if self._base is not None:
+            return self._base.model
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    import torch
+                    if self.num_threads:
+                        torch.set_num_threads(self.num_threads)
+                    print(f"Loading Whisper model: {self.model_name}{' (int8)' if self.quantize else ''}")
+                    if self.quantize:
+                        self._model = self._load_quantized_model()
+                    else:
+                        self._model = self._load_cached_model()
+                        if torch.cuda.is_available():
+                            self._model = self._model.to('cuda')
+        return self._model
+
+    def _weight_cache_path(self) -> str:
+        """Memory-mappable float32 model; keyed by versions because it is a pickled module."""
+        import torch
+        import whisper
+        version = getattr(whisper, '__version__', 'unknown')
+        return os.path.join(self.cache_dir, f"whisper-{Path(self.model_name).stem}-f32-w{version}-t{torch.__version__}.pt")
+
+    def _load_cached_model(self):
+        """
+        Load the CPU model from the local weight cache, converting the checkpoint on first use.
+
+        The cache holds the whole module, so loading only unpickles the module tree and
+        memory-maps the tensors: nothing is read, copied or initialised up front, and the
+        worker processes on one host share the file's pages through the page cache.
+
+        Returns:
+            Whisper model on CPU
+        """
+        import torch
+        import whisper
+
+        cache_path = self._weight_cache_path()
+        if os.path.exists(cache_path):
+            try:
+                model = torch.load(cache_path, map_location='cpu', mmap=True, weights_only=False)
+                model.eval()
+                return model
+            except Exception as e:
+                print(f"Ignoring unreadable weight cache {cache_path}: {e}")
+
+        model = whisper.load_model(self.model_name, device='cpu')
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = cache_path + '.tmp'
+            torch.save(model, temp_path)
+            os.replace(temp_path, cache_path)
+            print(f"Model weights cached to: {cache_path}")
+        except Exception as e:
+            print(f"Could not cache model weights: {e}")
+        return model
+
+    def _quantized_cache_path(self) -> str:
+        """Cache file of the quantized model; keyed by versions because it is a pickled module."""
+        import torch
+        import whisper
+        version = getattr(whisper, '__version__', 'unknown')
+        return os.path.join(self.cache_dir, f"whisper-{Path(self.model_name).stem}-int8-w{version}-t{torch.__version__}.pt")
+
+    def _load_quantized_model(self):
+        """
+        Load the int8 dynamically quantized model, quantizing and caching it on first use.
+
+        Returns:
+            Whisper model whose linear layers run int8 matmuls on CPU
+        """
+        import torch
+
+        cache_path = self._quantized_cache_path()
+        if os.path.exists(cache_path):
+            try:
+                model = torch.load(cache_path, map_location='cpu', mmap=True, weights_only=False)
+                model.eval()
+                return model
+            except Exception as e:
+                print(f"Ignoring unreadable quantized model cache {cache_path}: {e}")
+
+        model = self._load_cached_model()
+        _use_plain_linear_layers(model)
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        model.eval()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = cache_path + '.tmp'
+        torch.save(model, temp_path)
+        os.replace(temp_path, cache_path)
+        print(f"Quantized model cached to: {cache_path}")
+        return model
+
+    def enable_batching(self, batch_size: int = 8, max_wait: float = 0.05):
+        """
+        Decode streaming windows through a shared BatchedTranscriptionEngine, so that
+        concurrent transcriptions in this process share forward passes.
+
+        Args:
+            batch_size: Most windows decoded together
+            max_wait: Seconds to wait for more windows once one is queued
+        """
+        from batched_transcription import BatchedTranscriptionEngine
+        self.engine = BatchedTranscriptionEngine(self, batch_size, max_wait)
+
+    def with_options(self, decode_options: Dict[str, Any]) -> 'Transcriber':
+        """
+        A transcriber that shares this one's model (loaded once) but decodes with other options.
+
+        The batched engine is shared too; it decodes with the options' temperatures,
+        beam size and best-of, but does not condition windows on the previous text,
+        whatever condition_on_previous_text says (see BatchedTranscriptionEngine.transcribe).
+        """
+        clone = Transcriber(self.model_name, self.quantize, self.num_threads, self.cache_dir, decode_options)
+        clone._base = self
+        clone.engine = self.engine
+        return clone
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the Whisper model has been loaded."""
+        if self._base is not None:
+            return self._base.is_loaded
+        return self._model is not None
 
     def transcribe(self, audio_path: str, language: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -30,13 +183,285 @@ class Transcriber:
         if not os.path.exists(audio_path):
             raise FileNotFoundError(f"Audio file not found: {audio_path}")
 
-        options = {}
+        options = dict(self.decode_options)
         if language:
             options['language'] = language
+        if self.quantize:
+            options['fp16'] = False
 
         result = self.model.transcribe(audio_path, **options)
         return result
 
+    def transcribe_parallel(self, audio: Union[str, np.ndarray], language: Optional[str] = None,
+                            workers: Optional[int] = None, min_piece_seconds: float = 60.0) -> Dict[str, Any]:
+        """
+        Transcribe long audio on several cores.
+
+        The audio is cut at pauses into roughly equal pieces that are transcribed by a
+        TranscriptionService, each worker loading the model once and keeping it across
+        calls. Workers read their piece from a shared memory-mapped PCM file, so the
+        audio is never copied between processes. Segment timestamps are re-based onto
+        the original timeline.
+
+        Args:
+            audio: Path to a raw float32 PCM file (see VideoProcessor.extract_pcm), a
+                memory-mapped PCM file, or float32 16 kHz samples
+            language: Language code (optional, detected once on the first 30 s if None)
+            workers: Number of worker processes (CPU count if None)
+            min_piece_seconds: Audio shorter than two pieces of this length is transcribed directly
+
+        Returns:
+            Transcription result with text, segments and language
+        """
+        temp_path = None
+        if isinstance(audio, str):
+            if not os.path.exists(audio):
+                raise FileNotFoundError(f"Audio file not found: {audio}")
+            pcm_path = audio
+            audio = open_pcm(pcm_path)
+        elif isinstance(audio, np.memmap) and audio.filename and audio.offset == 0 and audio.size * 4 == os.path.getsize(audio.filename):
+            pcm_path = audio.filename
+        else:
+            pcm_path = None
+
+        workers = workers or os.cpu_count() or 1
+        pieces = min(workers, int(audio.size / SAMPLE_RATE // min_piece_seconds))
+        if pieces <= 1:
+            return self.transcribe_samples(audio, language)
+
+        if pcm_path is None:
+            # Samples only this process can see: spill them to a file the workers can map
+            fd, temp_path = tempfile.mkstemp(suffix='.f32')
+            with os.fdopen(fd, 'wb') as f:
+                np.ascontiguousarray(audio, dtype=np.float32).tofile(f)
+            pcm_path = temp_path
+
+        try:
+            service = self._get_service(workers)
+            if language is None:
+                language = service.detect_language(pcm_path)
+
+            points = find_split_points(audio, pieces)
+            futures = [
+                service.submit(pcm_path, int(start), int(end), language)
+                for start, end in zip(points[:-1], points[1:])
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            if temp_path:
+                os.remove(temp_path)
+
+        segments = []
+        for start, result in zip(points[:-1], results):
+            offset = start / SAMPLE_RATE
+            for segment in result.get('segments', []):
+                segment = dict(segment)
+                segment['id'] = len(segments)
+                segment['start'] += offset
+                segment['end'] += offset
+                segments.append(segment)
+
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': language
+        }
+
+    def transcribe_with_vad(self, samples: np.ndarray, language: Optional[str] = None,
+                            workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Transcribe only the speech regions found by a voice activity pre-pass.
+
+        Silence and music are cut out before Whisper sees the audio; segment
+        timestamps are mapped back onto the original timeline.
+
+        Args:
+            samples: Mono float32 16 kHz samples
+            language: Language code (optional, auto-detect if None)
+            workers: Transcribe the speech in parallel with this many processes if > 1
+
+        Returns:
+            Transcription result with text, segments, language and 'vad' statistics
+        """
+        regions = detect_speech(samples)
+        speech, timeline = compact_regions(samples, regions)
+
+        if speech.size == 0:
+            result = {'text': '', 'segments': [], 'language': language}
+        elif workers and workers > 1:
+            result = self.transcribe_parallel(speech, language, workers)
+        else:
+            result = self.transcribe_samples(speech, language)
+
+        for segment in result.get('segments', []):
+            segment['start'] = map_to_original(segment['start'], timeline)
+            segment['end'] = map_to_original(segment['end'], timeline)
+        result['vad'] = speech_stats(samples.size, regions)
+        return result
+
+    def transcribe_samples(self, samples: np.ndarray, language: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Transcribe float32 16 kHz samples that are already in memory.
+
+        Args:
+            samples: Mono float32 samples
+            language: Language code (optional, auto-detect if None)
+
+        Returns:
+            Transcription result with text and segments
+        """
+        options = dict(self.decode_options)
+        if language:
+            options['language'] = language
+        if self.quantize:
+            options['fp16'] = False
+        return self.model.transcribe(samples, **options)
+
+    def _get_service(self, workers: int) -> TranscriptionService:
+        """Start (or reuse) the transcription service; workers split the cores between them."""
+        if self._service is None or self._service.workers != workers:
+            self.close()
+            self._service = TranscriptionService(self.model_name, self.quantize, self.num_threads,
+                                                 self.cache_dir, workers, self.decode_options)
+        return self._service
+
+    def close(self):
+        """Shut down the transcription service, if any."""
+        if self._service is not None:
+            self._service.close()
+            self._service = None
+
+    def transcribe_stream(self, windows: Iterable[Tuple[float, np.ndarray]], language: Optional[str] = None,
+                          state: Optional[Dict[str, Any]] = None, vad: bool = False,
+                          on_window: Optional[Callable[[Dict[str, Any], np.ndarray, float, float], None]] = None,
+                          carry: Optional[Tuple[float, np.ndarray]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Transcribe audio window by window, yielding segments as soon as they are final.
+
+        The audio of the last (possibly cut-off) segment of a window is carried into
+        the next window together with the preceding text as prompt, so segments that
+        straddle a window boundary are decoded once, whole. Only the current window
+        and that carried-over tail are kept in memory. With vad, only the speech of
+        each window is added to the buffer; non-speech at its start, in the middle
+        and at its end is skipped, and timestamps are mapped back past the gaps.
+
+        Args:
+            windows: (start seconds, float32 16 kHz samples) pairs, e.g. VideoProcessor.stream_audio
+            language: Language code (optional, detected on the first window if None)
+            state: Optional dict that receives the decoding context ('language', 'prompt')
+                and the amount of audio seen and skipped; pass a saved state to resume
+                (its 'carry_timeline' places a carry that spans skipped audio)
+            vad: Pass only the speech found by detect_speech to Whisper
+            on_window: Called as on_window(state, carried audio, its start, next window start)
+                after the segments of each window have been consumed, e.g. to checkpoint
+            carry: (start seconds, samples) carried over from the window before the first
+                one, when resuming from a checkpoint
+
+        Yields:
+            Segments with timestamps on the original timeline
+        """
+        state = state if state is not None else {}
+        state.setdefault('language', language)
+        state.setdefault('prompt', None)
+        state.setdefault('segment_count', 0)
+        state.setdefault('total_seconds', 0.0)
+        state.setdefault('skipped_seconds', 0.0)
+
+        buffer_start, buffer = carry if carry is not None else (0.0, np.zeros(0, dtype=np.float32))
+        # (buffer seconds, original seconds) at the start of every contiguous piece of the buffer
+        timeline = np.array(state.get('carry_timeline') or [[0.0, buffer_start]])
+        windows = iter(windows)
+        pending = next(windows, None)
+        while pending is not None:
+            window_start, samples = pending
+            window_length = len(samples)
+            window_end = window_start + window_length / SAMPLE_RATE
+            pending = next(windows, None)
+            final = pending is None
+            state['total_seconds'] += window_length / SAMPLE_RATE
+
+            if vad:
+                regions = detect_speech(samples)
+                samples, pieces = compact_regions(samples, regions)
+                pieces[:, 1] += window_start
+                state['skipped_seconds'] += (window_length - samples.size) / SAMPLE_RATE
+                if not regions:
+                    # Nothing to decode here; finish what was carried over from earlier windows
+                    if buffer.size:
+                        yield from self._decode_buffer(buffer, timeline, True, state)
+                        buffer = np.zeros(0, dtype=np.float32)
+                    state['carry_timeline'] = None
+                    if on_window:
+                        on_window(state, buffer, buffer_start, window_end)
+                    continue
+            else:
+                pieces = np.array([[0.0, window_start]])
+
+            pieces[:, 0] += buffer.size / SAMPLE_RATE
+            timeline = np.concatenate([timeline, pieces]) if buffer.size else pieces
+            buffer = np.concatenate([buffer, samples])
+
+            carry_from = yield from self._decode_buffer(buffer, timeline, final, state, window_length)
+            if carry_from is None:
+                buffer = np.zeros(0, dtype=np.float32)
+            else:
+                cut = int(carry_from * SAMPLE_RATE)
+                buffer = buffer[cut:]
+                timeline = drop_timeline_head(timeline, cut / SAMPLE_RATE)
+            buffer_start = float(timeline[0, 1])
+            state['carry_timeline'] = timeline.tolist() if buffer.size and len(timeline) > 1 else None
+            if on_window:
+                on_window(state, buffer, buffer_start, window_end)
+
+    def _decode_buffer(self, buffer: np.ndarray, timeline: np.ndarray, final: bool, state: Dict[str, Any],
+                       window_samples: int = 0) -> Iterator[Dict[str, Any]]:
+        """
+        Decode the stream buffer and yield the segments that are final.
+
+        The timeline maps buffer seconds onto the original timeline (see compact_regions).
+
+        Returns (as the generator's return value) the buffer offset in seconds from
+        which audio must be carried into the next window, or None to drop it all.
+        """
+        if self.engine:
+            result = self.engine.transcribe(buffer, state['language'], self.decode_options)
+        else:
+            options = dict(self.decode_options)
+            # Windows are conditioned on the preceding text through the prompt
+            if options.get('condition_on_previous_text', True):
+                options['initial_prompt'] = state['prompt']
+            if self.quantize:
+                options['fp16'] = False
+            if state['language']:
+                options['language'] = state['language']
+            result = self.model.transcribe(buffer, **options)
+        state['language'] = state['language'] or result.get('language')
+        segments = result.get('segments', [])
+
+        if final:
+            committed, carry_from = segments, None
+        elif len(segments) > 1:
+            committed, carry_from = segments[:-1], segments[-1]['start']
+        elif segments and buffer.size < 2 * window_samples:
+            # A single segment may continue in the next window
+            committed, carry_from = [], 0.0
+        else:
+            committed, carry_from = segments, None
+
+        for segment in committed:
+            segment = dict(segment)
+            segment['id'] = state['segment_count']
+            segment['start'] = map_to_original(segment['start'], timeline)
+            segment['end'] = map_to_original(segment['end'], timeline)
+            state['segment_count'] += 1
+            yield segment
+
+        if committed:
+            # Whisper keeps roughly the last 224 prompt tokens; the tail of the text is enough
+            state['prompt'] = ''.join(segment['text'] for segment in committed)[-200:]
+
+        return carry_from
+
     def get_segments(self, transcription_result: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         Extract segments from transcription result.
@@ -49,35 +474,57 @@ class Transcriber:
         """
         return transcription_result.get('segments', [])
 
-    def split_into_chunks(self, transcription_result: Dict[str, Any], chunk_duration: float = 30.0) -> List[Dict[str, Any]]:
+    def split_into_chunks(self, transcription_result: Dict[str, Any], chunk_duration: float = 30.0,
+                          max_tokens: int = 512, min_duration: float = 0.0, overlap: float = 0.0) -> List[Dict[str, Any]]:
         """
-        Split transcription into chunks of specified duration.
+        Split transcription into chunks (see iter_chunks).
 
         Args:
             transcription_result: Transcription result
-            chunk_duration: Duration of each chunk in seconds
+            chunk_duration: Maximum duration of each chunk in seconds
+            max_tokens: Token limit of the embedding model
+            min_duration: Shortest duration of the last chunk in seconds
+            overlap: Seconds of speech repeated at the start of the next chunk
 
         Returns:
-            List of chunks with start, end, text, and metadata
-        """
-        segments = self.get_segments(transcription_result)
-        chunks = []
-        current_chunk = {'start': 0.0, 'end': 0.0, 'text': '', 'segments': []}
-
-        for segment in segments:
-            if current_chunk['end'] - current_chunk['start'] >= chunk_duration:
-                # Save current chunk
-                chunks.append(current_chunk.copy())
-                # Start new chunk
-                current_chunk = {'start': segment['start'], 'end': segment['end'], 'text': segment['text'], 'segments': [segment]}
-            else:
-                # Add to current chunk
-                current_chunk['end'] = segment['end']
-                current_chunk['text'] += ' ' + segment['text']
-                current_chunk['segments'].append(segment)
+            List of chunks with start, end, text, and segment offsets
+        """
+        return list(self.iter_chunks(self.get_segments(transcription_result), chunk_duration,
+                                     max_tokens, min_duration, overlap))
+
+    def iter_chunks(self, segments: Iterable[Dict[str, Any]], chunk_duration: float = 30.0, max_tokens: int = 512,
+                    min_duration: float = 0.0, overlap: float = 0.0) -> Iterator[Dict[str, Any]]:
+        """
+        Group segments into chunks within the embedding model's token limit, yielding
+        each chunk as soon as it is closed.
+
+        Args:
+            segments: Segments in time order (a list or a stream from transcribe_stream)
+            chunk_duration: Maximum duration of each chunk in seconds
+            max_tokens: Token limit of the embedding model
+            min_duration: Shortest duration of the last chunk in seconds
+            overlap: Seconds of speech repeated at the start of the next chunk
 
-        # Add the last chunk
-        if current_chunk['text']:
-            chunks.append(current_chunk)
+        Yields:
+            Chunks with start, end, text, and segment offsets (see chunking.build_chunk)
+        """
+        return chunking.iter_chunks(segments, chunk_duration, max_tokens, min_duration, overlap)
+
+
+def _use_plain_linear_layers(module):
+    """
+    Replace Whisper's Linear subclass with torch.nn.Linear sharing the same parameters.
+
+    Dynamic quantization only swaps modules whose type is exactly torch.nn.Linear;
+    Whisper's subclass only adds a dtype cast that is a no-op for float32 on CPU.
+    """
+    import torch
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None, device='meta')
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            _use_plain_linear_layers(child)
 
-        return chunks
@@ -1,7 +1,10 @@
 import json
 import os
+import hashlib
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
+
+import numpy as np
 
 
 class TranscriptStorage:
@@ -45,9 +48,11 @@ class TranscriptStorage:
         """
         transcript_path = self._get_transcript_path(video_filename)
         
-        # 保存完整转录数据
-        with open(transcript_path, 'w', encoding='utf-8') as f:
+        # 保存完整转录数据（先写临时文件再替换，读取方不会看到写了一半的文件）
+        temp_path = transcript_path.with_name(transcript_path.name + '.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
             json.dump(transcript_data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, transcript_path)
         
         return str(transcript_path)
     
@@ -105,3 +110,156 @@ class TranscriptStorage:
         transcript_path = self._get_transcript_path(video_filename)
         return transcript_path.exists()
 
+
+    def get_checkpoint(self, video_path: str, params: Dict[str, Any]) -> 'TranscriptCheckpoint':
+        """
+        获取视频转录的断点存储
+        
+        Args:
+            video_path: 视频文件路径
+            params: 影响转录结果的参数（模型、语言、窗口长度等），参数变化时旧断点失效
+            
+        Returns:
+            断点存储对象
+        """
+        return TranscriptCheckpoint(self.storage_dir / ".checkpoints", video_path, params)
+
+
+class TranscriptCheckpoint:
+    """
+    转录断点存储：每处理完一个音频窗口保存一次进度，进程中断后可从最后完成的窗口继续
+    
+    目录结构：
+        state.json      已完成窗口的解码上下文、下一个窗口的偏移和已提交的段落数（提交点）
+        segments.jsonl  已提交的段落，每行一个
+        carry_N.npy     需要带入下一个窗口的音频（尚未结束的段落）
+    """
+    def __init__(self, checkpoint_root: Path, video_path: str, params: Dict[str, Any]):
+        """
+        初始化断点存储
+        
+        Args:
+            checkpoint_root: 断点根目录
+            video_path: 视频文件路径
+            params: 影响转录结果的参数
+        """
+        stat = os.stat(video_path)
+        # 视频文件被替换（大小或修改时间变化）时断点失效
+        self.params = {**params, 'video_path': os.path.abspath(video_path),
+                       'video_size': stat.st_size, 'video_mtime': stat.st_mtime}
+        key = hashlib.sha1(os.path.abspath(video_path).encode('utf-8')).hexdigest()[:16]
+        self.dir = Path(checkpoint_root) / f"{Path(video_path).stem}_{key}"
+        self.saved_segments = 0
+        self.window_count = 0
+    
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        读取断点
+        
+        Returns:
+            包含state（解码上下文）、segments（已提交段落）、next_offset（下一个窗口的起始秒数）
+            和carry（带入下一个窗口的音频，可能为None）的字典；没有可用断点时返回None
+        """
+        try:
+            with open(self.dir / "state.json", 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            # 第一个窗口保存到一半时中断会留下没有提交点的段落，不能被下次追加时当作已提交
+            self.clear()
+            return None
+        
+        if checkpoint.get('params') != self.params:
+            print(f"转录参数或视频已变化，丢弃旧断点: {self.dir}")
+            self.clear()
+            return None
+        
+        try:
+            # 只读取提交点记录的段落，之后追加的行属于未完成的窗口
+            segments = []
+            with open(self.dir / "segments.jsonl", 'r', encoding='utf-8') as f:
+                for line in f:
+                    if len(segments) == checkpoint['segment_count']:
+                        break
+                    segments.append(json.loads(line))
+            if len(segments) < checkpoint['segment_count']:
+                raise ValueError("段落数量与断点不一致")
+            carry = np.load(self.dir / checkpoint['carry_file']) if checkpoint['carry_file'] else None
+        except Exception as e:
+            print(f"断点损坏，重新开始转录: {e}")
+            self.clear()
+            return None
+        
+        # 截掉提交点之后写入的段落，继续追加
+        self._rewrite_segments(segments)
+        self.saved_segments = len(segments)
+        self.window_count = checkpoint['window_count']
+        return {
+            'state': checkpoint['state'],
+            'segments': segments,
+            'next_offset': checkpoint['next_offset'],
+            'carry': carry,
+            'carry_start': checkpoint['carry_start']
+        }
+    
+    def save(self, state: Dict[str, Any], segments: List[Dict[str, Any]], next_offset: float,
+             carry: Optional[np.ndarray], carry_start: float):
+        """
+        保存一个已完成窗口的进度
+        
+        Args:
+            state: 解码上下文（language、prompt、segment_count等可JSON序列化的值）
+            segments: 到目前为止提交的全部段落（只追加尚未保存的部分）
+            next_offset: 下一个窗口的起始秒数
+            carry: 需要带入下一个窗口的音频
+            carry_start: carry音频的起始秒数
+        """
+        self.dir.mkdir(parents=True, exist_ok=True)
+        
+        # 没有已保存的段落时从头写，不沿用之前残留的行
+        with open(self.dir / "segments.jsonl", 'a' if self.saved_segments else 'w', encoding='utf-8') as f:
+            for segment in segments[self.saved_segments:]:
+                f.write(json.dumps(segment, ensure_ascii=False, default=float) + "\n")
+        self.saved_segments = len(segments)
+        
+        self.window_count += 1
+        carry_file = None
+        if carry is not None and carry.size:
+            carry_file = f"carry_{self.window_count}.npy"
+            np.save(self.dir / carry_file, carry)
+        
+        checkpoint = {
+            'params': self.params,
+            'state': state,
+            'segment_count': len(segments),
+            'next_offset': next_offset,
+            'carry_file': carry_file,
+            'carry_start': carry_start,
+            'window_count': self.window_count
+        }
+        # 先写临时文件再替换，state.json要么是旧的提交点要么是新的
+        temp_path = self.dir / "state.json.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False, default=float)
+        os.replace(temp_path, self.dir / "state.json")
+        
+        for old_carry in self.dir.glob("carry_*.npy"):
+            if old_carry.name != carry_file:
+                old_carry.unlink()
+    
+    def clear(self):
+        """删除断点（转录完成或断点失效时调用）"""
+        if not self.dir.exists():
+            return
+        for path in self.dir.iterdir():
+            path.unlink()
+        self.dir.rmdir()
+        self.saved_segments = 0
+        self.window_count = 0
+    
+    def _rewrite_segments(self, segments: List[Dict[str, Any]]):
+        """用已提交的段落重写segments.jsonl"""
+        temp_path = self.dir / "segments.jsonl.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for segment in segments:
+                f.write(json.dumps(segment, ensure_ascii=False, default=float) + "\n")
+        os.replace(temp_path, self.dir / "segments.jsonl")
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Any, Optional
+
+from video_processor import SAMPLE_RATE
+
+
+class TranscriptionService:
+    """
+    Long-lived pool of transcription processes, each loading the Whisper model once.
+
+    Audio is never sent to the workers: callers pass the path of a raw float32 PCM
+    file (see VideoProcessor.extract_pcm) and a sample range, and each worker maps
+    the file into memory, so all processes read the same pages of the page cache.
+    Only the file path, the range and the resulting segments cross process boundaries.
+    """
+    def __init__(self, model_name: str, quantize: bool = False, num_threads: Optional[int] = None,
+                 cache_dir: str = "model_cache", workers: int = 1, decode_options: Optional[Dict[str, Any]] = None):
+        """
+        Start the worker processes.
+
+        Args:
+            model_name: Whisper model name
+            quantize: Use the int8 dynamically quantized model
+            num_threads: Torch threads per worker (cores split between workers if None)
+            cache_dir: Directory for converted model weights
+            workers: Number of worker processes
+            decode_options: Extra whisper transcribe() options the workers decode with
+        """
+        self.workers = workers
+        threads = num_threads or max(1, (os.cpu_count() or 1) // workers)
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model_name, quantize, threads, cache_dir, decode_options)
+        )
+
+    def submit(self, pcm_path: str, start: int = 0, end: Optional[int] = None,
+               language: Optional[str] = None) -> Future:
+        """
+        Queue the transcription of a range of a PCM file.
+
+        Args:
+            pcm_path: Raw float32 mono 16 kHz PCM file
+            start: First sample
+            end: Sample after the last one (end of file if None)
+            language: Language code (optional, auto-detect if None)
+
+        Returns:
+            Future resolving to the transcription result; timestamps are relative to start
+        """
+        return self._executor.submit(_transcribe_in_worker, pcm_path, start, end, language)
+
+    def detect_language(self, pcm_path: str, start: int = 0) -> str:
+        """Detect the spoken language of the 30 s of audio from start."""
+        return self._executor.submit(_detect_language_in_worker, pcm_path, start).result()
+
+    def close(self):
+        """Stop the worker processes."""
+        self._executor.shutdown()
+
+
+def open_pcm(pcm_path: str) -> np.ndarray:
+    """
+    Map a raw float32 PCM file into memory.
+
+    Copy-on-write, so Whisper may treat the array as writable without touching
+    the file or the pages other processes share.
+    """
+    return np.memmap(pcm_path, dtype=np.float32, mode='c')
+
+
+# Per-process transcriber of a service worker
+_worker_transcriber = None
+
+
+def _init_worker(model_name: str, quantize: bool, num_threads: int, cache_dir: str,
+                 decode_options: Optional[Dict[str, Any]] = None):
+    """Load the model once when a worker process starts."""
+    global _worker_transcriber
+    from transcriber import Transcriber
+    _worker_transcriber = Transcriber(model_name, quantize, num_threads, cache_dir, decode_options)
+    _worker_transcriber.model
+
+
+def _detect_language_in_worker(pcm_path: str, start: int) -> str:
+    """Detect the spoken language of up to 30 s of audio."""
+    import whisper
+    model = _worker_transcriber.model
+    audio = whisper.pad_or_trim(open_pcm(pcm_path)[start:start + 30 * SAMPLE_RATE])
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels).to(model.device)
+    _, probs = model.detect_language(mel)
+    return max(probs, key=probs.get)
+
+
+def _transcribe_in_worker(pcm_path: str, start: int, end: Optional[int], language: Optional[str]) -> Dict[str, Any]:
+    """Transcribe one range of a PCM file in a worker process."""
+    return _worker_transcriber.transcribe_samples(open_pcm(pcm_path)[start:end], language)
@@ -1,23 +1,46 @@
+import bisect
 import ffmpeg
+import json
 import os
 import tempfile
-from typing import Optional
+import wave
+import numpy as np
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ffmpeg_executor import FFmpegExecutor, FFmpegError, default_executor, PRIORITY_INTERACTIVE, PRIORITY_INGEST
+
+# Whisper expects 16 kHz mono audio
+SAMPLE_RATE = 16000
+# Probes only read headers; one taking longer than this is stuck
+PROBE_TIMEOUT = 30.0
 
 
 class VideoProcessor:
     """
     A class for processing video files using FFmpeg.
+
+    Every ffmpeg and ffprobe process goes through an FFmpegExecutor, which bounds
+    how many run at once, orders them by priority and enforces timeouts.
     """
-    def __init__(self):
-        pass
+    def __init__(self, executor: Optional[FFmpegExecutor] = None):
+        """
+        Initialize the processor.
+
+        Args:
+            executor: Executor running the ffmpeg processes (the process-wide default if None)
+        """
+        self.executor = executor or default_executor()
 
-    def extract_audio(self, video_path: str, output_audio_path: Optional[str] = None) -> str:
+    def extract_audio(self, video_path: str, output_audio_path: Optional[str] = None,
+                      priority: int = PRIORITY_INGEST, on_progress: Optional[Callable[[Dict[str, Any]], Any]] = None) -> str:
         """
         Extract audio from video file.
 
         Args:
             video_path: Path to the video file
             output_audio_path: Path to save the extracted audio. If None, uses temp file.
+            priority: Executor priority of the ffmpeg process
+            on_progress: Called with ffmpeg's progress reports (see FFmpegExecutor.run)
 
         Returns:
             Path to the extracted audio file
@@ -26,18 +49,167 @@ class VideoProcessor:
             raise FileNotFoundError(f"Video file not found: {video_path}")
 
         if output_audio_path is None:
-            temp_dir = tempfile.mkdtemp()
-            output_audio_path = os.path.join(temp_dir, "audio.wav")
+            # A temp file rather than a temp directory, so removing the file cleans up everything
+            fd, output_audio_path = tempfile.mkstemp(suffix='.wav')
+            os.close(fd)
 
         try:
             # Extract audio using ffmpeg
             stream = ffmpeg.input(video_path)
             stream = ffmpeg.output(stream, output_audio_path, acodec='pcm_s16le', ac=1, ar='16k')
-            ffmpeg.run(stream, quiet=True)
+            self._run(stream, video_path, priority, on_progress)
             return output_audio_path
-        except ffmpeg.Error as e:
+        except FFmpegError as e:
+            raise Exception(f"FFmpeg error: {e}")
+
+    def load_audio(self, audio_path: str) -> np.ndarray:
+        """
+        Read a 16-bit PCM WAV file written by extract_audio into memory.
+
+        Args:
+            audio_path: Path to the WAV file
+
+        Returns:
+            Mono float32 samples
+        """
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+        with wave.open(audio_path, 'rb') as wav:
+            if wav.getsampwidth() != 2 or wav.getnchannels() != 1 or wav.getframerate() != SAMPLE_RATE:
+                raise Exception(f"Expected 16 kHz mono 16-bit WAV: {audio_path}")
+            data = wav.readframes(wav.getnframes())
+        return np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+
+    def read_audio(self, video_path: str, block_seconds: float = 10.0, priority: int = PRIORITY_INGEST) -> np.ndarray:
+        """
+        Decode the audio track straight into memory with a single ffmpeg run.
+
+        ffmpeg writes raw 16-bit PCM to a pipe, which is read in fixed blocks and
+        converted into a float32 array preallocated from the probed duration, so
+        neither the audio nor a second decode touches the disk.
+
+        Args:
+            video_path: Path to the video (or audio) file
+            block_seconds: Seconds of audio read from the pipe at a time
+            priority: Executor priority of the ffmpeg process
+
+        Returns:
+            Mono float32 16 kHz samples
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        try:
+            # Container durations are approximate; one extra second usually avoids growing the buffer
+            capacity = int((self.get_video_duration(video_path) + 1.0) * SAMPLE_RATE)
+        except Exception:
+            capacity = 60 * SAMPLE_RATE
+        samples = np.empty(capacity, dtype=np.float32)
+        block_bytes = int(block_seconds * SAMPLE_RATE) * 2
+
+        stream = ffmpeg.output(ffmpeg.input(video_path), 'pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar='16k')
+        process = self.executor.open(ffmpeg.compile(stream), priority=priority,
+                                     label=f"decode audio {os.path.basename(video_path)}")
+
+        filled = 0
+        try:
+            while True:
+                # Reads return a whole block unless ffmpeg is done
+                data = process.read(block_bytes)
+                count = len(data) // 2
+                if count == 0:
+                    break
+                if filled + count > samples.size:
+                    grown = np.empty(max(2 * samples.size, filled + count), dtype=np.float32)
+                    grown[:filled] = samples[:filled]
+                    samples = grown
+                np.multiply(np.frombuffer(data, dtype=np.int16, count=count), np.float32(1.0 / 32768.0),
+                            out=samples[filled:filled + count])
+                filled += count
+                if len(data) < block_bytes:
+                    break
+            process.wait()
+        except FFmpegError as e:
+            raise Exception(f"FFmpeg error: could not decode audio from {video_path}: {e}")
+        finally:
+            process.close()
+        return samples[:filled]
+
+    def extract_pcm(self, video_path: str, output_path: Optional[str] = None, priority: int = PRIORITY_INGEST,
+                    on_progress: Optional[Callable[[Dict[str, Any]], Any]] = None) -> str:
+        """
+        Decode the audio track into a raw float32 mono 16 kHz PCM file.
+
+        The file can be memory-mapped by several processes at once (see
+        transcription_service.open_pcm), so transcription workers share the
+        decoded audio instead of receiving copies of it.
+
+        Args:
+            video_path: Path to the video file
+            output_path: Path of the PCM file. If None, uses a temp file the caller removes.
+            priority: Executor priority of the ffmpeg process
+            on_progress: Called with ffmpeg's progress reports (see FFmpegExecutor.run)
+
+        Returns:
+            Path to the PCM file
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        if output_path is None:
+            fd, output_path = tempfile.mkstemp(suffix='.f32')
+            os.close(fd)
+
+        try:
+            stream = ffmpeg.input(video_path)
+            stream = ffmpeg.output(stream, output_path, format='f32le', acodec='pcm_f32le', ac=1, ar='16k')
+            self._run(stream, video_path, priority, on_progress)
+            return output_path
+        except FFmpegError as e:
             raise Exception(f"FFmpeg error: {e}")
 
+    def stream_audio(self, video_path: str, window_seconds: float = 30.0, start_time: float = 0.0,
+                     priority: int = PRIORITY_INGEST) -> Iterator[Tuple[float, np.ndarray]]:
+        """
+        Decode the audio track in fixed windows without writing it to disk.
+
+        The ffmpeg process keeps its executor slot until the generator is exhausted or closed.
+
+        Args:
+            video_path: Path to the video file
+            window_seconds: Length of each window in seconds
+            start_time: Position in seconds to start decoding from
+            priority: Executor priority of the ffmpeg process
+
+        Yields:
+            (window start in seconds, float32 mono 16 kHz samples) pairs
+        """
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Video file not found: {video_path}")
+
+        stream = ffmpeg.input(video_path, ss=start_time) if start_time > 0 else ffmpeg.input(video_path)
+        stream = ffmpeg.output(stream, 'pipe:', format='s16le', acodec='pcm_s16le', ac=1, ar='16k')
+        process = self.executor.open(ffmpeg.compile(stream), priority=priority,
+                                     label=f"decode audio {os.path.basename(video_path)}")
+
+        window_bytes = int(window_seconds * SAMPLE_RATE) * 2
+        position = start_time
+        try:
+            while True:
+                data = process.read(window_bytes)
+                if not data:
+                    break
+                samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype=np.int16).astype(np.float32) / 32768.0
+                yield position, samples
+                position += len(samples) / SAMPLE_RATE
+            process.wait()
+        except FFmpegError as e:
+            raise Exception(f"FFmpeg error: could not decode audio from {video_path}: {e}")
+        finally:
+            # Stop ffmpeg if the consumer closed the generator early
+            process.close()
+
     def get_video_duration(self, video_path: str) -> float:
         """
         Get the duration of the video in seconds.
@@ -49,13 +221,72 @@ class VideoProcessor:
             Duration in seconds
         """
         try:
-            probe = ffmpeg.probe(video_path)
+            probe = self._probe(video_path)
             duration = float(probe['streams'][0]['duration'])
             return duration
-        except (ffmpeg.Error, KeyError, IndexError):
+        except (FFmpegError, KeyError, IndexError, ValueError):
             raise Exception(f"Could not get video duration for {video_path}")
 
-    def extract_video_segment(self, video_path: str, start_time: float, duration: float, output_path: str):
+    def get_video_resolution(self, video_path: str) -> Tuple[int, int]:
+        """
+        Get the frame size of the video stream.
+
+        Args:
+            video_path: Path to the video file
+
+        Returns:
+            (width, height) in pixels
+        """
+        try:
+            probe = self._probe(video_path, '-select_streams', 'v:0')
+            stream = probe['streams'][0]
+            return int(stream['width']), int(stream['height'])
+        except (FFmpegError, KeyError, IndexError, ValueError):
+            raise Exception(f"Could not get video resolution for {video_path}")
+
+    def get_keyframe_times(self, video_path: str) -> List[float]:
+        """
+        Get the timestamps of the video stream's keyframes.
+
+        Only packet headers are read, nothing is decoded.
+
+        Args:
+            video_path: Path to the video file
+
+        Returns:
+            Sorted keyframe times in seconds (empty if there is no video stream)
+        """
+        try:
+            probe = self._probe(video_path, '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags')
+        except (FFmpegError, ValueError) as e:
+            raise Exception(f"Could not read keyframes of {video_path}: {e}")
+        return sorted(float(packet['pts_time']) for packet in probe.get('packets', [])
+                      if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A'))
+
+    def snap_to_keyframes(self, keyframes: List[float], start_time: float, end_time: float) -> Tuple[float, Optional[float]]:
+        """
+        Widen a range to keyframes: the last one at or before the start, the first one at or after the end.
+
+        Args:
+            keyframes: Sorted keyframe times (see get_keyframe_times); empty means cut anywhere
+            start_time: Requested start in seconds
+            end_time: Requested end in seconds
+
+        Returns:
+            (start, end) in seconds; end is None when the range runs to the end of the video
+        """
+        if not keyframes:
+            return start_time, end_time
+        # Timestamps are rounded by the container; treat a keyframe within 1 ms as exact
+        i = bisect.bisect_right(keyframes, start_time + 0.001)
+        start = keyframes[i - 1] if i > 0 else 0.0
+        j = bisect.bisect_left(keyframes, end_time - 0.001)
+        end = keyframes[j] if j < len(keyframes) else None
+        return start, end
+
+    def extract_video_segment(self, video_path: str, start_time: float, duration: float, output_path: str,
+                              mode: str = "accurate", keyframes: Optional[List[float]] = None,
+                              priority: int = PRIORITY_INTERACTIVE) -> Tuple[float, Optional[float]]:
         """
         Extract a segment from the video.
 
@@ -64,10 +295,85 @@ class VideoProcessor:
             start_time: Start time in seconds
             duration: Duration in seconds
             output_path: Path to save the segment
+            mode: 'accurate' re-encodes exactly the requested range; 'fast' copies the
+                streams without re-encoding, widened to the surrounding keyframes
+            keyframes: Keyframe times for 'fast' mode (probed if None)
+            priority: Executor priority of the ffmpeg process
+
+        Returns:
+            (start, end) in seconds of what was extracted; end is None for "to the end"
         """
+        stream, start_time, end_time = self._clip_stream(video_path, start_time, duration, output_path, mode, keyframes)
         try:
+            self._run(stream, video_path, priority, duration=duration)
+            return start_time, end_time
+        except FFmpegError as e:
+            raise Exception(f"FFmpeg error extracting segment: {e}")
+
+    def clip_stream_command(self, video_path: str, start_time: float, duration: float, mode: str = "accurate",
+                            keyframes: Optional[List[float]] = None) -> Tuple[List[str], float, Optional[float]]:
+        """
+        Build the ffmpeg command that writes a clip as fragmented MP4 to stdout.
+
+        Fragmented MP4 needs no seekable output: the header comes first and every
+        fragment is playable on arrival, so the clip can be streamed while ffmpeg runs.
+
+        Args:
+            video_path: Path to the input video
+            start_time: Start time in seconds
+            duration: Duration in seconds
+            mode: 'accurate' or 'fast', as in extract_video_segment
+            keyframes: Keyframe times for 'fast' mode (probed if None)
+
+        Returns:
+            (ffmpeg arguments, actual start, actual end or None for "to the end")
+        """
+        stream, start_time, end_time = self._clip_stream(video_path, start_time, duration, 'pipe:', mode, keyframes,
+                                                         fragmented=True)
+        return ffmpeg.compile(stream), start_time, end_time
+
+    def _run(self, stream, video_path: str, priority: int,
+             on_progress: Optional[Callable[[Dict[str, Any]], Any]] = None, duration: Optional[float] = None):
+        """Run an ffmpeg-python output stream through the executor."""
+        if on_progress and duration is None:
+            try:
+                duration = self.get_video_duration(video_path)
+            except Exception:
+                pass
+        self.executor.run(ffmpeg.compile(stream, overwrite_output=True), priority=priority, duration=duration,
+                          on_progress=on_progress, label=f"ffmpeg {os.path.basename(video_path)}")
+
+    def _probe(self, video_path: str, *options: str) -> Dict[str, Any]:
+        """ffprobe's JSON description of a file's format and streams, plus whatever the options add."""
+        args = ['ffprobe', '-show_format', '-show_streams', '-of', 'json', *options, video_path]
+        output = self.executor.run(args, priority=PRIORITY_INTERACTIVE, timeout=PROBE_TIMEOUT,
+                                   label=f"ffprobe {os.path.basename(video_path)}")
+        return json.loads(output)
+
+    def _clip_stream(self, video_path: str, start_time: float, duration: float, output_path: str, mode: str,
+                     keyframes: Optional[List[float]], fragmented: bool = False):
+        """ffmpeg-python output stream of a clip, with the clip's actual start and end."""
+        if mode not in ("accurate", "fast"):
+            raise ValueError(f"Unknown extraction mode: {mode}")
+        end_time = start_time + duration
+        # A pipe cannot be seeked back to write the index, so streamed clips are fragmented
+        movflags = 'frag_keyframe+empty_moov+default_base_moof' if fragmented else '+faststart'
+        if mode == "fast":
+            if keyframes is None:
+                keyframes = self.get_keyframe_times(video_path)
+            start_time, end_time = self.snap_to_keyframes(keyframes, start_time, end_time)
+            # Input seeking lands on the keyframe itself, so the copied streams start cleanly
+            options = {'ss': start_time} if start_time > 0 else {}
+            if end_time is not None:
+                options['t'] = end_time - start_time
+            stream = ffmpeg.input(video_path, **options)
+            stream = ffmpeg.output(stream, output_path, c='copy', avoid_negative_ts='make_zero',
+                                   movflags=movflags, format='mp4')
+        elif fragmented:
+            stream = ffmpeg.input(video_path, ss=start_time, t=duration)
+            stream = ffmpeg.output(stream, output_path, vcodec='libx264', preset='veryfast', acodec='aac',
+                                   movflags=movflags, format='mp4')
+        else:
             stream = ffmpeg.input(video_path, ss=start_time, t=duration)
             stream = ffmpeg.output(stream, output_path)
-            ffmpeg.run(stream, quiet=True)
-        except ffmpeg.Error as e:
-            raise Exception(f"FFmpeg error extracting segment: {e}")
+        return stream, start_time, end_time
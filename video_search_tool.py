@@ -1,10 +1,22 @@
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator, Tuple
 import os
+import shutil
+import threading
 from pathlib import Path
-from video_processor import VideoProcessor
+from video_processor import VideoProcessor, SAMPLE_RATE
 from transcriber import Transcriber
-from indexer import VideoIndexer
+from transcription_service import open_pcm
+from audio_proxy import AudioProxyStore
+from clip_cache import ClipCache
+from ffmpeg_executor import FFmpegExecutor, FFmpegError, set_default_executor, PRIORITY_INTERACTIVE
+from preview_sprites import PreviewStore
+from playback import PlaybackStore
+from hls_packager import HLSPackager, parse_renditions
+from indexer import VideoIndexer, ReadOnlyVideoIndexer
+from embedding_cache import EmbeddingCache
+from audio_fingerprint import FingerprintIndex, Fingerprinter, fingerprint, shift_segments
+from quality_profiles import load_profiles, decode_options
 from configuration import llm_config, video_config
 from transcript_storage import TranscriptStorage
 # from llm_conversation import LLMConversation
@@ -14,7 +26,7 @@ class VideoSearchTool:
     """
     A tool for searching video segments based on natural language queries using Whisper, FAISS, and FFmpeg.
     """
-    def __init__(self, whisper_model: Optional[str] = None, embedding_dimension: Optional[int] = None, index_file: Optional[str] = None):
+    def __init__(self, whisper_model: Optional[str] = None, embedding_dimension: Optional[int] = None, index_file: Optional[str] = None, role: Optional[str] = None):
         """
         Initialize the video search tool.
 
@@ -22,18 +34,73 @@ class VideoSearchTool:
             whisper_model: Whisper model to use for transcription (uses config if None)
             embedding_dimension: Dimension of embedding vectors (uses config if None)
             index_file: Path to the FAISS index file (uses config if None)
+            role: 'standalone', 'writer' or 'reader' (uses config if None); ingestion
+                worker processes pass 'worker' and only transcribe
         """
         whisper_model = whisper_model or video_config.whisper_model
         embedding_dimension = embedding_dimension or video_config.embedding_dimension
         index_file = index_file or video_config.index_file
+        self.role = role or video_config.index_role
 
-        self.video_processor = VideoProcessor()
-        self.transcriber = Transcriber(whisper_model)
-        self.indexer = VideoIndexer(embedding_dimension, index_file)
+        # Every ffmpeg/ffprobe process shares these slots, with other processes through the slot file
+        self.ffmpeg = FFmpegExecutor(video_config.ffmpeg_concurrency, video_config.ffmpeg_timeout,
+                                     video_config.ffmpeg_interactive_slots, video_config.ffmpeg_slot_file or None)
+        set_default_executor(self.ffmpeg)
+        self.video_processor = VideoProcessor(self.ffmpeg)
+        if self.role == 'reader':
+            # Search-only process: no Whisper model, index follows the writer's published versions
+            self.transcriber = None
+            self.indexer = ReadOnlyVideoIndexer(embedding_dimension, index_file, video_config.index_poll_interval)
+        else:
+            self.transcriber = Transcriber(whisper_model, video_config.whisper_quantize,
+                                           video_config.torch_num_threads or None, video_config.model_cache_dir)
+            embedding_cache = None
+            if self.role != 'worker' and video_config.embedding_cache:
+                embedding_cache = EmbeddingCache(video_config.embedding_cache, embedding_dimension)
+            self.indexer = VideoIndexer(embedding_dimension, index_file, video_config.dedupe_threshold,
+                                        publish_versions=self.role == 'writer', embedding_cache=embedding_cache)
+        # Two-pass ingestion: a small model makes the video searchable at once, the
+        # configured model then re-transcribes it in the background
+        self.draft_transcriber = None
+        if self.transcriber and video_config.draft_whisper_model and video_config.draft_whisper_model != whisper_model:
+            self.draft_transcriber = Transcriber(video_config.draft_whisper_model, video_config.whisper_quantize,
+                                                 video_config.torch_num_threads or None, video_config.model_cache_dir)
+        self._refinements = set()
+        # Speed/quality profiles for the (final) transcription pass; see transcriber_for_profile
+        self.quality_profiles = load_profiles(video_config.quality_profiles, whisper_model) if self.transcriber else {}
+        self._profile_transcribers = {}
+        self._profile_lock = threading.Lock()
+        self.audio_proxies = None
+        if self.transcriber and video_config.audio_proxy_enabled:
+            self.audio_proxies = AudioProxyStore(video_config.audio_proxy_dir, video_config.audio_proxy_codec,
+                                                 video_config.audio_proxy_bitrate, self.ffmpeg)
         self.transcript_storage = TranscriptStorage()
+        # Copies of already indexed videos are recognised by their audio before transcription
+        self.fingerprints = None
+        if self.transcriber and video_config.fingerprint_index:
+            self.fingerprints = FingerprintIndex(video_config.fingerprint_index)
+        self.clip_cache = ClipCache(video_config.clip_cache_dir, int(video_config.clip_cache_max_mb * 1024 * 1024))
+        # Readers only look tiles up; sprite sheets are made during ingestion
+        self.previews = None
+        if video_config.previews_enabled:
+            self.previews = PreviewStore(video_config.preview_dir, video_config.preview_interval,
+                                         video_config.preview_tile_width, video_config.preview_tile_height,
+                                         video_config.preview_columns, video_config.preview_rows, self.ffmpeg)
+        # Faststart MP4 copies served for playback; any role may serve videos
+        self.playback = PlaybackStore(video_config.playback_dir, self.ffmpeg) if video_config.faststart_remux else None
+        # Adaptive-bitrate HLS packages, made in the background once a video's chunks are indexed
+        self.hls = None
+        if video_config.hls_enabled:
+            self.hls = HLSPackager(video_config.hls_dir, parse_renditions(video_config.hls_renditions),
+                                   video_config.hls_segment_duration, self.ffmpeg)
+        self._packaging = set()
+        self._keyframes = {}
+        # Streamed clips last as long as the client reads; they get at most this many of the ffmpeg slots
+        self.clip_stream_slots = asyncio.Semaphore(video_config.clip_stream_concurrency)
         # self.llm_conversation = LLMConversation()
 
-    async def index_video(self, video_path: str, chunk_duration: float = 30.0, language: Optional[str] = None) -> Dict[str, Any]:
+    async def index_video(self, video_path: str, chunk_duration: float = 30.0, language: Optional[str] = None,
+                          streaming: Optional[bool] = None) -> Dict[str, Any]:
         """
         Index a video file for searching.
 
@@ -41,19 +108,76 @@ class VideoSearchTool:
             video_path: Path to the video file
             chunk_duration: Duration of each chunk in seconds
             language: Language for transcription
+            streaming: Transcribe and index window by window (uses config if None)
 
         Returns:
             Indexing results
         """
+        if self.role == 'reader':
+            raise RuntimeError("Indexing is not available in a read-only search process")
+
+        if streaming is None:
+            # Parallel transcription works on the whole file, so it takes precedence
+            streaming = video_config.streaming_ingest and video_config.transcribe_workers <= 1
+        # The audio proxy is written alongside the first transcription, which reads the video itself
+        proxy = asyncio.create_task(asyncio.to_thread(self.prepare_audio, video_path))
+        previews = asyncio.create_task(asyncio.to_thread(self.prepare_previews, video_path))
+        duplicate = await asyncio.to_thread(self.reuse_duplicate_transcript, video_path)
+
+        if duplicate is None and streaming and self.draft_transcriber:
+            result = await self._index_video_streaming(video_path, chunk_duration, language, draft=True)
+            refinement = asyncio.create_task(self._refine_video(video_path, chunk_duration, language, proxy))
+            self._refinements.add(refinement)
+            refinement.add_done_callback(self._refinements.discard)
+            result['refining'] = True
+            result['previews'] = await previews is not None
+            return result
+        if duplicate is None and streaming:
+            result = await self._index_video_streaming(video_path, chunk_duration, language)
+            result['audio_proxy'] = await proxy
+            result['previews'] = await previews is not None
+            result['hls_packaging'] = self.schedule_packaging(video_path)
+            return result
+
         print(f"Indexing video: {video_path}")
 
-        # Extract audio
-        print("Extracting audio...")
-        audio_path = self.video_processor.extract_audio(video_path)
+        if duplicate is not None:
+            source = duplicate['reused_from']
+            print(f"Audio matches {source['video_filename']} at {source['offset']:.1f}s, reusing its transcript")
+            transcription = duplicate
+        else:
+            print("Extracting audio...")
+            # Decoding waits on the ffmpeg executor; run it off the event loop
+            if video_config.transcribe_workers > 1:
+                # A PCM file that transcription workers map instead of receiving copies
+                pcm_path = await asyncio.to_thread(self.video_processor.extract_pcm, self.audio_source(video_path))
+                samples = open_pcm(pcm_path)
+            else:
+                # Decoded once, straight into memory
+                pcm_path = None
+                samples = await asyncio.to_thread(self.video_processor.read_audio, self.audio_source(video_path))
 
-        # Transcribe audio
-        print("Transcribing audio...")
-        transcription = self.transcriber.transcribe(audio_path, language)
+            # Transcribe audio
+            print("Transcribing audio...")
+            try:
+                if video_config.vad_enabled:
+                    transcription = await asyncio.to_thread(
+                        self.transcriber.transcribe_with_vad, samples, language, video_config.transcribe_workers)
+                    print(f"VAD skipped {transcription['vad']['skipped_seconds']:.1f}s of {transcription['vad']['total_seconds']:.1f}s")
+                elif video_config.transcribe_workers > 1:
+                    transcription = await asyncio.to_thread(
+                        self.transcriber.transcribe_parallel, samples, language, video_config.transcribe_workers)
+                else:
+                    transcription = await asyncio.to_thread(self.transcriber.transcribe_samples, samples, language)
+                if self.fingerprints is not None:
+                    fingerprinter = Fingerprinter()
+                    await asyncio.to_thread(fingerprinter.add, samples)
+                    await asyncio.to_thread(self.store_fingerprint, video_path, fingerprinter)
+            finally:
+                # Unmap before removing the file (required on Windows)
+                del samples
+                if pcm_path:
+                    os.remove(pcm_path)
 
         # Save transcript to file
         print("Saving transcript...")
@@ -63,18 +187,12 @@ class VideoSearchTool:
 
         # Split into chunks
         print("Splitting into chunks...")
-        chunks = self.transcriber.split_into_chunks(transcription, chunk_duration)
+        chunks = self.split_transcript(transcription, chunk_duration)
 
         # Add to index
         print("Adding to index...")
         await self.indexer.add_chunks(chunks, video_path)
-
-        # Clean up temp audio file if it was created
-        if audio_path != video_path.replace('.mp4', '.wav'):  # Assuming temp file
-            try:
-                os.remove(audio_path)
-            except:
-                pass
+        packaging = self.schedule_packaging(video_path)
 
         return {
             'video_path': video_path,
@@ -82,7 +200,518 @@ class VideoSearchTool:
             'total_chunks': len(chunks),
             'index_info': self.indexer.get_index_info(),
             'transcript_saved': True,
-            'transcript_file': transcript_file
+            'transcript_file': transcript_file,
+            'audio_proxy': await proxy,
+            'previews': await previews is not None,
+            'hls_packaging': packaging,
+            'vad': transcription.get('vad'),
+            'reused_transcript': transcription.get('reused_from')
+        }
+
+    async def _index_video_streaming(self, video_path: str, chunk_duration: float, language: Optional[str],
+                                     draft: bool = False) -> Dict[str, Any]:
+        """
+        Index a video progressively: each chunk is embedded and indexed as soon as it closes.
+
+        Decoding and Whisper run in a worker thread one step at a time, so the event
+        loop keeps serving searches, which already see the chunks indexed so far.
+        With draft=True the draft model is used and the chunks are marked provisional.
+        """
+        print(f"Indexing video (streaming{', draft' if draft else ''}): {video_path}")
+
+        state = {}
+        chunk_stream = self.iter_video_chunks(video_path, chunk_duration, language, state, draft)
+
+        total_chunks = 0
+        restored_until = float('-inf')
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunk_stream, None)
+                if chunk is not None and total_chunks < state['restored_chunks']:
+                    # Indexed before the interruption
+                    total_chunks += 1
+                    restored_until = chunk['start']
+                    continue
+                if 'resumed_at' in state and restored_until is not None:
+                    # Chunks indexed after the last checkpoint come again from the resumed transcription
+                    self.indexer.truncate_video(video_path, restored_until)
+                    restored_until = None
+                if chunk is None:
+                    break
+                await self.indexer.add_chunks([chunk], video_path)
+                total_chunks += 1
+                print(f"Indexed chunk {total_chunks}: {chunk['start']:.1f}s - {chunk['end']:.1f}s")
+        finally:
+            chunk_stream.close()
+
+        # Save transcript to file
+        print("Saving transcript...")
+        transcript_file = self.save_stream_transcript(video_path, state)
+        print(f"Transcript saved to: {transcript_file}")
+
+        return {
+            'video_path': video_path,
+            'video_filename': Path(video_path).name,
+            'total_chunks': total_chunks,
+            'index_info': self.indexer.get_index_info(),
+            'transcript_saved': True,
+            'transcript_file': transcript_file,
+            'streaming': True,
+            'provisional': draft,
+            'quality_profile': state.get('quality_profile'),
+            'vad': self.stream_vad_stats(state)
+        }
+
+    async def _refine_video(self, video_path: str, chunk_duration: float, language: Optional[str],
+                            proxy: Optional[asyncio.Future] = None):
+        """
+        Second pass of two-pass ingestion: re-transcribe with the configured model and
+        atomically replace the video's provisional transcript, chunks and vectors.
+        """
+        print(f"Refining transcript: {video_path}")
+        try:
+            if proxy:
+                # Decode the second pass from the audio proxy
+                await proxy
+            state = {}
+            chunks = await asyncio.to_thread(
+                lambda: list(self.iter_video_chunks(video_path, chunk_duration, language, state)))
+            await self.indexer.replace_video(chunks, video_path)
+            self.save_stream_transcript(video_path, state)
+            print(f"Refined transcript indexed: {video_path} ({len(chunks)} chunks)")
+            # Packaged only now, so the segments follow the final chunk boundaries
+            self.schedule_packaging(video_path)
+        except Exception as e:
+            # The provisional chunks stay searchable
+            print(f"Refining {video_path} failed: {e}")
+
+    def iter_video_chunks(self, video_path: str, chunk_duration: float, language: Optional[str],
+                          state: Dict[str, Any], draft: bool = False,
+                          profile: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Decode, transcribe and chunk a video window by window (blocking generator).
+
+        Args:
+            video_path: Path to the video file
+            chunk_duration: Duration of each chunk in seconds
+            language: Language for transcription
+            state: Receives the decoding context, the audio seen/skipped so far,
+                under 'segments', every segment yielded so far and, under
+                'restored_chunks', how many of the chunks were yielded before an interruption
+            draft: Transcribe with the draft model and mark the chunks provisional
+            profile: Quality profile of a non-draft pass (uses config if None)
+
+        Yields:
+            Chunks as soon as they close; after resuming from a checkpoint, the first
+            state['restored_chunks'] of them were already yielded (and consumed) before
+            the interruption, so consumers that kept them, like the index, skip them
+        """
+        if draft:
+            transcriber, profile = self.draft_transcriber, None
+        else:
+            profile = profile or video_config.quality_profile
+            transcriber = self.transcriber_for_profile(profile)
+        state['model'] = transcriber.model_name
+        state['quality_profile'] = profile
+        state['provisional'] = draft
+        segments = state.setdefault('segments', [])
+        state['restored_chunks'] = 0
+        start_time = 0.0
+        carry = None
+        checkpoint = None
+
+        if video_config.transcribe_checkpoints:
+            checkpoint = self.transcript_storage.get_checkpoint(video_path, {
+                'model': transcriber.model_name,
+                'profile': profile,
+                'quantize': transcriber.quantize,
+                'language': language,
+                'window': video_config.stream_window,
+                'vad': video_config.vad_enabled
+            })
+            state['checkpoint'] = checkpoint
+            resumed = checkpoint.load()
+            if resumed:
+                state.update(resumed['state'])
+                # Chunks the consumer had taken when the checkpoint was saved
+                state['restored_chunks'] = state.get('chunk_count', 0)
+                segments.extend(resumed['segments'])
+                start_time = resumed['next_offset']
+                state['resumed_at'] = start_time
+                if resumed['carry'] is not None:
+                    carry = (resumed['carry_start'], resumed['carry'])
+                print(f"Resuming transcription at {start_time:.1f}s ({len(segments)} segments from checkpoint)")
+
+        def save_window(stream_state, buffer, buffer_start, next_offset):
+            context = {key: stream_state[key] for key in
+                       ('language', 'prompt', 'segment_count', 'chunk_count', 'total_seconds', 'skipped_seconds',
+                        'carry_timeline')}
+            checkpoint.save(context, segments, next_offset, buffer, buffer_start)
+
+        on_window = save_window if checkpoint is not None else None
+
+        restored = list(segments)
+        windows = self.video_processor.stream_audio(self.audio_source(video_path), video_config.stream_window, start_time)
+        if self.fingerprints is not None and start_time == 0:
+            # Fingerprinted from the windows decoded for Whisper; stored by save_stream_transcript.
+            # A resumed pass does not see the whole audio and leaves the fingerprint out
+            state['fingerprinter'] = Fingerprinter()
+            windows = state['fingerprinter'].follow(windows)
+
+        def collect(stream):
+            yield from restored
+            for segment in stream:
+                segments.append(segment)
+                yield segment
+
+        state['chunk_count'] = 0
+        for chunk in transcriber.iter_chunks(
+                collect(transcriber.transcribe_stream(windows, language, state, video_config.vad_enabled,
+                                                      on_window, carry)), chunk_duration,
+                video_config.embedding_max_tokens, video_config.chunk_min_duration, video_config.chunk_overlap):
+            if draft:
+                chunk['provisional'] = True
+            # A window is checkpointed only once the consumer asks for the next chunk, i.e. has taken this one
+            state['chunk_count'] += 1
+            yield chunk
+
+    def transcriber_for_profile(self, name: str) -> Transcriber:
+        """
+        Transcriber that decodes with a quality profile's model and options.
+
+        Profiles on the same model share one loaded model (and the batched engine).
+        """
+        if name not in self.quality_profiles:
+            raise ValueError(f"Unknown quality profile: {name} (available: {', '.join(self.quality_profiles)})")
+        with self._profile_lock:
+            if name not in self._profile_transcribers:
+                model_name = self.quality_profiles[name]['model']
+                loaded = [self.transcriber, self.draft_transcriber] + \
+                    [t._base for t in self._profile_transcribers.values()]
+                base = next((t for t in loaded if t is not None and t.model_name == model_name), None)
+                if base is None:
+                    base = Transcriber(model_name, video_config.whisper_quantize,
+                                       video_config.torch_num_threads or None, video_config.model_cache_dir)
+                    if self.transcriber.engine:
+                        base.enable_batching(video_config.whisper_batch_size, video_config.whisper_batch_wait)
+                self._profile_transcribers[name] = base.with_options(decode_options(self.quality_profiles[name]))
+            return self._profile_transcribers[name]
+
+    def prepare_audio(self, video_path: str) -> Optional[str]:
+        """
+        Create the video's audio proxy if proxies are enabled (blocking).
+
+        Returns:
+            Path of the proxy, or None if proxies are disabled or it could not be created
+        """
+        if not self.audio_proxies:
+            return None
+        try:
+            return self.audio_proxies.ensure(video_path)
+        except Exception as e:
+            # Transcription falls back to decoding the video itself
+            print(f"Could not create audio proxy for {video_path}: {e}")
+            return None
+
+    def reuse_duplicate_transcript(self, video_path: str) -> Optional[Dict[str, Any]]:
+        """
+        If a video is a copy of an indexed video, derive its transcript from that one's (blocking).
+
+        Only FINGERPRINT_SECONDS of audio at the start and at the end of the video are
+        decoded and matched. Both must be found in the same indexed video at the same
+        offset, and the whole video must lie within it. A copy's transcript is the
+        original's, shifted by that offset and limited to the copy's duration; Whisper
+        is not run.
+
+        Returns:
+            The transcript, with the match under 'reused_from', or None if fingerprints are
+            disabled, no indexed video contains this audio, or its transcript is missing
+            or still a provisional draft
+        """
+        if self.fingerprints is None:
+            return None
+        try:
+            duration = self.video_processor.get_video_duration(video_path)
+        except Exception:
+            # Without it, the copy cannot be checked to end within the original
+            return None
+        try:
+            match = self._match_audio_window(video_path, 0.0)
+            if match is None:
+                return None
+            tail_start = duration - video_config.fingerprint_seconds
+            if tail_start > 0:
+                tail = self._match_audio_window(video_path, tail_start, match['video_path'])
+                # A cut or an insertion in between moves the end against the start
+                if tail is None or abs(tail['offset'] - tail_start - match['offset']) > 0.5:
+                    return None
+        except Exception as e:
+            # The video is transcribed as usual
+            print(f"Could not fingerprint {video_path}: {e}")
+            return None
+        if match['offset'] < -1.0 or match['offset'] + duration > match['duration'] + 1.0:
+            return None
+
+        original = self.transcript_storage.load_transcript(Path(match['video_path']).name)
+        if original is None:
+            return None
+        if original.get('provisional'):
+            # The refined transcript replaces it later; the copy gets a transcript of its own instead
+            print(f"{video_path} matches {match['video_path']}, whose transcript is still a draft")
+            return None
+        segments = shift_segments(original.get('segments', []), match['offset'], duration)
+        return {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': original.get('language'),
+            # Inherited, so quality upgrades treat the copy like its original
+            'model': original.get('model'),
+            'quality_profile': original.get('quality_profile'),
+            'reused_from': {
+                'video_filename': Path(match['video_path']).name,
+                'offset': match['offset'],
+                'score': match['score']
+            }
+        }
+
+    def _match_audio_window(self, video_path: str, start_time: float,
+                            only: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Decode FINGERPRINT_SECONDS of a video's audio from start_time and look it up in the fingerprint index."""
+        windows = self.video_processor.stream_audio(self.audio_source(video_path), video_config.fingerprint_seconds,
+                                                    start_time)
+        try:
+            window = next(windows, None)
+        finally:
+            windows.close()
+        if window is None:
+            return None
+        samples = window[1]
+        hashes, frames = fingerprint(samples)
+        return self.fingerprints.match(hashes, frames, samples.size / SAMPLE_RATE, video_config.fingerprint_threshold,
+                                       exclude=video_path, video_path=only)
+
+    def store_fingerprint(self, video_path: str, fingerprinter: Fingerprinter):
+        """Store the fingerprint of a video's whole audio, so later copies of it are recognised (blocking)."""
+        try:
+            hashes, frames = fingerprinter.finish()
+            self.fingerprints.add(video_path, hashes, frames, fingerprinter.duration)
+        except Exception as e:
+            print(f"Could not store the fingerprint of {video_path}: {e}")
+
+    def prepare_previews(self, video_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Create the video's preview sprite sheets and seek index if previews are enabled (blocking).
+
+        Returns:
+            The seek index, or None if previews are disabled or could not be created
+        """
+        if not self.previews:
+            return None
+        try:
+            try:
+                duration = self.video_processor.get_video_duration(video_path)
+            except Exception:
+                duration = None
+            return self.previews.ensure(video_path, duration)
+        except Exception as e:
+            # Search results just come without previews
+            print(f"Could not create previews for {video_path}: {e}")
+            return None
+
+    def get_preview_tile(self, video_path: str, time: float) -> Optional[Dict[str, Any]]:
+        """Sprite sheet tile showing a moment of a video, or None (see PreviewStore.tile)."""
+        if not self.previews:
+            return None
+        try:
+            return self.previews.tile(video_path, time)
+        except Exception as e:
+            print(f"Could not read previews of {video_path}: {e}")
+            return None
+
+    def prepare_playback(self, video_path: str) -> Optional[str]:
+        """
+        Remux a video into a faststart MP4 for playback if enabled and needed (blocking).
+
+        Returns:
+            The file to serve, or None if remuxing is disabled or failed
+        """
+        if not self.playback:
+            return None
+        try:
+            return self.playback.ensure(video_path)
+        except Exception as e:
+            # The original file is served instead
+            print(f"Could not remux {video_path} for playback: {e}")
+            return None
+
+    def schedule_packaging(self, video_path: str) -> bool:
+        """
+        Package a video for HLS in the background, aligned to its indexed chunks.
+
+        Returns:
+            Whether packaging was started (False if HLS is disabled)
+        """
+        if not self.hls:
+            return False
+        task = asyncio.create_task(asyncio.to_thread(self.prepare_hls, video_path))
+        self._packaging.add(task)
+        task.add_done_callback(self._packaging.discard)
+        return True
+
+    def prepare_hls(self, video_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Package a video for HLS if enabled, unless its package matches the current chunks (blocking).
+
+        Returns:
+            The package manifest, or None if HLS is disabled or packaging failed
+        """
+        if not self.hls:
+            return None
+        try:
+            try:
+                duration = self.video_processor.get_video_duration(video_path)
+            except Exception:
+                duration = None
+            try:
+                resolution = self.video_processor.get_video_resolution(video_path)
+            except Exception:
+                resolution = None
+            manifest = self.hls.ensure(video_path, self.indexer.chunk_starts(video_path), duration, resolution)
+            print(f"HLS package ready: {video_path} ({len(manifest['renditions'])} renditions)")
+            return manifest
+        except Exception as e:
+            # Players fall back to /video
+            print(f"Could not package {video_path} for HLS: {e}")
+            return None
+
+    def playback_source(self, video_path: str) -> Tuple[str, bool]:
+        """
+        The file to serve for playing a video.
+
+        Returns:
+            (path, final): the faststart copy, or the video itself; final is False while
+            a remux that would replace the served file is still expected
+        """
+        if not self.playback:
+            return video_path, True
+        remuxed = self.playback.get(video_path)
+        if remuxed:
+            return remuxed, True
+        return video_path, not self.playback.needs_remux(video_path)
+
+    def audio_source(self, video_path: str) -> str:
+        """The file to decode a video's audio from: its audio proxy if there is one, else the video."""
+        return self.audio_proxies.source_for(video_path) if self.audio_proxies else video_path
+
+    def split_transcript(self, transcription: Dict[str, Any], chunk_duration: float) -> List[Dict[str, Any]]:
+        """Split a whole transcript into chunks with the configured token limit, minimum duration and overlap."""
+        return self.transcriber.split_into_chunks(transcription, chunk_duration, video_config.embedding_max_tokens,
+                                                  video_config.chunk_min_duration, video_config.chunk_overlap)
+
+    def save_stream_transcript(self, video_path: str, state: Dict[str, Any]) -> str:
+        """Save the transcript collected by iter_video_chunks, drop its checkpoint, and return its path."""
+        segments = state.get('segments', [])
+        transcription = {
+            'text': ''.join(segment['text'] for segment in segments),
+            'segments': segments,
+            'language': state.get('language'),
+            # What produced the transcript, so lower-quality ones can be re-transcribed later
+            'model': state.get('model'),
+            'quality_profile': state.get('quality_profile')
+        }
+        if state.get('provisional'):
+            # Draft transcript, about to be replaced by the refined one
+            transcription['provisional'] = True
+        transcript_file = self.transcript_storage.save_transcript(Path(video_path).name, transcription)
+        if state.get('checkpoint'):
+            state['checkpoint'].clear()
+        if state.get('fingerprinter'):
+            self.store_fingerprint(video_path, state['fingerprinter'])
+        return transcript_file
+
+    def stream_vad_stats(self, state: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        """Audio seen and skipped by the VAD during iter_video_chunks."""
+        if not video_config.vad_enabled:
+            return None
+        return {
+            'total_seconds': state.get('total_seconds', 0.0),
+            'speech_seconds': state.get('total_seconds', 0.0) - state.get('skipped_seconds', 0.0),
+            'skipped_seconds': state.get('skipped_seconds', 0.0)
+        }
+
+    async def reindex_video(self, video_path: str, chunk_duration: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Re-chunk a video's saved transcript and swap its vectors in the index.
+
+        Whisper is not run; only chunk texts missing from the embedding cache are
+        sent to the embedding API.
+
+        Args:
+            video_path: Path the video was indexed under
+            chunk_duration: Duration of each chunk in seconds (uses config if None)
+
+        Returns:
+            Re-indexing results
+        """
+        if self.role == 'reader':
+            raise RuntimeError("Indexing is not available in a read-only search process")
+
+        video_filename = Path(video_path).name
+        transcript = self.transcript_storage.load_transcript(video_filename)
+        if transcript is None:
+            raise FileNotFoundError(f"No saved transcript for {video_filename}")
+
+        chunks = self.split_transcript(transcript, chunk_duration or video_config.chunk_duration)
+        before = dict(self.indexer.embedding_stats)
+        await self.indexer.replace_video(chunks, video_path)
+        # New chunk boundaries need new segment cuts
+        self.schedule_packaging(video_path)
+        return {
+            'video_path': video_path,
+            'video_filename': video_filename,
+            'total_chunks': len(chunks),
+            'embedded': self.indexer.embedding_stats['embedded'] - before['embedded'],
+            'cached': self.indexer.embedding_stats['cached'] - before['cached']
+        }
+
+    async def reindex_all(self, chunk_duration: Optional[float] = None,
+                          video_filenames: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Re-index every indexed video (or the given ones) from its saved transcript.
+
+        Args:
+            chunk_duration: Duration of each chunk in seconds (uses config if None)
+            video_filenames: Only re-index videos with these filenames
+
+        Returns:
+            Per-video results and the videos that could not be re-indexed
+        """
+        if self.role == 'reader':
+            raise RuntimeError("Indexing is not available in a read-only search process")
+
+        # Vectors already in the index count as cached, so the first re-index of an
+        # existing library only embeds chunk texts that actually changed
+        seeded = await asyncio.to_thread(self.indexer.seed_embedding_cache)
+        if seeded:
+            print(f"Seeded embedding cache with {seeded} vectors from the index")
+
+        results, failed = [], []
+        for video_path in self.indexer.indexed_videos():
+            if video_filenames and Path(video_path).name not in video_filenames:
+                continue
+            try:
+                results.append(await self.reindex_video(video_path, chunk_duration))
+                print(f"Re-indexed {video_path}: {results[-1]['total_chunks']} chunks, "
+                      f"{results[-1]['embedded']} embedded, {results[-1]['cached']} cached")
+            except Exception as e:
+                print(f"Re-indexing {video_path} failed: {e}")
+                failed.append({'video_path': video_path, 'error': str(e)})
+        return {
+            'videos': results,
+            'failed': failed,
+            'embedded': sum(r['embedded'] for r in results),
+            'cached': sum(r['cached'] for r in results),
+            'index_info': self.indexer.get_index_info()
         }
 
     async def search_videos(self, query: str, top_k: int = 5, video_filename: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -109,7 +738,8 @@ class VideoSearchTool:
 
         return enhanced_results
 
-    def extract_segment(self, video_path: str, start_time: float, end_time: float, output_path: str):
+    def extract_segment(self, video_path: str, start_time: float, end_time: float, output_path: str,
+                        mode: Optional[str] = None) -> Dict[str, Any]:
         """
         Extract a video segment.
 
@@ -118,9 +748,109 @@ class VideoSearchTool:
             start_time: Start time in seconds
             end_time: End time in seconds
             output_path: Path to save the segment
+            mode: 'fast' or 'accurate' (uses config if None), see get_clip
+
+        Returns:
+            Clip information (see get_clip)
+        """
+        clip = self.get_clip(video_path, start_time, end_time, mode)
+        shutil.copyfile(clip['path'], output_path)
+        return clip
+
+    def get_clip(self, video_path: str, start_time: float, end_time: float, mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get a clip of a video from the clip cache, extracting it on a miss.
+
+        Args:
+            video_path: Path to the source video
+            start_time: Start time in seconds
+            end_time: End time in seconds
+            mode: 'fast' copies the streams cut at the surrounding keyframes; 'accurate'
+                re-encodes exactly the requested range (uses config if None)
+
+        Returns:
+            'path' of the cached clip, its actual 'start_time' and 'end_time' (None for
+            "to the end of the video") and the 'mode'
         """
-        duration = end_time - start_time
-        self.video_processor.extract_video_segment(video_path, start_time, duration, output_path)
+        mode, start, end, keyframes = self._clip_range(video_path, start_time, end_time, mode)
+        path = self.clip_cache.get_or_create(
+            video_path, start, -1.0 if end is None else end, mode,
+            lambda output_path: self.video_processor.extract_video_segment(
+                video_path, start, end_time - start, output_path, mode, keyframes))
+        return {'path': path, 'start_time': start, 'end_time': end, 'mode': mode}
+
+    def open_clip_stream(self, video_path: str, start_time: float, end_time: float,
+                         mode: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Prepare a clip for streaming without writing it to disk.
+
+        A clip already in the clip cache is streamed from there; otherwise ffmpeg's
+        fragmented MP4 output is piped through, so playback starts while the clip is
+        still being extracted. At most CLIP_STREAM_CONCURRENCY clips stream at once,
+        and each one waits for an interactive-priority ffmpeg slot.
+
+        Args:
+            video_path: Path to the source video
+            start_time: Start time in seconds
+            end_time: End time in seconds
+            mode: 'fast' or 'accurate' (uses config if None), see get_clip
+
+        Returns:
+            The clip's actual 'start_time', 'end_time' and 'mode', 'cached', and
+            'chunks', an async iterator of the MP4 bytes
+        """
+        mode, start, end, keyframes = self._clip_range(video_path, start_time, end_time, mode)
+        cached = self.clip_cache.get(video_path, start, -1.0 if end is None else end, mode)
+        if cached:
+            chunks = self._read_file_chunks(cached)
+        else:
+            command, _, _ = self.video_processor.clip_stream_command(video_path, start, end_time - start, mode, keyframes)
+            chunks = self._stream_process_output(command)
+        return {'start_time': start, 'end_time': end, 'mode': mode, 'cached': cached is not None, 'chunks': chunks}
+
+    async def _stream_process_output(self, command: List[str], chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """Run an ffmpeg command in a clip stream slot and yield its stdout; ffmpeg is killed if the consumer stops."""
+        async with self.clip_stream_slots:
+            process = await self.ffmpeg.open_async(command, priority=PRIORITY_INTERACTIVE, label="clip stream")
+            try:
+                while True:
+                    data = await process.read_async(chunk_size)
+                    if not data:
+                        break
+                    yield data
+                await process.wait_async()
+            except FFmpegError as e:
+                print(f"ffmpeg failed while streaming a clip: {e}")
+            finally:
+                # Client disconnected (or the stream failed): stop ffmpeg right away
+                await process.close_async()
+
+    async def _read_file_chunks(self, path: str, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+        """Yield a file's bytes without blocking the event loop."""
+        with open(path, 'rb') as f:
+            while True:
+                data = await asyncio.to_thread(f.read, chunk_size)
+                if not data:
+                    break
+                yield data
+
+    def _clip_range(self, video_path: str, start_time: float, end_time: float, mode: Optional[str]):
+        """Resolve the mode and the actual clip range; 'fast' clips are widened to keyframes."""
+        mode = mode or video_config.clip_mode
+        keyframes = None
+        start, end = start_time, end_time
+        if mode == 'fast':
+            keyframes = self.get_keyframe_times(video_path)
+            # The snapped range is the cache key, so nearby requests share one clip
+            start, end = self.video_processor.snap_to_keyframes(keyframes, start_time, end_time)
+        return mode, start, end, keyframes
+
+    def get_keyframe_times(self, video_path: str) -> List[float]:
+        """Keyframe times of a video, probed once per version of the file."""
+        key = (os.path.abspath(video_path), os.path.getmtime(video_path))
+        if key not in self._keyframes:
+            self._keyframes[key] = self.video_processor.get_keyframe_times(video_path)
+        return self._keyframes[key]
 
     async def get_relevant_segments(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
         """
@@ -136,9 +866,27 @@ class VideoSearchTool:
         results = await self.search_videos(query, top_k)
         return results
 
+    def warm_up(self):
+        """Load the index ahead of the first search (the Whisper model stays lazy)."""
+        self.indexer.get_index_info()
+
+    def get_readiness(self) -> Dict[str, Any]:
+        """Report which heavy components are loaded; the tool is ready once the index is."""
+        return {
+            'ready': self.indexer.is_loaded,
+            'role': self.role,
+            'index_loaded': self.indexer.is_loaded,
+            'whisper_loaded': self.transcriber is not None and self.transcriber.is_loaded,
+            'refinements_running': len(self._refinements),
+            'packaging_running': len(self._packaging),
+            'ffmpeg': self.ffmpeg.get_stats()
+        }
+
     def get_index_info(self) -> Dict[str, Any]:
         """Get information about the current index."""
-        return self.indexer.get_index_info()
+        info = self.indexer.get_index_info()
+        info['role'] = self.role
+        return info
 
 
 # Example usage
@@ -160,4 +908,10 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import sys
+    if sys.argv[1:2] == ['reindex']:
+        # python video_search_tool.py reindex [video_filename ...]
+        # Stop the API (or use POST /reindex) first: only one process may write the index
+        print(asyncio.run(VideoSearchTool().reindex_all(video_filenames=sys.argv[2:] or None)))
+    else:
+        asyncio.run(main())